@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from database import Database, location_code
+from migrations import create_history_triggers, drop_history_triggers, history_json
+from serials import serial_key, serial_text
+
+# bill_history (migrations.py, version 6) gets an entry for every insert,
+# update and delete of a bill, written by triggers in the same transaction
+# as the change. This module reads that log back: a bill's history, undoing
+# everything after a point in time, compacting old entries, online backups
+# and rebuilding a backup as of any later moment.
+
+# Pages copied per step of an online backup
+BACKUP_PAGES = 1024
+# Log entries removed per transaction when compacting
+COMPACT_BATCH = 5000
+HISTORY_COLUMNS = ('id', 'changed_at', 'op', 'bill_id', 'serial_number', 'user_id', 'old_values', 'new_values')
+
+def timestamp(value):
+    """A point in time as bill_history.changed_at text (UTC).
+    
+    Takes a datetime or an ISO 8601 string; without a UTC offset it is
+    taken to be local time.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip())
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+def bill_history(db, serial_number):
+    """Log entries for a serial number, oldest first, as dicts"""
+    with db.lock:
+        db.cursor.execute('SELECT * FROM bill_history WHERE serial_number = ? ORDER BY id', (serial_number,))
+        entries = [_entry(row) for row in db.cursor.fetchall()]
+        for entry in entries:
+            if entry['op'] == 'insert':
+                entry['new_values'] = inserted_values(db.conn, entry['id'], entry['bill_id'])
+        return entries
+        
+def inserted_values(conn, entry_id, bill_id):
+    """A bill's fields as added by the insert logged as entry_id.
+    
+    Insert entries carry no values (see migrations.create_history_triggers):
+    they are the old_values of the bill's next entry or, if it has not
+    changed since, its current row. One statement, so both come from the
+    same snapshot of conn.
+    """
+    values = conn.execute(f'''
+        SELECT COALESCE(
+            (SELECT old_values FROM bill_history WHERE bill_id = ? AND id > ? ORDER BY id LIMIT 1),
+            (SELECT {history_json('b')} FROM bills b WHERE b.id = ?))
+    ''', (bill_id, entry_id, bill_id)).fetchone()[0]
+    return json.loads(values)
+
+def changes_since(db, since, limit=1000):
+    """Log entries after a point in time, oldest first; what revert_to() would undo"""
+    with db.lock:
+        db.cursor.execute('SELECT * FROM bill_history WHERE changed_at > ? ORDER BY id LIMIT ?',
+                          (timestamp(since), limit))
+        return [_entry(row) for row in db.cursor.fetchall()]
+
+def revert_to(db, until, user_id=None):
+    """Put every bill back the way it was at until; returns the number of bills changed.
+    
+    Runs in one transaction. The undo goes through the log like any other
+    change, credited to user_id, so it shows up in each bill's history and
+    can itself be reverted.
+    """
+    with db.lock:
+        try:
+            db._attribute_changes(user_id)
+            changed = _undo_after(db, timestamp(until))
+            db._commit_bills()
+        except sqlite3.Error:
+            db.conn.rollback()
+            raise
+    return changed
+
+def compact(db, before, batch_size=COMPACT_BATCH):
+    """Delete log entries older than before; returns how many were removed.
+    
+    Entries are only needed to look at or revert to times before the most
+    recent one, so after compacting, revert_to() and restore() work back
+    to before and no further. Backups taken earlier than before can no
+    longer be rolled forward. Entries go in batches, so the server keeps
+    answering requests meanwhile.
+    """
+    before = timestamp(before)
+    removed = 0
+    while True:
+        with db.lock:
+            db.cursor.execute('''
+                DELETE FROM bill_history WHERE id IN (
+                    SELECT id FROM bill_history WHERE changed_at < ? ORDER BY id LIMIT ?
+                )
+            ''', (before, batch_size))
+            count = db.cursor.rowcount
+            db.conn.commit()
+        removed += count
+        if count < batch_size:
+            return removed
+
+def backup(db, target_path, pages=BACKUP_PAGES, progress=None):
+    """Copy the database to target_path while it stays in use.
+    
+    Uses SQLite's backup API from a separate connection, so the server's
+    own connection (and its lock) is never touched. In WAL mode (as used
+    by --workers) the copy reads one snapshot from start to finish without
+    holding up readers or writers. With the default rollback journal, a
+    read transaction that long would make every write wait for it, so the
+    pages are copied in steps instead, each holding the file only briefly;
+    a write by another connection between steps makes SQLite start the
+    copy over, so a busy server is better backed up in WAL mode.
+    
+    progress(remaining, total) is called after every pages pages. Returns
+    the id and time of the last log entry in the finished copy, where
+    restore() starts rolling it forward.
+    """
+    source = sqlite3.connect(db.db_name)
+    target = sqlite3.connect(target_path)
+    try:
+        snapshot = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if snapshot:
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=pages,
+                      progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+        if snapshot:
+            source.rollback()
+        last_id, last_change = target.execute('SELECT MAX(id), MAX(changed_at) FROM bill_history').fetchone()
+    finally:
+        target.close()
+        source.close()
+    return {'success': True, 'last_entry': last_id or 0, 'last_change': last_change}
+
+def restore(source_path, target_path, log_path=None, until=None):
+    """Rebuild the collection as it was at until into a new file.
+    
+    source_path is a backup (or any copy of the database). If log_path
+    names a newer copy, such as the live database, its log entries made
+    after the backup and up to until are replayed onto it; changes after
+    until are then undone. The result's own log ends at until too.
+    Returns counts of entries replayed and bills rolled back.
+    """
+    if os.path.exists(target_path):
+        raise FileExistsError(f"{target_path} already exists")
+    until = timestamp(until) if until is not None else None
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+        
+    db = Database(target_path)
+    replayed = rolled_back = 0
+    with db.lock:
+        try:
+            # The copied entries are kept as they are instead of logging the replay again
+            drop_history_triggers(db.conn)
+            if log_path:
+                replayed = _replay(db, log_path, until)
+            if until is not None:
+                rolled_back = _undo_after(db, until)
+                db.cursor.execute('DELETE FROM bill_history WHERE changed_at > ?', (until,))
+            create_history_triggers(db.conn)
+            db._commit_bills()
+        except sqlite3.Error:
+            db.conn.rollback()
+            raise
+        finally:
+            db.close()
+    return {'success': True, 'replayed': replayed, 'rolled_back': rolled_back}
+
+def _undo_after(db, until):
+    """Restore each bill changed after until from its first later entry; caller holds db.lock"""
+    db.cursor.execute('''
+        SELECT h.bill_id, h.op, h.old_values FROM bill_history h
+        JOIN (SELECT MIN(id) AS first_id FROM bill_history WHERE changed_at > ? GROUP BY bill_id) f
+        ON h.id = f.first_id
+    ''', (until,))
+    firsts = db.cursor.fetchall()
+    # Bills added after until go first, so a serial they took is free for
+    # the bill that had it before
+    for bill_id, op, _ in firsts:
+        if op == 'insert':
+            db.cursor.execute('DELETE FROM bills WHERE id = ?', (bill_id,))
+    for bill_id, op, old_values in firsts:
+        if op != 'insert':
+            _put_bill(db, bill_id, json.loads(old_values))
+    return len(firsts)
+
+def _replay(db, log_path, until):
+    """Apply log entries from log_path newer than db's own; caller holds db.lock"""
+    db.cursor.execute('SELECT COALESCE(MAX(id), 0) FROM bill_history')
+    after_id = db.cursor.fetchone()[0]
+    log = sqlite3.connect(f"file:{log_path}?mode=ro", uri=True)
+    try:
+        cursor = log.execute('''
+            SELECT * FROM bill_history WHERE id > ? AND changed_at <= COALESCE(?, changed_at) ORDER BY id
+        ''', (after_id, until))
+        replayed = 0
+        while True:
+            entries = cursor.fetchmany(1000)
+            if not entries:
+                return replayed
+            for entry in entries:
+                bill_id, op, new_values = entry[3], entry[2], entry[7]
+                if op == 'delete':
+                    db.cursor.execute('DELETE FROM bills WHERE id = ?', (bill_id,))
+                elif op == 'insert':
+                    _put_bill(db, bill_id, inserted_values(log, entry[0], bill_id))
+                else:
+                    _put_bill(db, bill_id, json.loads(new_values))
+            db.cursor.executemany(f"INSERT INTO bill_history ({', '.join(HISTORY_COLUMNS)}) "
+                                  f"VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})", entries)
+            replayed += len(entries)
+    finally:
+        log.close()
+
+def _put_bill(db, bill_id, values):
+    """Write a bill's logged fields back under its original id"""
+    code = location_code(values.get('printing_location'))
+    db._add_locations([code])
+    db.cursor.execute('''
+        INSERT INTO bills (id, face_value, serial_number, date_recorded, printing_location_id, series_year,
+                           is_star_note, is_star_filled, image_path, estimated_value, added_by, serial_key,
+                           series_suffix)
+        VALUES (?, ?, ?, ?, (SELECT id FROM printing_locations WHERE code = ?), ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            face_value = excluded.face_value,
+            serial_number = excluded.serial_number,
+            date_recorded = excluded.date_recorded,
+            printing_location_id = excluded.printing_location_id,
+            series_year = excluded.series_year,
+            is_star_note = excluded.is_star_note,
+            is_star_filled = excluded.is_star_filled,
+            image_path = excluded.image_path,
+            estimated_value = excluded.estimated_value,
+            added_by = excluded.added_by,
+            serial_key = excluded.serial_key,
+            series_suffix = excluded.series_suffix
+    ''', (bill_id, values['face_value'], serial_text(values['serial_number']), values['date_recorded'], code,
+          values['series_year'], values['is_star_note'], values['is_star_filled'], values['image_path'],
+          values['estimated_value'], values['added_by'], serial_key(values['serial_number']),
+          values['series_suffix']))
+
+def _user(entry):
+    return entry['user_id'] if entry['user_id'] is not None else '-'
+
+def _entry(row):
+    entry = dict(zip(HISTORY_COLUMNS, row))
+    for key in ('old_values', 'new_values'):
+        if entry[key] is not None:
+            entry[key] = json.loads(entry[key])
+    return entry
+
+def main():
+    parser = argparse.ArgumentParser(description="Bill change history, backups and point-in-time recovery")
+    parser.add_argument('--db', default='dollar_tracker.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('history', help="show every logged change to a bill")
+    command.add_argument('serial_number')
+    command = commands.add_parser('changes', help="list changes made after a time")
+    command.add_argument('since', help="ISO time, e.g. 2024-06-01T14:30 (local time unless an offset is given)")
+    command = commands.add_parser('revert', help="undo every change made after a time")
+    command.add_argument('until')
+    command.add_argument('--user', help="username the undo is logged under")
+    command = commands.add_parser('compact', help="drop log entries older than a time")
+    command.add_argument('before')
+    command = commands.add_parser('backup', help="copy the database while the server runs")
+    command.add_argument('target')
+    command = commands.add_parser('restore', help="rebuild a backup as of a time into a new file")
+    command.add_argument('source', help="backup to start from")
+    command.add_argument('target', help="file to create")
+    command.add_argument('--until', help="time to restore to (default: the latest logged change)")
+    command.add_argument('--log', help="newer database whose log is replayed onto the backup, e.g. --db")
+    args = parser.parse_args()
+    
+    if args.command == 'restore':
+        result = restore(args.source, args.target, args.log, args.until)
+        print(f"Restored {args.target}: replayed {result['replayed']} changes, rolled back {result['rolled_back']} bills")
+        return
+        
+    db = Database(args.db)
+    start = time.perf_counter()
+    if args.command == 'history':
+        for entry in bill_history(db, args.serial_number):
+            print(f"{entry['changed_at']}  {entry['op']:<6}  user {_user(entry)}  {json.dumps(entry['new_values'])}")
+    elif args.command == 'changes':
+        for entry in changes_since(db, args.since):
+            print(f"{entry['changed_at']}  {entry['op']:<6}  {entry['serial_number']}  user {_user(entry)}")
+    elif args.command == 'revert':
+        user_id = None
+        if args.user:
+            with db.lock:
+                db.cursor.execute('SELECT id FROM users WHERE username = ?', (args.user,))
+                row = db.cursor.fetchone()
+            if row is None:
+                print(f"No user named {args.user}")
+                db.close()
+                return
+            user_id = row[0]
+        print(f"Reverted {revert_to(db, args.until, user_id)} bills")
+    elif args.command == 'compact':
+        print(f"Removed {compact(db, args.before)} log entries in {time.perf_counter() - start:.1f}s")
+    elif args.command == 'backup':
+        result = backup(db, args.target, progress=lambda remaining, total: print(
+            f"\r{100 * (total - remaining) // max(total, 1)}%", end='', flush=True))
+        print(f"\rBacked up to {args.target} in {time.perf_counter() - start:.1f}s "
+              f"(log entry {result['last_entry']}, {result['last_change']})")
+    db.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Micro-benchmarks for Database.add_bill and Database.search_bills at several table sizes.
+
+Usage: python benchmarks/bench_database.py [--sizes 1000,10000,100000] [--repeat N] [--output FILE]
+"""
+import argparse
+import os
+import tempfile
+
+import common
+from bill_generator import fill_database
+from database import Database
+from passwords import PasswordHasher
+
+SEARCHES = {
+    'all': {},
+    'face_value': {'face_value': 20.0},
+    'printing_location': {'printing_location': 'G'},
+    'series_year': {'series_year': 2017},
+    'star_notes': {'is_star_note': True},
+    'user': {'added_by': 1},
+    'serial_prefix': {'serial_number': 'PG1'},
+    'newest_page': {'sort': 'date_recorded', 'descending': True, 'limit': 500},
+    'value_page': {'sort': 'estimated_value', 'descending': True, 'limit': 500}
+}
+
+def bench_size(size, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), password_hasher=PasswordHasher(iterations=1000))
+        db.create_user('bench', 'bench')
+        generator = fill_database(db, size)
+        
+        # The default search returns the whole table, so run it less often at scale
+        results = {'size': size, 'search_bills': {}}
+        for name, criteria in SEARCHES.items():
+            rounds = max(3, repeat // 10) if name in ('all', 'user') else repeat
+            samples = common.time_calls(lambda: db.search_bills(criteria), rounds)
+            results['search_bills'][name] = common.summarize(samples)
+            
+        new_bills = list(generator.bills(repeat))
+        samples = common.time_calls(lambda: db.add_bill(user_id=1, **new_bills.pop()), repeat)
+        results['add_bill'] = common.summarize(samples)
+        results['file_bytes'] = os.path.getsize(os.path.join(tmp, 'bench.db'))
+        db.close()
+        return results
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        result = bench_size(size, repeat)
+        results.append(result)
+        print(f"\n{size} bills ({result['file_bytes'] / 1e6:.1f} MB)")
+        for name, summary in result['search_bills'].items():
+            print(f"  search {name:<18} p50 {summary['p50_ms']:9.3f} ms  p95 {summary['p95_ms']:9.3f} ms")
+        summary = result['add_bill']
+        print(f"  add_bill{'':<18} p50 {summary['p50_ms']:9.3f} ms  p95 {summary['p95_ms']:9.3f} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    results = run([int(size) for size in args.sizes.split(',')], args.repeat)
+    common.write_results('database', results, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""OCR throughput and accuracy of ImageProcessor.process_bill_image over sample images.
+
+Images are read from --images; a file's expected serial is its name without
+the extension (e.g. PG12345678A.png, with '_' standing in for a star). With
+no directory, synthetic serial-number images are rendered with OpenCV.
+
+Usage: python benchmarks/bench_ocr.py [--images DIR] [--count N] [--repeat N] [--preset auto|fast|accurate]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import common
+from bill_generator import BillGenerator
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+def render_samples(directory, count, seed=0):
+    """Draw count generated serials onto bill-coloured cards"""
+    import cv2
+    import numpy as np
+    
+    generator = BillGenerator(seed)
+    rng = np.random.default_rng(seed)
+    for bill in generator.bills(count):
+        serial = bill['serial_number']
+        img = np.full((240, 640, 3), (200, 222, 214), dtype=np.uint8)
+        cv2.putText(img, serial, (40, 140), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (60, 90, 40), 3, cv2.LINE_AA)
+        noise = rng.normal(0, 8, img.shape)
+        img = np.clip(img + noise, 0, 255).astype(np.uint8)
+        cv2.imwrite(os.path.join(directory, serial.replace('*', '_') + '.png'), img)
+
+def load_samples(directory):
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            samples.append((os.path.join(directory, name), stem.replace('_', '*').upper()))
+    return samples
+
+def run(samples, repeat, preset='auto'):
+    from image_processor import ImageProcessor
+    
+    processor = ImageProcessor(profile='timings', preset=preset)
+    latencies = []
+    stages = {}
+    presets_used = {}
+    serial_hits = star_hits = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path, expected in samples:
+            start = time.perf_counter()
+            result = processor.process_bill_image(path)
+            latencies.append(time.perf_counter() - start)
+            presets_used[result['preset']] = presets_used.get(result['preset'], 0) + 1
+            for stage, ms in result['timings'].items():
+                stages.setdefault(stage, []).append(ms / 1000)
+            # The OCR whitelist has no '*', so compare serials without the star
+            if (result['serial_number'] or '').rstrip('*') == expected.rstrip('*'):
+                serial_hits += 1
+            if result['is_star_note'] == expected.endswith('*'):
+                star_hits += 1
+    elapsed = time.perf_counter() - started
+    
+    total = len(latencies)
+    return {
+        'images': len(samples),
+        'repeat': repeat,
+        'preset': preset,
+        'presets_used': presets_used,
+        'latency': common.summarize(latencies),
+        'stages': {stage: common.summarize(samples) for stage, samples in stages.items()},
+        'images_per_second': total / elapsed if elapsed else 0,
+        'serial_accuracy': serial_hits / total if total else None,
+        'star_accuracy': star_hits / total if total else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', help="directory of sample bill images")
+    parser.add_argument('--count', type=int, default=20, help="synthetic images to render when --images is not given")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--preset', choices=['auto', 'fast', 'accurate'], default='auto')
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    try:
+        import cv2  # noqa: F401
+        import pytesseract  # noqa: F401
+    except ImportError as e:
+        print(f"OCR benchmark skipped: {e}")
+        sys.exit(0)
+        
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.images
+        if directory is None:
+            render_samples(tmp, args.count)
+            directory = tmp
+        samples = load_samples(directory)
+        if not samples:
+            print(f"No images found in {directory}")
+            sys.exit(1)
+        results = run(samples, args.repeat, args.preset)
+        
+    results['source'] = args.images or 'synthetic'
+    latency = results['latency']
+    print(f"\n{results['images']} images x {args.repeat}: {results['images_per_second']:.2f} images/s, "
+          f"p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms")
+    for stage, summary in results['stages'].items():
+        print(f"  {stage:<12} mean {summary['mean_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms")
+    print(f"  serial accuracy {results['serial_accuracy']:.1%}, star accuracy {results['star_accuracy']:.1%}")
+    common.write_results('ocr', results, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Compare wire formats for search results: payload size and encode/decode time.
+
+Usage: python benchmarks/bench_protocol.py [--rows N] [--repeat N] [--output FILE]
+"""
+import argparse
+import time
+
+import common
+from bill_generator import BillGenerator, as_row
+from protocol import WireFormat, CODECS, COMPRESSIONS, decode
+
+def make_rows(count, seed=0):
+    """Rows shaped like search_bills results (bills.* plus username)"""
+    generator = BillGenerator(seed)
+    return [as_row(bill, i + 1, user_id=i % 5 + 1, username=f"user{i % 5 + 1}")
+            for i, bill in enumerate(generator.bills(count))]
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(rows_count, repeat):
+    message = {'success': True, 'results': make_rows(rows_count)}
+    formats = []
+    for encoding in CODECS:
+        for columnar in (False, True):
+            for compression in [None] + list(COMPRESSIONS):
+                formats.append(WireFormat(encoding, compression, columnar))
+                
+    results = []
+    for wire_format in formats:
+        flags, payload = wire_format.encode(message)
+        assert decode(flags, payload) == message
+        results.append({
+            'format': wire_format.describe(),
+            'bytes': len(payload),
+            'encode_ms': best_time(lambda: wire_format.encode(message), repeat) * 1000,
+            'decode_ms': best_time(lambda: decode(flags, payload), repeat) * 1000
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    results = run(args.rows, args.repeat)
+    baseline = results[0]['bytes']
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'encoding':<10}{'columnar':<10}{'compression':<13}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+    for result in results:
+        fmt = result['format']
+        print(f"{fmt['encoding']:<10}{str(fmt['columnar']):<10}{str(fmt['compression']):<13}"
+              f"{result['bytes']:>12}{result['bytes'] / baseline:>8.2f}"
+              f"{result['encode_ms']:>12.2f}{result['decode_ms']:>12.2f}")
+              
+    common.write_results('protocol', {'rows': args.rows, 'formats': results}, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
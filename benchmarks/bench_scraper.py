@@ -0,0 +1,193 @@
+"""Throughput of the price extraction in value_scraper over saved eBay search pages.
+
+Pages are read from --pages (*.html, e.g. saved from a browser); with no
+directory, synthetic result pages with known prices are written and read
+back, so the extracted prices can be checked. Both parsers are timed,
+plus a full-page parse with BeautifulSoup (or the standard library's
+html.parser without it) as the baseline they replaced.
+
+Usage: python benchmarks/bench_scraper.py [--pages DIR] [--count N] [--items N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from html.parser import HTMLParser
+
+import common
+import value_scraper
+from bill_generator import BillGenerator
+
+# Filler repeated around each listing so pages are about the size of real
+# ones (roughly 1-2 MB for 60 listings)
+LISTING_FILLER = ''.join(
+    f'<div class="s-item__detail s-item__detail--secondary"><span class="s-item__dynamic s-item__sep{i}" '
+    f'role="text"><span aria-hidden="true">Seller {i} &middot; 99.{i}% positive</span></span>'
+    f'<svg class="icon" focusable="false"><use href="#icon-{i}"></use></svg></div>'
+    for i in range(40)
+)
+
+def listing_price(rng):
+    """Price text for one listing and the price it should parse to (None if not a dollar price)"""
+    roll = rng.random()
+    low = round(rng.lognormvariate(2.5, 0.6), 2)
+    if roll < 0.10:
+        high = round(low * rng.uniform(1.2, 3), 2)
+        return f'${low:,.2f}<span class="DEFAULT"> to </span>${high:,.2f}', (low + high) / 2
+    if roll < 0.15:
+        return f'C ${low:,.2f}', None
+    if roll < 0.20:
+        # Lots of many notes, far above single-bill prices
+        low = round(low * rng.uniform(50, 200), 2)
+    return f'${low:,.2f}', low
+
+def render_pages(directory, count, items, seed=0):
+    """Write count search pages to directory; returns {path: expected prices}"""
+    rng = random.Random(seed)
+    bills = BillGenerator(seed).bills(count * items)
+    expected = {}
+    for page in range(count):
+        prices = []
+        listings = []
+        for _ in range(items):
+            bill = next(bills)
+            text, price = listing_price(rng)
+            if price is not None:
+                prices.append(price)
+            listings.append(
+                f'<li class="s-item s-item__pl-on-bottom" data-viewport="{{&quot;trackableId&quot;:1}}">'
+                f'<div class="s-item__wrapper clearfix"><div class="s-item__image-section">'
+                f'<img src="https://i.ebayimg.com/{bill["serial_number"]}.webp" alt="bill"></div>'
+                f'<div class="s-item__info clearfix"><div class="s-item__title"><span role="heading">'
+                f'${bill["face_value"]:g} Federal Reserve Note {bill["serial_number"]} Series {bill["series_year"]}'
+                f'</span></div><div class="s-item__details clearfix"><div class="s-item__detail">'
+                f'<span class="s-item__price">{text}</span></div>'
+                f'<span class="s-item__shipping s-item__logisticsCost">+$4.95 shipping</span>'
+                f'{LISTING_FILLER}</div></div></div></li>'
+            )
+        path = os.path.join(directory, f'search-{page:03d}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html><html><head><title>dollar bill | eBay</title>'
+                    f'<script>window.SRP = {{"items": {items}}};</script></head><body>'
+                    f'<ul class="srp-results srp-list clearfix">{"".join(listings)}</ul></body></html>')
+        expected[path] = prices
+    return expected
+
+class _FullParse(HTMLParser):
+    """What bs4 does with 'html.parser': an event for every tag on the page"""
+    def __init__(self):
+        super().__init__()
+        self.depth = 0
+        self.texts = []
+        
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            self.depth += 1
+        elif value_scraper.PRICE_CLASS in (dict(attrs).get('class') or '').split():
+            self.depth = 1
+            self.texts.append('')
+            
+    def handle_endtag(self, tag):
+        if self.depth:
+            self.depth -= 1
+            
+    def handle_data(self, data):
+        if self.depth:
+            self.texts[-1] += data
+
+def baseline_texts(html):
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        parser = _FullParse()
+        parser.feed(html)
+        parser.close()
+        return parser.texts
+    return [item.text for item in BeautifulSoup(html, 'html.parser').select(f'.{value_scraper.PRICE_CLASS}')]
+
+def parsers():
+    """(name, function returning price texts) for the baseline and both value_scraper parsers"""
+    return [('baseline', baseline_texts),
+            ('selectolax', lambda html: value_scraper.price_texts(html, 'selectolax')),
+            ('scan', lambda html: value_scraper.price_texts(html, 'scan'))]
+
+def run(pages, expected, repeat):
+    scraper = value_scraper.ValueScraper()
+    total_bytes = sum(len(html.encode()) for html in pages.values())
+    results = {}
+    reference = None
+    for name, extract in parsers():
+        latencies = []
+        extracted = {}
+        for _ in range(repeat):
+            for path, html in pages.items():
+                start = time.perf_counter()
+                texts = extract(html)
+                latencies.append(time.perf_counter() - start)
+                extracted[path] = [price for price in map(value_scraper.parse_price, texts) if price is not None]
+        elapsed = sum(latencies)
+        
+        if reference is None:
+            reference = extracted
+        correct = sum(1 for path, prices in extracted.items()
+                      if _same_prices(prices, expected.get(path, reference[path])))
+        results[name] = {
+            'latency': common.summarize(latencies),
+            'pages_per_second': len(latencies) / elapsed if elapsed else 0,
+            'mb_per_second': total_bytes * repeat / elapsed / 1e6 if elapsed else 0,
+            'pages_matching': correct / len(pages)
+        }
+        
+    samples = common.time_calls(lambda: [value_scraper.robust_average(scraper.listing_prices(html))
+                                         for html in pages.values()], repeat)
+    return {
+        'pages': len(pages),
+        'repeat': repeat,
+        'mean_page_kb': total_bytes / len(pages) / 1024,
+        'default_parser': value_scraper.PRICE_PARSER,
+        'parsers': results,
+        'listing_prices_and_average': common.summarize([sample / len(pages) for sample in samples])
+    }
+
+def _same_prices(found, expected):
+    return len(found) == len(expected) and all(abs(a - b) < 0.005 for a, b in zip(found, expected))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', help="directory of saved search result pages (*.html)")
+    parser.add_argument('--count', type=int, default=20, help="synthetic pages to write when --pages is not given")
+    parser.add_argument('--items', type=int, default=60, help="listings per synthetic page")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.pages
+        expected = {}
+        if directory is None:
+            expected = render_pages(tmp, args.count, args.items)
+            directory = tmp
+        pages = {}
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(('.html', '.htm')):
+                path = os.path.join(directory, name)
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    pages[path] = f.read()
+        if not pages:
+            print(f"No pages found in {directory}")
+            sys.exit(1)
+        results = run(pages, expected, args.repeat)
+        
+    results['source'] = args.pages or 'synthetic'
+    print(f"\n{results['pages']} pages of {results['mean_page_kb']:.0f} KB x {args.repeat}, "
+          f"default parser {results['default_parser']}")
+    for name, summary in results['parsers'].items():
+        print(f"  {name:<10} {summary['pages_per_second']:8.1f} pages/s  {summary['mb_per_second']:7.1f} MB/s  "
+              f"p50 {summary['latency']['p50_ms']:7.2f} ms  {summary['pages_matching']:.0%} of pages match")
+    print(f"  listing_prices + robust_average: {results['listing_prices_and_average']['mean_ms']:.2f} ms per page")
+    common.write_results('scraper', results, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""Time from process start to the GUI's login dialog, over fresh processes.
+
+Each run starts a new interpreter with a throwaway HOME (so no GitHub setup
+prompt), imports gui, builds the window and stops the moment the login
+dialog would open. Qt runs offscreen, so no display is needed.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--output FILE]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import common
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import gui
+imported = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+
+def report(dialog):
+    print(json.dumps({
+        'import_s': imported - start,
+        'window_s': built - start,
+        'login_dialog_s': time.perf_counter() - start,
+        'heavy_modules_loaded': sorted(m for m in ('cv2', 'numpy', 'pytesseract', 'requests', 'bs4') if m in sys.modules)
+    }))
+    sys.stdout.flush()
+    import os
+    os._exit(0)
+
+gui.LoginDialog.exec = report
+app = QApplication(sys.argv[:1])
+window = gui.DollarTrackerGUI()
+window.show()
+built = time.perf_counter()
+app.exec()
+'''
+
+# Roughly what gui.py used to import before the window could appear
+EAGER_PROBE = r'''
+import time
+start = time.perf_counter()
+for name in ('cv2', 'numpy', 'PIL.Image', 'pytesseract', 'requests', 'bs4'):
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+print(time.perf_counter() - start)
+'''
+
+def run_probe(home):
+    env = dict(os.environ, HOME=home, QT_QPA_PLATFORM='offscreen')
+    completed = subprocess.run([sys.executable, '-c', PROBE, common.REPO_DIR], env=env,
+                               capture_output=True, text=True, timeout=120)
+    for line in completed.stdout.splitlines():
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"Startup probe failed:\n{completed.stderr}")
+
+def run(runs):
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = os.path.join(home, '.dollar_tracker')
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+            json.dump({'github_token': 'benchmark', 'auto_update': False, 'theme': 'default'}, f)
+            
+        samples = [run_probe(home) for _ in range(runs)]
+        
+    eager = subprocess.run([sys.executable, '-c', EAGER_PROBE], capture_output=True, text=True)
+    results = {
+        'runs': runs,
+        'heavy_modules_loaded': samples[-1]['heavy_modules_loaded'],
+        'eager_imports_s': float(eager.stdout.strip() or 0)
+    }
+    for key in ('import_s', 'window_s', 'login_dialog_s'):
+        results[key] = common.summarize([sample[key] for sample in samples])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    try:
+        import PyQt6  # noqa: F401
+    except ImportError as e:
+        print(f"Startup benchmark skipped: {e}")
+        sys.exit(0)
+        
+    results = run(args.runs)
+    print(f"\nTime to login dialog over {args.runs} runs:")
+    for key in ('import_s', 'window_s', 'login_dialog_s'):
+        summary = results[key]
+        print(f"  {key:<16} p50 {summary['p50_ms']:8.1f} ms  max {summary['max_ms']:8.1f} ms")
+    print(f"  heavy modules loaded before the dialog: {', '.join(results['heavy_modules_loaded']) or 'none'}")
+    print(f"  (importing them eagerly would add about {results['eager_imports_s'] * 1000:.0f} ms)")
+    common.write_results('startup', results, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Synthetic bills with realistic Federal Reserve Note serial numbers.
+
+Modern notes carry a series letter, a Federal Reserve Bank letter (A-L),
+eight digits and a suffix letter (A-Y, no O); star notes replace the
+suffix with '*'. The series letters below are close to, but not an exact
+copy of, the Bureau of Engraving and Printing's assignments.
+"""
+import random
+
+DISTRICTS = 'ABCDEFGHIJKL'
+SUFFIXES = 'ABCDEFGHIJKLMNPQRSTUVWXY'
+SERIES_LETTERS = {2003: 'F', 2006: 'G', 2009: 'J', 2013: 'L', 2017: 'P', 2021: 'R'}
+# Rough share of each denomination passing through a shop till
+DENOMINATIONS = {1: 40, 2: 1, 5: 15, 10: 10, 20: 25, 50: 3, 100: 6}
+STAR_RATE = 0.015
+
+class BillGenerator:
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.seen = set()
+        
+    def serial(self, series_year, district, is_star):
+        suffix = '*' if is_star else self.rng.choice(SUFFIXES)
+        return f"{SERIES_LETTERS[series_year]}{district}{self.rng.randrange(10 ** 8):08d}{suffix}"
+        
+    def bill(self):
+        """One bill as add_bill keyword arguments, with a serial not generated before"""
+        while True:
+            series_year = self.rng.choice(list(SERIES_LETTERS))
+            district = self.rng.choice(DISTRICTS)
+            is_star = self.rng.random() < STAR_RATE
+            serial_number = self.serial(series_year, district, is_star)
+            if serial_number not in self.seen:
+                self.seen.add(serial_number)
+                break
+                
+        face_value = self.rng.choices(list(DENOMINATIONS), weights=list(DENOMINATIONS.values()))[0]
+        return {
+            'face_value': float(face_value),
+            'serial_number': serial_number,
+            'printing_location': district,
+            'series_year': series_year,
+            'is_star_note': is_star,
+            'is_star_filled': False,
+            'image_path': None,
+            'estimated_value': round(self.rng.uniform(face_value, face_value * 3), 2) if self.rng.random() < 0.3 else None
+        }
+        
+    def bills(self, count):
+        for _ in range(count):
+            yield self.bill()
+
+def as_row(bill, bill_id, user_id=1, username='user1'):
+    """A bill dict in the shape search_bills returns (bills.* plus username and series letter)"""
+    return [
+        bill_id, bill['face_value'], bill['serial_number'], '2024-06-01 12:00:00',
+        bill['printing_location'], bill['series_year'], int(bill['is_star_note']),
+        int(bill['is_star_filled']), bill['image_path'], bill['estimated_value'],
+        user_id, username, None
+    ]
+
+def fill_database(db, count, user_id=1, seed=0, batch_size=10000):
+    """Bulk-load count generated bills straight into a Database's bills table"""
+    from database import bill_row
+    
+    generator = BillGenerator(seed)
+    remaining = count
+    while remaining > 0:
+        batch = [generator.bill() for _ in range(min(batch_size, remaining))]
+        with db.lock:
+            db._insert_rows([bill_row(b, user_id) for b in batch])
+            db.conn.commit()
+        remaining -= len(batch)
+    return generator
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Shared helpers for the benchmark scripts: timing summaries and JSON output"""
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+# Let the scripts import the application modules when run from anywhere
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': ordered[-1] * 1000
+    }
+
+def time_calls(function, repeat):
+    """Call function repeat times and return the individual durations"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version
+    }
+
+def write_results(name, results, path=None):
+    """Write results plus run environment as JSON; returns the file path"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump({'benchmark': name, 'environment': environment(), 'results': results}, f, indent=4)
+    print(f"Results written to {path}")
+    return path
\ No newline at end of file
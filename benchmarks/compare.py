@@ -0,0 +1,73 @@
+"""Compare two benchmark result files metric by metric.
+
+Usage: python benchmarks/compare.py BASELINE.json CANDIDATE.json [--threshold PCT]
+"""
+import argparse
+import json
+
+# Metrics where a bigger number is the better outcome
+HIGHER_IS_BETTER = ('throughput_rps', 'images_per_second', 'accuracy')
+
+def flatten(value, prefix=''):
+    """Map dotted paths to every numeric leaf; list items are keyed by size/format when present"""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    items = {}
+    if isinstance(value, dict):
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            label = index
+            if isinstance(child, dict):
+                if 'size' in child:
+                    label = child['size']
+                elif 'format' in child:
+                    label = '/'.join(str(v) for v in child['format'].values())
+            items.update(flatten(child, f"{prefix}[{label}]"))
+    return items
+
+def compare(baseline, candidate, threshold):
+    before = flatten(baseline['results'])
+    after = flatten(candidate['results'])
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if key.endswith(HIGHER_IS_BETTER) else change < 0
+        flag = ''
+        if abs(change) >= threshold and not key.endswith('count'):
+            flag = 'better' if better else 'WORSE'
+        rows.append((key, old, new, change, flag))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=5.0, help="percent change worth flagging")
+    args = parser.parse_args()
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get('benchmark') != candidate.get('benchmark'):
+        print(f"Warning: comparing {baseline.get('benchmark')} with {candidate.get('benchmark')}")
+    for label, data in (('baseline', baseline), ('candidate', candidate)):
+        env = data.get('environment', {})
+        print(f"{label:<10} {env.get('timestamp')}  commit {str(env.get('git_commit'))[:10]}")
+        
+    rows = compare(baseline, candidate, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'metric':<{width}}{'baseline':>14}{'candidate':>14}{'change':>10}")
+    for key, old, new, change, flag in rows:
+        print(f"{key:<{width}}{old:>14.3f}{new:>14.3f}{change:>+9.1f}%  {flag}")
+        
+    regressions = sum(1 for row in rows if row[4] == 'WORSE')
+    print(f"\n{regressions} metric(s) worse by {args.threshold:.0f}% or more")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Multi-client load generator driving DollarTrackerServer through DollarTrackerClient.
+
+By default a server is started in this process on a free port with a
+throwaway database; pass --host/--port to load an already running one.
+
+Usage: python benchmarks/load_test.py [--clients N] [--duration S] [--search-ratio R] [--preload N] [--no-cache]
+"""
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import common
+from bill_generator import BillGenerator, fill_database
+from client import DollarTrackerClient
+
+SEARCHES = [
+    {'face_value': 20.0},
+    {'printing_location': 'G'},
+    {'series_year': 2017},
+    {'is_star_note': True}
+]
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(db_name, preload, cache=True):
+    # Logins are part of the measured work; keep hashing cheap so they don't dominate
+    os.environ.setdefault('DOLLAR_TRACKER_HASH_ITERATIONS', '10000')
+    from server import DollarTrackerServer, CACHE_BYTES
+    
+    port = free_port()
+    server = DollarTrackerServer('127.0.0.1', port, db_name=db_name, invitations_db=db_name,
+                                 cache_bytes=CACHE_BYTES if cache else 0)
+    if preload:
+        server.db.create_user('preload', 'preload')
+        fill_database(server.db, preload, seed=1)
+    threading.Thread(target=server.start, daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server, port
+
+class Worker(threading.Thread):
+    def __init__(self, index, host, port, deadline, search_ratio, compact):
+        super().__init__(daemon=True)
+        self.index = index
+        self.client = DollarTrackerClient(host, port, compact=compact)
+        self.deadline = deadline
+        self.search_ratio = search_ratio
+        self.generator = BillGenerator(seed=1000 + index)
+        self.latencies = {'add_bill': [], 'search_bills': []}
+        self.errors = 0
+        self.login_seconds = None
+        
+    def run(self):
+        username = f"load{self.index}_{os.getpid()}"
+        if not self.client.connect():
+            self.errors += 1
+            return
+        self.client.create_user(username, 'load-test')
+        start = time.perf_counter()
+        if not self.client.login(username, 'load-test')['success']:
+            self.errors += 1
+            return
+        self.login_seconds = time.perf_counter() - start
+        
+        rng = self.generator.rng
+        try:
+            while time.perf_counter() < self.deadline:
+                if rng.random() < self.search_ratio:
+                    action = 'search_bills'
+                    call = lambda: self.client.search_bills(rng.choice(SEARCHES))
+                else:
+                    action = 'add_bill'
+                    bill = self.generator.bill()
+                    call = lambda: self.client.add_bill(**bill)
+                start = time.perf_counter()
+                response = call()
+                self.latencies[action].append(time.perf_counter() - start)
+                if not response.get('success'):
+                    self.errors += 1
+        finally:
+            self.client.disconnect()
+
+def run(host, port, clients, duration, search_ratio, compact):
+    deadline = time.perf_counter() + duration
+    workers = [Worker(i, host, port, deadline, search_ratio, compact) for i in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    
+    results = {'clients': clients, 'duration_s': elapsed, 'search_ratio': search_ratio, 'compact': compact}
+    total = 0
+    for action in ('add_bill', 'search_bills'):
+        samples = [s for worker in workers for s in worker.latencies[action]]
+        total += len(samples)
+        results[action] = common.summarize(samples)
+        results[action]['throughput_rps'] = len(samples) / elapsed
+    results['login'] = common.summarize([w.login_seconds for w in workers if w.login_seconds is not None])
+    results['requests'] = total
+    results['throughput_rps'] = total / elapsed
+    results['errors'] = sum(worker.errors for worker in workers)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', help="load an existing server instead of starting one")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of load per client")
+    parser.add_argument('--search-ratio', type=float, default=0.8)
+    parser.add_argument('--preload', type=int, default=10000, help="bills to insert before starting (in-process server only)")
+    parser.add_argument('--plain', action='store_true', help="use the JSON wire format instead of the compact one")
+    parser.add_argument('--no-cache', action='store_true', help="disable the in-process server's response cache")
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        host, port = args.host, args.port
+        if host is None:
+            server, port = start_server(os.path.join(tmp, 'load.db'), args.preload, not args.no_cache)
+            host = '127.0.0.1'
+            
+        results = run(host, port, args.clients, args.duration, args.search_ratio, not args.plain)
+        if args.host is None:
+            results['preload'] = args.preload
+            results['server_metrics'] = server.metrics.snapshot()
+            if server.response_cache:
+                results['response_cache'] = server.response_cache.stats()
+                
+    print(f"\n{args.clients} clients for {results['duration_s']:.1f}s: "
+          f"{results['throughput_rps']:.0f} req/s, {results['errors']} errors")
+    for action in ('add_bill', 'search_bills', 'login'):
+        summary = results[action]
+        if summary['count']:
+            print(f"  {action:<14} n={summary['count']:<7} p50 {summary['p50_ms']:8.2f} ms  "
+                  f"p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms")
+    if 'response_cache' in results:
+        print(f"  response cache hit rate {results['response_cache']['hit_rate']:.0%}")
+    common.write_results('load', results, args.output)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""Run every benchmark with quick default settings, writing one JSON file each.
+
+Usage: python benchmarks/run_all.py [--quick]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="smaller sizes and shorter runs, for a smoke check")
+    args = parser.parse_args()
+    
+    if args.quick:
+        runs = [
+            ('bench_protocol.py', ['--rows', '2000', '--repeat', '3']),
+            ('bench_database.py', ['--sizes', '1000,10000', '--repeat', '20']),
+            ('load_test.py', ['--clients', '4', '--duration', '3', '--preload', '2000']),
+            ('bench_ocr.py', ['--count', '5']),
+            ('bench_scraper.py', ['--count', '5', '--repeat', '1']),
+            ('bench_startup.py', ['--runs', '2'])
+        ]
+    else:
+        runs = [
+            ('bench_protocol.py', []),
+            ('bench_database.py', []),
+            ('load_test.py', []),
+            ('bench_ocr.py', []),
+            ('bench_scraper.py', []),
+            ('bench_startup.py', [])
+        ]
+        
+    failed = []
+    for script, extra in runs:
+        print(f"\n=== {script} {' '.join(extra)}")
+        if subprocess.run([sys.executable, os.path.join(BENCHMARK_DIR, script)] + extra).returncode:
+            failed.append(script)
+            
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import math
+from array import array
+
+from serials import series_text
+
+# Names for the positions of a bill row, in BILL_SELECT order (database.py)
+BILL_COLUMNS = ('id', 'face_value', 'serial_number', 'date_recorded', 'printing_location',
+                'series_year', 'is_star_note', 'is_star_filled', 'image_path',
+                'estimated_value', 'added_by', 'username', 'series_suffix')
+
+# Integer columns have no NULL, so a missing id or year is stored as this
+MISSING = -(2 ** 63)
+
+class Bill:
+    """One bill row with named fields.
+    
+    Also indexes like the row it came from (bill[2] is bill.serial_number),
+    so code written against plain rows keeps working.
+    """
+    __slots__ = BILL_COLUMNS
+    
+    def __init__(self, *values):
+        for name, value in zip(BILL_COLUMNS, values):
+            setattr(self, name, value)
+        for name in BILL_COLUMNS[len(values):]:
+            setattr(self, name, None)
+            
+    @classmethod
+    def from_row(cls, row):
+        return row if isinstance(row, cls) else cls(*row)
+        
+    @property
+    def series(self):
+        """Year and letter as printed on the note ('2017A'), or ''"""
+        return series_text(self.series_year, self.series_suffix)
+        
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in BILL_COLUMNS)
+        
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+        
+    def __iter__(self):
+        return iter(self.as_tuple())
+        
+    def __len__(self):
+        return len(BILL_COLUMNS)
+        
+    def __eq__(self, other):
+        if isinstance(other, Bill):
+            return self.as_tuple() == other.as_tuple()
+        return NotImplemented
+        
+    def __repr__(self):
+        return f"Bill({self.serial_number!r}, face_value={self.face_value!r}, id={self.id!r})"
+
+class BillResultSet:
+    """Search results stored column by column instead of as a list of rows.
+    
+    Numbers live in typed arrays, the star flags in a bytearray, and
+    printing locations and usernames, which repeat on nearly every row, as
+    small integer codes into a table of their distinct values. Only serials,
+    dates and image paths stay as Python strings. That is well under half
+    the memory of a list of row lists for a large collection.
+    
+    Indexing or iterating builds Bill records on the fly; column() returns
+    a whole column without building any.
+    """
+    def __init__(self, columns=None):
+        columns = columns or [[] for _ in BILL_COLUMNS]
+        self.ids = _int_array(columns[0])
+        self.face_values = _float_array(columns[1])
+        self.serial_numbers = list(columns[2])
+        self.dates = list(columns[3])
+        self.locations = _Dictionary(columns[4])
+        self.series_years = _int_array(columns[5])
+        self.star_notes = bytearray(bool(value) for value in columns[6])
+        self.star_filled = bytearray(bool(value) for value in columns[7])
+        self.image_paths = list(columns[8])
+        self.estimated_values = _float_array(columns[9])
+        self.added_by = _int_array(columns[10])
+        self.usernames = _Dictionary(columns[11])
+        # Rows from servers older than the series letter end at the username
+        self.series_suffixes = _Dictionary(columns[12] if len(columns) > 12 else [None] * len(columns[2]))
+        
+    @classmethod
+    def from_columns(cls, columns):
+        """Build straight from the columnar wire format ({'columns': [...]})"""
+        return cls(columns)
+        
+    @classmethod
+    def from_rows(cls, rows):
+        rows = list(rows)
+        if not rows:
+            return cls()
+        return cls([list(column) for column in zip(*rows)])
+        
+    def __len__(self):
+        return len(self.serial_numbers)
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return Bill(*[convert(column[index]) for column, convert in self._columns()])
+        
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+            
+    def __repr__(self):
+        return f"<BillResultSet of {len(self)} bills>"
+        
+    def column(self, name):
+        """Every value of one field, in row order, without building Bill records"""
+        column, convert = self._columns()[BILL_COLUMNS.index(name)]
+        return [convert(column[index]) for index in range(len(self))]
+        
+    def rows(self):
+        """Plain row tuples, e.g. to hand to code that stores them"""
+        return [bill.as_tuple() for bill in self]
+        
+    def _columns(self):
+        # (storage, conversion back to the row value) in BILL_COLUMNS order
+        return [(self.ids, _int), (self.face_values, _same), (self.serial_numbers, _same),
+                (self.dates, _same), (self.locations, _same), (self.series_years, _int),
+                (self.star_notes, bool), (self.star_filled, bool), (self.image_paths, _same),
+                (self.estimated_values, _float), (self.added_by, _int), (self.usernames, _same),
+                (self.series_suffixes, _same)]
+
+class _Dictionary:
+    """A column of few distinct values, stored as small integer codes"""
+    def __init__(self, values):
+        self.values = []
+        positions = {}
+        codes = []
+        for value in values:
+            code = positions.get(value)
+            if code is None:
+                code = positions[value] = len(self.values)
+                self.values.append(value)
+            codes.append(code)
+        self.codes = array('B' if len(self.values) <= 256 else 'H' if len(self.values) <= 65536 else 'I', codes)
+        
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+def _int_array(values):
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return array('q', [_number(value, _int64, MISSING) for value in values])
+
+def _float_array(values):
+    try:
+        return array('d', values)
+    except TypeError:
+        return array('d', [_number(value, float, math.nan) for value in values])
+
+def _int64(value):
+    value = int(value)
+    if not MISSING < value < 2 ** 63:
+        raise OverflowError(f"{value} does not fit in 64 bits")
+    return value
+
+def _number(value, convert, missing):
+    """convert(value), or missing for None and anything that is not a number.
+    
+    SQLite columns keep whatever was stored in them, so an old row can hold
+    text like 'about $5' where a number belongs; it shows as empty rather
+    than failing the whole result.
+    """
+    try:
+        return convert(value)
+    except (TypeError, ValueError, OverflowError):
+        return missing
+
+def _same(value):
+    return value
+
+def _int(value):
+    return None if value == MISSING else value
+
+def _float(value):
+    return None if math.isnan(value) else value
\ No newline at end of file
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from serials import parse_series, series_text
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Columns in exported files; imports accept any subset in any order
+EXPORT_COLUMNS = ('serial_number', 'face_value', 'printing_location', 'series_year', 'is_star_note',
+                  'is_star_filled', 'estimated_value', 'image_path', 'date_recorded', 'added_by')
+# Positions of EXPORT_COLUMNS in a bills.* + username row
+ROW_INDEXES = (2, 1, 4, 5, 6, 7, 9, 8, 3, 11)
+SERIES_COLUMN = EXPORT_COLUMNS.index('series_year')
+SERIAL_PATTERN = re.compile(r'^[A-Z0-9]{8,11}\*?$')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't', 'x'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'f'}
+# Per-row errors kept in an import report; the total is always counted
+MAX_REPORTED_ERRORS = 1000
+
+def export_rows(db, page_size=5000):
+    """Yield the header and then one list per bill, reading the table page by page"""
+    yield list(EXPORT_COLUMNS)
+    for row in db.iter_bills(page_size):
+        values = [row[index] for index in ROW_INDEXES]
+        if row[12]:
+            # A lettered series goes out as printed on the note ('2017A')
+            values[SERIES_COLUMN] = series_text(row[5], row[12])
+        yield values
+
+def export_csv(db, path):
+    """Write every bill to a CSV file; returns the number of bills written"""
+    count = -1
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for count, row in enumerate(export_rows(db)):
+            writer.writerow(row)
+    return count
+
+def export_xlsx(db, path):
+    """Write every bill to an Excel sheet in openpyxl's streaming write-only mode"""
+    _require_openpyxl()
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Bills')
+    count = -1
+    for count, row in enumerate(export_rows(db)):
+        sheet.append(row)
+    workbook.save(path)
+    return count
+
+def read_rows(path):
+    """Yield (row number, dict) from a CSV or XLSX file whose first row names the columns"""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        _require_openpyxl()
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name).strip().lower() if name is not None else '' for name in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                yield number, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = [name.strip().lower() for name in next(reader, [])]
+            for number, values in enumerate(reader, start=2):
+                yield number, dict(zip(header, values))
+
+def date_value(value):
+    """A recorded date as the database stores it ('2024-06-01 12:00:00', UTC), or None if blank.
+    
+    Takes a datetime (Excel cells) or ISO 8601 text; times without a UTC
+    offset are taken to be UTC already, as exports write them.
+    """
+    if value is None or isinstance(value, str) and not value.strip():
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def validate_row(row):
+    """Turn one imported row into a bill dict; returns (bill, None) or (None, error message)"""
+    serial_number = str(row.get('serial_number') or '').strip().upper()
+    if not serial_number:
+        return None, 'missing serial_number'
+    if not SERIAL_PATTERN.match(serial_number):
+        return None, f"invalid serial_number {serial_number!r}"
+        
+    try:
+        face_value = float(row.get('face_value') or '')
+    except (TypeError, ValueError):
+        return None, f"invalid face_value {row.get('face_value')!r}"
+    if face_value <= 0:
+        return None, f"invalid face_value {row.get('face_value')!r}"
+        
+    try:
+        series_year = series_text(*parse_series(row.get('series_year'))) or None
+    except ValueError:
+        return None, f"invalid series_year {row.get('series_year')!r}"
+        
+    estimated_value = row.get('estimated_value')
+    if estimated_value not in (None, ''):
+        try:
+            estimated_value = float(estimated_value)
+        except (TypeError, ValueError):
+            return None, f"invalid estimated_value {estimated_value!r}"
+    else:
+        estimated_value = None
+        
+    try:
+        date_recorded = date_value(row.get('date_recorded'))
+    except (TypeError, ValueError):
+        return None, f"invalid date_recorded {row.get('date_recorded')!r}"
+        
+    bill = {
+        'serial_number': serial_number,
+        'face_value': face_value,
+        'printing_location': (str(row.get('printing_location') or '').strip().upper() or None),
+        'series_year': series_year,
+        'estimated_value': estimated_value,
+        'image_path': row.get('image_path') or None,
+        'date_recorded': date_recorded
+    }
+    for name in ('is_star_note', 'is_star_filled'):
+        value = str(row.get(name) if row.get(name) is not None else '').strip().lower()
+        if value in TRUE_VALUES:
+            bill[name] = True
+        elif value in FALSE_VALUES:
+            bill[name] = False
+        else:
+            return None, f"invalid {name} {row.get(name)!r}"
+    return bill, None
+
+def import_bills(db, path, user_id, chunk_size=20000):
+    """Validate and insert bills from a CSV/XLSX file in transactional chunks.
+    
+    Each chunk is validated, then inserted with one executemany in its own
+    transaction, so a failure loses at most one chunk. Invalid rows and
+    serials already in the table are skipped and reported with their
+    row number; everything else is imported. Imported serials that look
+    like an OCR misreading of another recorded serial are imported too,
+    but listed under possible_duplicates.
+    """
+    report = {'rows': 0, 'inserted': 0, 'error_count': 0, 'errors': [],
+              'possible_duplicate_count': 0, 'possible_duplicates': []}
+              
+    def add_error(number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+            
+    def flush(chunk):
+        inserted, skipped = db.add_bills_batch([bill for _, bill in chunk], user_id)
+        report['inserted'] += inserted
+        skipped = set(skipped)
+        if skipped:
+            for number, bill in chunk:
+                if bill['serial_number'] in skipped:
+                    add_error(number, f"serial_number {bill['serial_number']} already recorded")
+                    
+        similar = db.find_similar_serials_batch(
+            [bill['serial_number'] for _, bill in chunk if bill['serial_number'] not in skipped])
+        for number, bill in chunk:
+            if bill['serial_number'] in similar:
+                report['possible_duplicate_count'] += 1
+                if len(report['possible_duplicates']) < MAX_REPORTED_ERRORS:
+                    report['possible_duplicates'].append({'row': number, 'serial_number': bill['serial_number'],
+                                                          'matches': similar[bill['serial_number']]})
+                                                          
+    chunk, chunk_serials = [], {}
+    for number, row in read_rows(path):
+        report['rows'] += 1
+        bill, error = validate_row(row)
+        if error:
+            add_error(number, error)
+            continue
+        if bill['serial_number'] in chunk_serials:
+            add_error(number, f"duplicate of row {chunk_serials[bill['serial_number']]}")
+            continue
+        chunk_serials[bill['serial_number']] = number
+        chunk.append((number, bill))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk, chunk_serials = [], {}
+    if chunk:
+        flush(chunk)
+    return report
+
+def _require_openpyxl():
+    if openpyxl is None:
+        raise RuntimeError("Excel files need openpyxl (pip install openpyxl)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export the bills table as CSV or Excel")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', help="a .csv or .xlsx file")
+    parser.add_argument('--db', default='dollar_tracker.db')
+    parser.add_argument('--user', help="username that imported bills are credited to")
+    args = parser.parse_args()
+    
+    from database import Database
+    
+    db = Database(args.db)
+    start = time.perf_counter()
+    if args.command == 'export':
+        exporter = export_xlsx if args.path.lower().endswith('.xlsx') else export_csv
+        count = exporter(db, args.path)
+        print(f"Exported {count} bills to {args.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        if not os.path.exists(args.path):
+            parser.error(f"{args.path} does not exist")
+        with db.lock:
+            db.cursor.execute('SELECT id FROM users WHERE username = ?', (args.user,))
+            user = db.cursor.fetchone()
+        if user is None:
+            parser.error("--user must name an existing user")
+        report = import_bills(db, args.path, user[0])
+        print(f"Imported {report['inserted']} of {report['rows']} rows in {time.perf_counter() - start:.1f}s, "
+              f"{report['error_count']} errors, {report['possible_duplicate_count']} possible duplicates")
+        for error in report['errors'][:20]:
+            print(f"  row {error['row']}: {error['error']}")
+        for duplicate in report['possible_duplicates'][:20]:
+            print(f"  row {duplicate['row']}: {duplicate['serial_number']} looks like {', '.join(duplicate['matches'])}")
+    db.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+# Frames are compared at this width; motion detection needs no more detail
+PREVIEW_WIDTH = 160
+
+class StableFrameDetector:
+    """Decide from cheap frame differences when a note is held still.
+    
+    Each frame is shrunk, blurred and compared with the previous one. The
+    first still scene becomes the empty background. A trigger fires once
+    the scene has been still for stable_frames checks and differs from
+    that background, and fires only once per note: the scene has to move
+    again (the note swapped or taken away) before the next trigger.
+    """
+    def __init__(self, motion_threshold=4.0, presence_threshold=12.0, stable_frames=5):
+        self.motion_threshold = motion_threshold
+        self.presence_threshold = presence_threshold
+        self.stable_frames = stable_frames
+        self.previous = None
+        self.background = None
+        self.still_count = 0
+        self.triggered = False
+        
+    def reset(self):
+        self.previous = None
+        self.background = None
+        self.still_count = 0
+        self.triggered = False
+        
+    def update(self, frame):
+        """Feed a BGR frame; returns True when it should be recognized"""
+        small = self._shrink(frame)
+        previous, self.previous = self.previous, small
+        if previous is None:
+            return False
+            
+        if cv2.absdiff(small, previous).mean() > self.motion_threshold:
+            self.still_count = 0
+            self.triggered = False
+            return False
+            
+        self.still_count += 1
+        if self.still_count < self.stable_frames or self.triggered:
+            return False
+            
+        if self.background is None:
+            self.background = small
+            self.triggered = True
+            return False
+            
+        if cv2.absdiff(small, self.background).mean() < self.presence_threshold:
+            # Still, but back to the empty scene; follow slow lighting changes
+            self.background = small
+            self.triggered = True
+            return False
+            
+        self.triggered = True
+        return True
+        
+    def _shrink(self, frame):
+        height, width = frame.shape[:2]
+        size = (PREVIEW_WIDTH, max(1, height * PREVIEW_WIDTH // width))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+class CameraCapture:
+    """Read frames from a camera or video file and recognize the stable ones.
+    
+    source is a camera index (0 for the default webcam) or a video file
+    path, which lets the whole pipeline run from a recording. Only every
+    frame_skip-th frame is checked for stability, and recognition runs on
+    a single background worker; frames that turn stable while it is busy
+    are dropped rather than queued, so the loop never falls behind the
+    camera. on_result(result, frame) is called from the worker thread.
+    """
+    def __init__(self, processor, on_result, source=0, frame_skip=2, detector=None):
+        self.processor = processor
+        self.on_result = on_result
+        self.source = source
+        self.frame_skip = max(1, frame_skip)
+        self.detector = detector or StableFrameDetector()
+        self.recognizer = ThreadPoolExecutor(max_workers=1)
+        self.busy = threading.Event()
+        self.running = False
+        self.thread = None
+        self.frames_read = 0
+        self.frames_recognized = 0
+        
+    def start(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            print(f"Could not open camera source {self.source}")
+            return False
+            
+        self.detector.reset()
+        self.running = True
+        self.thread = threading.Thread(target=self._read_frames, args=(capture,), daemon=True)
+        self.thread.start()
+        return True
+        
+    def stop(self, wait=True):
+        self.running = False
+        if wait and self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.recognizer.shutdown(wait=wait)
+        
+    def is_running(self):
+        return self.running
+        
+    def _read_frames(self, capture):
+        # Files play back at their recorded rate so detector timing matches a live camera
+        is_file = isinstance(self.source, str)
+        frame_interval = 1 / (capture.get(cv2.CAP_PROP_FPS) or 30) if is_file else 0
+        try:
+            while self.running:
+                started = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                if self.frames_read % self.frame_skip == 0 and self.detector.update(frame):
+                    self._submit(frame)
+                if frame_interval:
+                    time.sleep(max(0, frame_interval - (time.perf_counter() - started)))
+        finally:
+            capture.release()
+            self.running = False
+            
+    def _submit(self, frame):
+        if self.busy.is_set():
+            return
+        self.busy.set()
+        self.recognizer.submit(self._recognize, frame.copy())
+        
+    def _recognize(self, frame):
+        try:
+            result = self.processor.process_bill_frame(frame)
+            self.frames_recognized += 1
+            self.on_result(result, frame)
+        except Exception as e:
+            print(f"Error recognizing camera frame: {e}")
+        finally:
+            self.busy.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize bills from a camera or recorded video")
+    parser.add_argument('source', nargs='?', default='0', help="camera index or video file")
+    parser.add_argument('--frame-skip', type=int, default=2)
+    args = parser.parse_args()
+    
+    from image_processor import ImageProcessor
+    
+    def report(result, frame):
+        print(f"serial={result['serial_number']} star={result['is_star_note']} preset={result['preset']}")
+        
+    source = int(args.source) if args.source.isdigit() else args.source
+    capture = CameraCapture(ImageProcessor(), report, source, args.frame_skip)
+    if not capture.start():
+        return
+    try:
+        while capture.is_running():
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    capture.stop()
+    print(f"{capture.frames_read} frames read, {capture.frames_recognized} recognized")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,44 +1,184 @@
 import socket
-import json
 import os
 import sys
+import asyncio
+import base64
+import itertools
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from protocol import send_message, recv_message, client_offer, WireFormat, JSON_FORMAT
+from bill_record import Bill, BillResultSet
+
+# Images are streamed to process_image in chunks of this size, so one upload
+# never holds up other requests on the connection for long
+IMAGE_CHUNK_BYTES = 256 * 1024
+# How often a search waiting on the server checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.05
 
 class DollarTrackerClient:
-    def __init__(self, host='localhost', port=5000):
+    """Client for DollarTrackerServer.
+    
+    Requests are tagged with ids and pipelined over one connection; a reader
+    thread matches responses to them in whatever order they arrive. Any
+    number of threads may share a client: send_request blocks the caller,
+    send_request_async returns a concurrent.futures.Future and request() is
+    the asyncio equivalent.
+    """
+    def __init__(self, host='localhost', port=5000, compact=True):
         self.host = host
         self.port = port
+        # Offer msgpack/columnar/compression at connect time; False keeps plain JSON
+        self.compact = compact
+        self.wire_format = JSON_FORMAT
         self.socket = None
         self.user_id = None
+        self.session_token = None
+        self.event_callback = None
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        # self.lock guards the socket and pending table, self.send_lock keeps frames whole
+        self.lock = threading.RLock()
+        self.send_lock = threading.Lock()
+        self.reader_thread = None
         
     def connect(self):
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
+        with self.lock:
+            if self.socket:
+                return True
+                
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.connect((self.host, self.port))
+                self.wire_format = self._negotiate(sock) if self.compact else JSON_FORMAT
+            except Exception as e:
+                print(f"Connection error: {e}")
+                sock.close()
+                return False
+                
+            self.socket = sock
+            self.pending = {}
+            self.reader_thread = threading.Thread(
+                target=self._read_responses,
+                args=(sock, self.pending),
+                daemon=True
+            )
+            self.reader_thread.start()
+            
+            # Subscriptions belong to a connection, so renew it after reconnecting
+            if self.event_callback and self.session_token:
+                self.send_request_async('subscribe')
             return True
-        except Exception as e:
-            print(f"Connection error: {e}")
-            return False
             
+    def _negotiate(self, sock):
+        """Agree on a wire format before the reader thread takes over the socket"""
+        request_id = next(self.request_ids) % 0xFFFFFFFF + 1
+        send_message(sock, {'action': 'hello', 'data': client_offer()}, request_id)
+        frame = recv_message(sock)
+        if frame is None:
+            raise ConnectionError("Connection closed during handshake")
+        response = frame[1]
+        if not response.get('success'):
+            # Older servers only speak JSON
+            return JSON_FORMAT
+        return WireFormat(**response['wire_format'])
+        
     def disconnect(self):
-        if self.socket:
-            self.socket.close()
-            self.socket = None
+        with self.lock:
+            sock, pending = self.socket, self.pending
+        if sock:
+            self._connection_lost(sock, pending, 'Disconnected')
             
-    def send_request(self, action, data=None):
-        if not self.socket:
-            if not self.connect():
-                return {'success': False, 'error': 'Could not connect to server'}
-                
+    def is_connected(self):
+        return self.socket is not None
+        
+    def send_request(self, action, data=None, timeout=None):
+        """Send a request and wait for its response"""
+        future = self.send_request_async(action, data)
         try:
-            request = {'action': action, 'data': data or {}}
-            self.socket.send(json.dumps(request).encode())
+            return future.result(timeout)
+        except FutureTimeoutError:
+            return {'success': False, 'error': 'Request timed out'}
             
-            response = self.socket.recv(4096)
-            return json.loads(response.decode())
+    def send_request_async(self, action, data=None):
+        """Send a request without waiting; returns a Future of the response dict"""
+        return self._send(action, data)[1]
+        
+    def _send(self, action, data=None):
+        """send_request_async, also returning the request id (None if nothing was sent)"""
+        future = Future()
+        with self.lock:
+            if not self.socket and not self.connect():
+                future.set_result({'success': False, 'error': 'Could not connect to server'})
+                return None, future
+            sock, pending = self.socket, self.pending
+            # Request id 0 is reserved for server pushes
+            request_id = next(self.request_ids) % 0xFFFFFFFF + 1
+            pending[request_id] = future
             
+        try:
+            with self.send_lock:
+                request = {'action': action, 'data': data or {}}
+                if self.session_token:
+                    request['session'] = self.session_token
+                send_message(sock, request, request_id, self.wire_format)
+        except OSError as e:
+            self._connection_lost(sock, pending, str(e))
+        return request_id, future
+        
+    async def request(self, action, data=None):
+        """asyncio interface to send_request"""
+        return await asyncio.wrap_future(self.send_request_async(action, data))
+        
+    def _read_responses(self, sock, pending):
+        error = 'Connection closed by server'
+        try:
+            while True:
+                # Every row-shaped result the server sends is a bill row, so
+                # columnar results go straight into a BillResultSet
+                frame = recv_message(sock, BillResultSet.from_columns)
+                if frame is None:
+                    break
+                request_id, message = frame
+                
+                if request_id == 0:
+                    callback = self.event_callback
+                    if callback and message.get('event') == 'bills_changed':
+                        callback([dict(change, bill=Bill.from_row(change['bill'])) if change.get('bill') else change
+                                  for change in message['changes']])
+                    elif message.get('event') == 'ocr_result':
+                        with self.lock:
+                            future = pending.pop(message.get('upload_id'), None)
+                        if future and not future.done():
+                            future.set_result(dict(message['result']))
+                    continue
+                    
+                with self.lock:
+                    future = pending.pop(request_id, None)
+                if future and not future.done():
+                    future.set_result(message)
         except Exception as e:
-            return {'success': False, 'error': str(e)}
-            
+            # Whatever stops the reader, a dropped socket or a frame it
+            # cannot decode, the requests waiting on it must not hang
+            error = str(e) or type(e).__name__
+        self._connection_lost(sock, pending, error)
+        
+    def _connection_lost(self, sock, pending, error):
+        """Close a dead connection and fail everything still waiting on it"""
+        with self.lock:
+            if self.socket is sock:
+                self.socket = None
+            futures = list(pending.values())
+            pending.clear()
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        for future in futures:
+            if not future.done():
+                future.set_result({'success': False, 'error': error})
+                
     def login(self, username, password):
         response = self.send_request('login', {
             'username': username,
@@ -47,6 +187,15 @@ class DollarTrackerClient:
         
         if response['success']:
             self.user_id = response['user_id']
+            self.session_token = response['session_token']
+            if self.event_callback:
+                self.send_request_async('subscribe')
+        return response
+        
+    def logout(self):
+        response = self.send_request('logout')
+        self.user_id = None
+        self.session_token = None
         return response
         
     def create_user(self, username, password):
@@ -55,18 +204,36 @@ class DollarTrackerClient:
             'password': password
         })
         
+    def redeem_invitation(self, token):
+        return self.send_request('redeem_invitation', {'token': token})
+        
     def add_bill(self, **bill_data):
         if not self.user_id:
             return {'success': False, 'error': 'Not logged in'}
             
-        bill_data['user_id'] = self.user_id
         return self.send_request('add_bill', bill_data)
         
-    def search_bills(self, criteria=None):
+    def search_bills(self, criteria=None, cancelled=None):
+        """Search on the server; cancelled (see Database.search_bills) stops a superseded search.
+        
+        cancelled is polled while the answer is awaited; once it returns
+        True the server is told to abort the query, and this returns
+        without waiting for it.
+        """
         if not self.user_id:
             return {'success': False, 'error': 'Not logged in'}
+        if cancelled and cancelled():
+            return {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
             
-        return self.send_request('search_bills', criteria or {})
+        request_id, future = self._send('search_bills', criteria or {})
+        while cancelled:
+            try:
+                return _bill_results(future.result(CANCEL_POLL_SECONDS))
+            except FutureTimeoutError:
+                if cancelled():
+                    self.send_request_async('cancel', {'request_id': request_id})
+                    return {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
+        return _bill_results(future.result())
         
     def update_bill(self, serial_number, **updates):
         if not self.user_id:
@@ -74,7 +241,6 @@ class DollarTrackerClient:
             
         return self.send_request('update_bill', {
             'serial_number': serial_number,
-            'user_id': self.user_id,
             'updates': updates
         })
         
@@ -82,4 +248,83 @@ class DollarTrackerClient:
         if not self.user_id:
             return {'success': False, 'error': 'Not logged in'}
             
-        return self.send_request('get_user_bills', {'user_id': self.user_id}) 
\ No newline at end of file
+        return _bill_results(self.send_request('get_user_bills'))
+        
+    def recognize_image(self, image):
+        """Have the server OCR an image (a file path or encoded bytes).
+        
+        Returns a Future of the ImageProcessor result dict: 'serial_number',
+        'is_star_note', 'preset' and 'success', plus 'error' if the server
+        could not take the image. The image is streamed in chunks and the
+        result arrives whenever the server's recognition pool gets to it.
+        """
+        future = Future()
+        if not self.user_id:
+            future.set_result({'success': False, 'error': 'Not logged in'})
+            return future
+        if not isinstance(image, (bytes, bytearray)):
+            with open(image, 'rb') as f:
+                image = f.read()
+                
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            if not self.socket and not self.connect():
+                future.set_result({'success': False, 'error': 'Could not connect to server'})
+                return future
+            # Registered before sending so the pushed result cannot arrive
+            # unclaimed; upload ids are strings, so they never clash with
+            # request ids, and a lost connection fails the job like a request
+            self.pending[upload_id] = future
+            pending = self.pending
+            
+        def check(chunk_future):
+            response = chunk_future.result()
+            if not response.get('success'):
+                with self.lock:
+                    pending.pop(upload_id, None)
+                if not future.done():
+                    future.set_result(response)
+                    
+        # msgpack carries bytes as they are; JSON needs them as text
+        as_text = self.wire_format.encoding == 'json'
+        for offset in range(0, max(len(image), 1), IMAGE_CHUNK_BYTES):
+            if future.done():
+                # Refused, or the connection dropped part way
+                break
+            chunk = bytes(image[offset:offset + IMAGE_CHUNK_BYTES])
+            self.send_request_async('process_image', {
+                'upload_id': upload_id,
+                'chunk': base64.b64encode(chunk).decode() if as_text else chunk,
+                'last': offset + IMAGE_CHUNK_BYTES >= len(image)
+            }).add_done_callback(check)
+        return future
+        
+    def subscribe(self, callback):
+        """Receive pushed bill changes on this connection.
+        
+        callback is invoked from the reader thread with a list of changes,
+        each a dict with 'type' ('insert', 'update' or 'resync'),
+        'serial_number' and the full 'bill' row. The subscription is
+        renewed automatically whenever the client reconnects.
+        """
+        with self.lock:
+            was_connected = self.socket is not None
+            self.event_callback = callback
+            if not was_connected:
+                if self.connect():
+                    return {'success': True}
+                return {'success': False, 'error': 'Could not connect to server'}
+        return self.send_request('subscribe')
+        
+    def unsubscribe(self):
+        if self.event_callback:
+            self.event_callback = None
+            if self.socket:
+                self.send_request_async('unsubscribe')
+
+def _bill_results(response):
+    """Give row results the same BillResultSet type columnar ones get"""
+    results = response.get('results')
+    if isinstance(results, list):
+        response['results'] = BillResultSet.from_rows(results)
+    return response
\ No newline at end of file
@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from bill_record import Bill
+
+# One line per bill, in this column order; the first line of every shard names them
+SHARD_COLUMNS = ('serial_number', 'face_value', 'series_year', 'printing_location', 'is_star_note',
+                 'is_star_filled', 'estimated_value', 'date_recorded', 'added_by', 'image_path')
+MANIFEST = 'manifest.json'
+BILLS_DIR = 'bills'
+
+class CollectionBackup:
+    """Back up the bills table to a git repository as sorted text shards.
+    
+    Bills are grouped into one tab-separated file per denomination and
+    series (bills/20/2017.tsv) and sorted by serial number, so an added or
+    edited bill changes one line of one file. manifest.json records each
+    shard's hash; an export only rewrites shards whose hash changed and
+    all of them go into a single commit, so backing up a large collection
+    costs about as much as the change since the last backup.
+    
+    What to commit and push is decided from git itself, not the manifest:
+    anything in the working tree that differs from HEAD is committed, and
+    HEAD is pushed whenever the remote branch is behind it. A backup whose
+    commit or push failed is completed by the next one.
+    """
+    def __init__(self, db, repo_dir, remote_url=None, branch='backup'):
+        self.db = db
+        self.repo_dir = Path(repo_dir)
+        self.remote_url = remote_url
+        self.branch = branch
+        
+    def backup(self):
+        """Export, commit and push; returns a result dict like the other integrations"""
+        try:
+            self._ensure_repo()
+            self.export()
+            changed, removed = self._uncommitted()
+            commit = self._commit(changed, removed) if changed or removed else None
+            pushed = False
+            if self.remote_url and self._ahead_of_remote():
+                self._git('push', 'origin', f"HEAD:{self.branch}")
+                pushed = True
+            return {'success': True, 'changed': changed, 'removed': removed, 'commit': commit, 'pushed': pushed}
+        except (OSError, subprocess.CalledProcessError) as e:
+            error = getattr(e, 'stderr', None) or str(e)
+            return {'success': False, 'error': error.strip()}
+            
+    def export(self):
+        """Write changed shards and the manifest; returns (changed paths, removed paths)"""
+        old_manifest = self._read_manifest()
+        new_manifest = {}
+        changed = []
+        
+        for path, lines in self._shards():
+            content = '\n'.join(['\t'.join(SHARD_COLUMNS)] + lines) + '\n'
+            digest = hashlib.sha256(content.encode()).hexdigest()
+            new_manifest[path] = {'sha256': digest, 'bills': len(lines)}
+            full_path = self.repo_dir / path
+            if old_manifest.get(path, {}).get('sha256') == digest and full_path.exists():
+                continue
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(full_path, 'w', newline='\n') as f:
+                f.write(content)
+            changed.append(path)
+            
+        removed = sorted(set(old_manifest) - set(new_manifest))
+        for path in removed:
+            full_path = self.repo_dir / path
+            if full_path.exists():
+                full_path.unlink()
+                
+        if changed or removed:
+            with open(self.repo_dir / MANIFEST, 'w', newline='\n') as f:
+                json.dump(new_manifest, f, indent=2, sort_keys=True)
+                f.write('\n')
+            changed.append(MANIFEST)
+        return changed, removed
+        
+    def _shards(self):
+        """Yield (path, lines) per denomination/series, each sorted by serial number.
+        
+        Database.iter_bills_by_shard returns bills already in shard order, a
+        page at a time, so only the shard being written is held in memory
+        and the lock is only held while a page is read: the server keeps
+        answering requests during the export.
+        """
+        path, lines = None, []
+        for row in self.db.iter_bills_by_shard():
+            bill = Bill.from_row(row)
+            bill_path = self._shard_path(bill.face_value, bill.series_year)
+            if bill_path != path:
+                if lines:
+                    yield path, lines
+                path, lines = bill_path, []
+            lines.append('\t'.join(_field(value) for value in (
+                bill.serial_number, bill.face_value, bill.series, bill.printing_location,
+                bill.is_star_note, bill.is_star_filled, bill.estimated_value, bill.date_recorded,
+                bill.username, bill.image_path
+            )))
+        if lines:
+            yield path, lines
+            
+    def _shard_path(self, face_value, series_year):
+        denomination = _field(face_value)
+        series = _field(series_year) or 'unknown'
+        return f"{BILLS_DIR}/{denomination}/{series}.tsv"
+        
+    def _read_manifest(self):
+        try:
+            with open(self.repo_dir / MANIFEST, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+            
+    def _ensure_repo(self):
+        self.repo_dir.mkdir(parents=True, exist_ok=True)
+        if not (self.repo_dir / '.git').exists():
+            self._git('init')
+            self._git('checkout', '-b', self.branch)
+        if self.remote_url:
+            remotes = self._git('remote').split()
+            if 'origin' not in remotes:
+                self._git('remote', 'add', 'origin', self.remote_url)
+                
+    def _uncommitted(self):
+        """(changed, removed) backup files that differ from HEAD, staged or not"""
+        status = self._git('status', '--porcelain', '-z', '--no-renames', '--untracked-files=all',
+                           '--', BILLS_DIR, MANIFEST)
+        changed, removed = [], []
+        for entry in filter(None, status.split('\0')):
+            code, path = entry[:2], entry[3:]
+            (removed if 'D' in code else changed).append(path)
+        return sorted(changed), sorted(removed)
+        
+    def _ahead_of_remote(self):
+        """True if HEAD has commits the remote branch (as of the last push or fetch) lacks"""
+        if subprocess.run(['git', 'rev-parse', '--verify', '--quiet', 'HEAD'], cwd=self.repo_dir,
+                          capture_output=True).returncode != 0:
+            return False
+        remote = f"refs/remotes/origin/{self.branch}"
+        if subprocess.run(['git', 'rev-parse', '--verify', '--quiet', remote], cwd=self.repo_dir,
+                          capture_output=True).returncode != 0:
+            return True
+        return int(self._git('rev-list', '--count', f"{remote}..HEAD")) > 0
+        
+    def _commit(self, changed, removed):
+        self._git('add', '--all', '--', BILLS_DIR, MANIFEST)
+        bills = sum(entry['bills'] for entry in self._read_manifest().values())
+        shards = len([path for path in changed if path != MANIFEST])
+        self._git('commit', '-m', f"Backup {bills} bills ({shards} shards changed, {len(removed)} removed)")
+        return self._git('rev-parse', 'HEAD').strip()
+        
+    def _git(self, *args):
+        # Backups may run where no git identity is configured
+        identity = []
+        if args[0] == 'commit' and not self._has_identity():
+            identity = ['-c', 'user.name=Dollar Tracker', '-c', 'user.email=backup@dollar-tracker.local']
+        return subprocess.run(['git', *identity, *args], cwd=self.repo_dir, check=True,
+                              capture_output=True, text=True).stdout
+                              
+    def _has_identity(self):
+        result = subprocess.run(['git', 'config', 'user.email'], cwd=self.repo_dir,
+                                capture_output=True, text=True)
+        return result.returncode == 0 and result.stdout.strip() != ''
+
+def _field(value):
+    """Text for one TSV cell; whole-number floats drop the '.0' so shard names stay stable"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up the bills table to a git repository")
+    parser.add_argument('repo_dir', help="working copy to export into; created if missing")
+    parser.add_argument('--db', default='dollar_tracker.db')
+    parser.add_argument('--remote', help="repository URL the backup branch is pushed to")
+    parser.add_argument('--branch', default='backup')
+    args = parser.parse_args()
+    
+    from database import Database
+    
+    db = Database(args.db)
+    try:
+        result = CollectionBackup(db, args.repo_dir, args.remote, args.branch).backup()
+    finally:
+        db.close()
+    if not result['success']:
+        print(f"Backup failed: {result['error']}")
+        sys.exit(1)
+    shards = len([path for path in result['changed'] if path != MANIFEST])
+    print(f"{shards} shards changed, {len(result['removed'])} removed"
+          + (f", committed {result['commit'][:12]}" if result['commit'] else ", nothing to commit")
+          + (", pushed" if result['pushed'] else ""))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,14 +1,42 @@
+import copy
 import json
 import os
 import secrets
+import tempfile
+import threading
 from pathlib import Path
+from invitations import InvitationStore
 
 class Config:
+    """Settings stored as JSON files under ~/.dollar_tracker.
+    
+    Parsed files are cached and re-read only when their mtime, size or
+    inode changes, so getters are cheap and still pick up edits made by
+    other processes. Writes go to a temporary file that is renamed over the
+    original, so readers never see a half-written file. Use Config.shared()
+    to get the process-wide instance.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+            
     def __init__(self):
         self.config_dir = Path.home() / '.dollar_tracker'
         self.config_file = self.config_dir / 'config.json'
         self.server_file = self.config_dir / 'server.json'
         self.invitations_file = self.config_dir / 'invitations.json'
+        self.invitations_db = self.config_dir / 'invitations.db'
+        self._invitations = None
+        # path -> (file signature, parsed contents)
+        self._cache = {}
+        # Held across load-modify-save so setters in different threads don't interleave
+        self.lock = threading.RLock()
         
         # Create config directory if it doesn't exist
         self.config_dir.mkdir(exist_ok=True)
@@ -18,8 +46,15 @@ class Config:
             self._create_default_config()
         if not self.server_file.exists():
             self._create_default_server()
-        if not self.invitations_file.exists():
-            self._create_default_invitations()
+            
+    @property
+    def invitations(self):
+        """The InvitationStore, opened (and the old JSON list imported) on first use"""
+        with self.lock:
+            if self._invitations is None:
+                self._invitations = InvitationStore(self.invitations_db)
+                self._invitations.import_json(self.invitations_file)
+            return self._invitations
             
     def _create_default_config(self):
         default_config = {
@@ -38,66 +73,79 @@ class Config:
         }
         self.save_server_config(default_server)
         
-    def _create_default_invitations(self):
-        self.save_invitations([])
-        
-    def save_config(self, config):
-        with open(self.config_file, 'w') as f:
-            json.dump(config, f, indent=4)
-            
-    def save_server_config(self, server_config):
-        with open(self.server_file, 'w') as f:
-            json.dump(server_config, f, indent=4)
+    def _load(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            cached = self._cache.get(path)
+            if cached is None or cached[0] != signature:
+                with open(path, 'r') as f:
+                    cached = self._cache[path] = (signature, json.load(f))
+            # Callers modify what they get back before saving; keep the cache intact
+            return copy.deepcopy(cached[1])
             
-    def save_invitations(self, invitations):
-        with open(self.invitations_file, 'w') as f:
-            json.dump(invitations, f, indent=4)
+    def _save(self, path, data):
+        with self.lock:
+            fd, temp_path = tempfile.mkstemp(dir=self.config_dir, prefix=f".{path.name}.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            stat = os.stat(path)
+            self._cache[path] = ((stat.st_mtime_ns, stat.st_size, stat.st_ino), copy.deepcopy(data))
             
+    def save_config(self, config):
+        self._save(self.config_file, config)
+        
+    def save_server_config(self, server_config):
+        self._save(self.server_file, server_config)
+        
     def load_config(self):
-        with open(self.config_file, 'r') as f:
-            return json.load(f)
-            
+        return self._load(self.config_file)
+        
     def load_server_config(self):
-        with open(self.server_file, 'r') as f:
-            return json.load(f)
-            
+        return self._load(self.server_file)
+        
     def load_invitations(self):
-        with open(self.invitations_file, 'r') as f:
-            return json.load(f)
-            
+        return self.invitations.list_all()
+        
     def add_invitation(self, server_info):
-        invitations = self.load_invitations()
-        invitations.append(server_info)
-        self.save_invitations(invitations)
+        """Store an invitation for server_info's host/port and return its token"""
+        return self.invitations.create(
+            server_info['host'], server_info['port'], server_info.get('server_token'),
+            ttl=server_info.get('ttl'), max_uses=server_info.get('max_uses'),
+            token=server_info.get('token')
+        )
         
-    def remove_invitation(self, server_token):
-        invitations = self.load_invitations()
-        invitations = [inv for inv in invitations if inv['server_token'] != server_token]
-        self.save_invitations(invitations)
+    def remove_invitation(self, token):
+        return self.invitations.remove(token)
         
-    def get_invitation(self, server_token):
-        invitations = self.load_invitations()
-        for inv in invitations:
-            if inv['server_token'] == server_token:
-                return inv
-        return None
+    def get_invitation(self, token):
+        return self.invitations.get(token)
         
     def set_github_token(self, token):
-        config = self.load_config()
-        config['github_token'] = token
-        self.save_config(config)
-        
+        with self.lock:
+            config = self.load_config()
+            config['github_token'] = token
+            self.save_config(config)
+            
     def get_github_token(self):
         config = self.load_config()
         return config.get('github_token', '')
         
     def set_server_mode(self, is_server, host='localhost', port=5000):
-        server_config = self.load_server_config()
-        server_config['is_server'] = is_server
-        server_config['server_host'] = host
-        server_config['server_port'] = port
-        self.save_server_config(server_config)
-        
+        with self.lock:
+            server_config = self.load_server_config()
+            server_config['is_server'] = is_server
+            server_config['server_host'] = host
+            server_config['server_port'] = port
+            self.save_server_config(server_config)
+            
     def get_server_info(self):
         return self.load_server_config()
         
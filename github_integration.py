@@ -8,7 +8,7 @@ from pathlib import Path
 
 class GitHubIntegration:
     def __init__(self):
-        self.config = Config()
+        self.config = Config.shared()
         self.github_token = self.config.get_github_token()
         self.headers = {
             'Authorization': f'token {self.github_token}',
@@ -66,6 +66,13 @@ class GitHubIntegration:
         except Exception as e:
             return {'success': False, 'error': str(e)}
             
+    def backup_collection(self, db, repo_url=None, repo_dir=None):
+        """Commit changed bill shards to a backup repository and push them"""
+        from collection_backup import CollectionBackup
+        if repo_dir is None:
+            repo_dir = self.config.config_dir / 'backup'
+        return CollectionBackup(db, repo_dir, repo_url).backup()
+        
     def generate_invitation_link(self, repo_url):
         """Generate an invitation link for the repository"""
         try:
@@ -2,17 +2,43 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QLabel, QLineEdit, QPushButton, QComboBox,
                             QTableWidget, QTableWidgetItem, QFileDialog,
                             QMessageBox, QFormLayout, QCheckBox, QDialog,
-                            QDialogButtonBox, QTabWidget, QGroupBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                            QDialogButtonBox, QTabWidget, QGroupBox, QApplication)
+from PyQt6.QtCore import Qt, QThread, QObject, QTimer, pyqtSignal
 from PyQt6.QtGui import QPixmap, QImage
 import sys
+import threading
 from client import DollarTrackerClient
-from value_scraper import ValueScraper
-from image_processor import ImageProcessor
+from replica import ReplicatedClient
+from bill_record import Bill
+from serials import parse_series
 from config import Config
-from github_integration import GitHubIntegration
-import cv2
+from invitations import format_code, parse_code
 import os
+import time
+
+# OpenCV, Tesseract, NumPy and requests take seconds to import on older
+# machines, so image_processor, camera_capture and github_integration are
+# imported on first use or by the background warm-up, never at startup.
+
+# Seconds the Add Bill button waits for an image to be recognized
+OCR_TIMEOUT = 60.0
+# Rows fetched per search; the next page loads when the table is scrolled to the end
+RESULTS_PAGE_SIZE = 500
+# Milliseconds a filter must stay unchanged before it runs a search
+FILTER_DELAY_MS = 300
+# Results table columns: header and the search_bills field it sorts on
+RESULT_COLUMNS = [
+    ("Face Value", 'face_value'), ("Serial Number", 'serial_number'),
+    ("Date Recorded", 'date_recorded'), ("Printing Location", 'printing_location'),
+    ("Series Year", 'series_year'), ("Star Note", 'is_star_note'),
+    ("Estimated Value", 'estimated_value'), ("Added By", 'username'), ("Image", None)
+]
+# Placeholder text of the filter box for each filterable column
+FILTER_HINTS = {
+    'face_value': "Face value", 'serial_number': "Serial starts with",
+    'date_recorded': "Date (YYYY-MM-DD)", 'printing_location': "Location",
+    'series_year': "Series year", 'estimated_value': "Value at least", 'username': "Added by"
+}
 
 class LoginDialog(QDialog):
     def __init__(self, parent=None):
@@ -125,6 +151,22 @@ class ServerInviteDialog(QDialog):
     def get_invite_code(self):
         return self.invite_code.text()
 
+class BillUpdateSignals(QObject):
+    """Carries pushed bill changes from the client's event thread to the UI thread"""
+    changes_received = pyqtSignal(list)
+
+class SearchSignals(QObject):
+    """Carries search results (generation, offset, response) from the search thread to the UI thread"""
+    results_ready = pyqtSignal(int, int, object)
+
+class CaptureSignals(QObject):
+    """Carries camera recognitions (result, saved image path) to the UI thread"""
+    bill_recognized = pyqtSignal(dict, str)
+
+class RecognitionSignals(QObject):
+    """Carries image recognitions (request number, result) from the OCR thread or server to the UI thread"""
+    image_recognized = pyqtSignal(int, dict)
+
 class DollarTrackerGUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -132,17 +174,116 @@ class DollarTrackerGUI(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
         
         # Initialize components
-        self.config = Config()
+        self.config = Config.shared()
         self.client = None
-        self.image_processor = ImageProcessor()
-        self.github = GitHubIntegration()
-        
+        self.row_by_serial = {}
+        # Results are sorted and filtered by the database; only the rows on
+        # screen are held here. Each new search bumps the generation, which
+        # cancels the one before it and discards any page it still returns.
+        self.sort_field = 'date_recorded'
+        self.sort_descending = True
+        self.search_generation = 0
+        self.results_complete = True
+        self.loading_more = False
+        self.search_signals = SearchSignals()
+        self.search_signals.results_ready.connect(self.show_search_results)
+        self.update_signals = BillUpdateSignals()
+        self.update_signals.changes_received.connect(self.apply_bill_changes)
+        self.settings = self.config.load_config()
+        self.camera_source = self.settings.get('camera_source', 0)
+        self.camera = None
+        # Image already recognized by the camera, so add_bill need not OCR it again
+        self.captured_image = None
+        self.capture_signals = CaptureSignals()
+        self.capture_signals.bill_recognized.connect(self.fill_from_camera)
+        # A bill whose image is still being recognized, and the number of that
+        # recognition, so a late answer to an earlier one is ignored
+        self.pending_bill = None
+        self.recognition_number = 0
+        self.recognition_signals = RecognitionSignals()
+        self.recognition_signals.image_recognized.connect(self.add_recognized_bill)
+        self._image_processor = None
+        self._github = None
+        self.subsystem_lock = threading.Lock()
+        
+        # Dialogs open once the event loop runs, so the window is on screen
+        # first; heavy imports then load while the user types
+        QTimer.singleShot(0, self.start_session)
+        
+    def start_session(self):
+        threading.Thread(target=self.warm_up, daemon=True).start()
         # Check if GitHub setup is needed
         if not self.config.get_github_token():
             self.show_github_setup()
         else:
             self.show_login_dialog()
             
+    def warm_up(self):
+        """Import and build the OCR pipeline off the UI thread"""
+        try:
+            self.image_processor
+            import camera_capture  # noqa: F401
+        except ImportError as e:
+            print(f"Image processing unavailable: {e}")
+            
+    @property
+    def image_processor(self):
+        with self.subsystem_lock:
+            if self._image_processor is None:
+                from image_processor import ImageProcessor
+                self._image_processor = ImageProcessor(profile=self.settings.get('ocr_profile'),
+                                                       preset=self.settings.get('ocr_preset', 'auto'))
+            return self._image_processor
+            
+    def recognize_image(self, image_path):
+        """Start OCR of an image off the UI thread; add_recognized_bill gets the result.
+        
+        Runs locally, or on the server if so configured or OpenCV is missing
+        here. Gives up after OCR_TIMEOUT seconds.
+        """
+        self.recognition_number += 1
+        number = self.recognition_number
+        
+        def finish(result):
+            self.recognition_signals.image_recognized.emit(number, result)
+            
+        def ask_server():
+            try:
+                future = self.client.recognize_image(image_path)
+            except OSError as e:
+                finish({'success': False, 'error': str(e)})
+                return
+            future.add_done_callback(lambda done: finish(done.result()))
+            
+        def run_locally():
+            try:
+                finish(self.image_processor.process_bill_image(image_path))
+            except ImportError as e:
+                print(f"Local image processing unavailable ({e}); asking the server")
+                ask_server()
+            except Exception as e:
+                finish({'success': False, 'error': str(e)})
+                
+        if self.settings.get('ocr_on_server'):
+            ask_server()
+        else:
+            threading.Thread(target=run_locally, daemon=True).start()
+        QTimer.singleShot(int(OCR_TIMEOUT * 1000),
+                          lambda: finish({'success': False, 'error': 'Image recognition timed out'}))
+                          
+    def set_recognizing(self, busy):
+        """Show that Add Bill is waiting for OCR, and keep it from being pressed again meanwhile"""
+        self.add_button.setEnabled(not busy)
+        self.add_button.setText("Recognizing image..." if busy else "Add Bill")
+        
+    @property
+    def github(self):
+        with self.subsystem_lock:
+            if self._github is None:
+                from github_integration import GitHubIntegration
+                self._github = GitHubIntegration()
+            return self._github
+            
     def show_github_setup(self):
         dialog = GitHubSetupDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -162,23 +303,32 @@ class DollarTrackerGUI(QMainWindow):
                 QMessageBox.warning(self, "Error", result.get('error', 'Failed to create repository'))
                 self.show_github_setup()
         else:
-            sys.exit(0)
+            # Called from the event loop now, so end it instead of raising SystemExit in a slot
+            QApplication.instance().quit()
             
     def show_login_dialog(self):
         dialog = LoginDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             credentials = dialog.get_credentials()
-            self.client = DollarTrackerClient(credentials['host'], credentials['port'])
+            # Reads and writes go to a local replica that syncs in the background
+            replica_path = self.config.config_dir / f"replica_{credentials['host']}_{credentials['port']}.db"
+            self.client = ReplicatedClient(
+                DollarTrackerClient(credentials['host'], credentials['port']),
+                replica_path
+            )
             
             # Try to login
             response = self.client.login(credentials['username'], credentials['password'])
             if not response['success']:
+                self.client.disconnect()
                 QMessageBox.warning(self, "Login Failed", response.get('error', 'Unknown error'))
                 self.show_login_dialog()
             else:
                 self.setup_ui()
+                self.client.subscribe(self.update_signals.changes_received.emit)
+                self.search_bills()
         else:
-            sys.exit(0)
+            QApplication.instance().quit()
             
     def setup_ui(self):
         # Create main widget and layout
@@ -264,13 +414,13 @@ class DollarTrackerGUI(QMainWindow):
     def generate_invitation(self):
         server_info = self.config.get_server_info()
         if server_info['is_server']:
-            invitation = {
-                'server_token': server_info['server_token'],
-                'host': server_info['server_host'],
-                'port': server_info['server_port']
-            }
+            # One code per person; it expires after a week or its first use
+            token = self.config.invitations.create(
+                server_info['server_host'], server_info['server_port'], server_info['server_token']
+            )
+            code = format_code(server_info['server_host'], server_info['server_port'], token)
             QMessageBox.information(self, "Invitation Code", 
-                                  f"Share this code with others:\n{server_info['server_token']}")
+                                  f"Share this code with others:\n{code}")
         else:
             QMessageBox.warning(self, "Error", "Only server instances can generate invitations")
             
@@ -278,7 +428,7 @@ class DollarTrackerGUI(QMainWindow):
         dialog = ServerInviteDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             invite_code = dialog.get_invite_code()
-            invitation = self.config.get_invitation(invite_code)
+            invitation = self.redeem_invitation(invite_code)
             
             if invitation:
                 self.config.set_server_mode(False, invitation['host'], invitation['port'])
@@ -287,6 +437,24 @@ class DollarTrackerGUI(QMainWindow):
             else:
                 QMessageBox.warning(self, "Error", "Invalid invitation code")
                 
+    def redeem_invitation(self, invite_code):
+        """Check a code with the server it names; bare tokens are looked up locally"""
+        parsed = parse_code(invite_code)
+        if parsed is None:
+            return self.config.get_invitation(invite_code.strip())
+            
+        host, port, token = parsed
+        client = DollarTrackerClient(host, port)
+        if not client.connect():
+            return None
+        try:
+            response = client.redeem_invitation(token)
+        finally:
+            client.disconnect()
+        if not response.get('success'):
+            return None
+        return {'host': response['host'], 'port': response['port']}
+        
     def create_entry_form(self, parent_layout):
         form_group = QWidget()
         form_layout = QFormLayout(form_group)
@@ -318,16 +486,20 @@ class DollarTrackerGUI(QMainWindow):
         self.image_path.setReadOnly(True)
         browse_button = QPushButton("Browse")
         browse_button.clicked.connect(self.browse_image)
+        self.camera_button = QPushButton("Camera")
+        self.camera_button.setCheckable(True)
+        self.camera_button.toggled.connect(self.toggle_camera)
         
         image_layout = QHBoxLayout()
         image_layout.addWidget(self.image_path)
         image_layout.addWidget(browse_button)
+        image_layout.addWidget(self.camera_button)
         form_layout.addRow("Bill Image:", image_layout)
         
         # Add bill button
-        add_button = QPushButton("Add Bill")
-        add_button.clicked.connect(self.add_bill)
-        form_layout.addRow("", add_button)
+        self.add_button = QPushButton("Add Bill")
+        self.add_button.clicked.connect(self.add_bill)
+        form_layout.addRow("", self.add_button)
         
         parent_layout.addWidget(form_group)
         
@@ -335,24 +507,69 @@ class DollarTrackerGUI(QMainWindow):
         search_group = QWidget()
         search_layout = QHBoxLayout(search_group)
         
-        self.search_field = QLineEdit()
-        self.search_field.setPlaceholderText("Search by serial number...")
+        # Typing restarts the timer, so a search runs once the user pauses
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.search_bills)
+        
+        self.filters = {}
+        for _, field in RESULT_COLUMNS:
+            if field == 'is_star_note':
+                widget = QComboBox()
+                widget.addItems(["Any", "Star notes", "Not star notes"])
+                widget.currentIndexChanged.connect(lambda _: self.filter_timer.start())
+            elif field in FILTER_HINTS:
+                widget = QLineEdit()
+                widget.setPlaceholderText(FILTER_HINTS[field])
+                widget.textChanged.connect(lambda _: self.filter_timer.start())
+            else:
+                continue
+            self.filters[field] = widget
+            search_layout.addWidget(widget)
+            
         search_button = QPushButton("Search")
-        search_button.clicked.connect(self.search_bills)
+        search_button.clicked.connect(lambda: self.search_bills())
+        
+        export_button = QPushButton("Export...")
+        export_button.clicked.connect(self.export_bills)
         
-        search_layout.addWidget(self.search_field)
         search_layout.addWidget(search_button)
+        search_layout.addWidget(export_button)
         
         parent_layout.addWidget(search_group)
         
+    def export_bills(self):
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Export Collection", "bills.csv",
+            "CSV Files (*.csv);;Excel Files (*.xlsx)"
+        )
+        if not file_name:
+            return
+        import bulk_io
+        try:
+            # The local replica holds the whole collection, so export never waits on the server
+            if file_name.lower().endswith('.xlsx'):
+                count = bulk_io.export_xlsx(self.client.replica, file_name)
+            else:
+                count = bulk_io.export_csv(self.client.replica, file_name)
+            QMessageBox.information(self, "Export", f"Exported {count} bills to {file_name}")
+        except (OSError, RuntimeError) as e:
+            QMessageBox.warning(self, "Error", f"Export failed: {e}")
+            
     def create_results_table(self, parent_layout):
         self.results_table = QTableWidget()
-        self.results_table.setColumnCount(9)
-        self.results_table.setHorizontalHeaderLabels([
-            "Face Value", "Serial Number", "Date Recorded",
-            "Printing Location", "Series Year", "Star Note",
-            "Estimated Value", "Added By", "Image"
-        ])
+        self.results_table.setColumnCount(len(RESULT_COLUMNS))
+        self.results_table.setHorizontalHeaderLabels([header for header, _ in RESULT_COLUMNS])
+        
+        # Clicking a header sorts in the database, not in the widget, which
+        # only ever holds the pages loaded so far
+        header = self.results_table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self.sort_by_column)
+        self.show_sort_indicator()
+        self.results_table.verticalScrollBar().valueChanged.connect(self.load_more_results)
         
         parent_layout.addWidget(self.results_table)
         
@@ -364,84 +581,250 @@ class DollarTrackerGUI(QMainWindow):
         if file_name:
             self.image_path.setText(file_name)
             
+    def toggle_camera(self, enabled):
+        if not enabled:
+            if self.camera:
+                self.camera.stop(wait=False)
+                self.camera = None
+            return
+            
+        from camera_capture import CameraCapture
+        source = int(self.camera_source) if str(self.camera_source).isdigit() else self.camera_source
+        self.camera = CameraCapture(self.image_processor, self.camera_recognized, source)
+        if not self.camera.start():
+            self.camera = None
+            self.camera_button.setChecked(False)
+            QMessageBox.warning(self, "Error", f"Could not open camera {self.camera_source}")
+            
+    def camera_recognized(self, result, frame):
+        # Runs on the recognition worker; keep the frame as the bill's image
+        if not result['success']:
+            return
+        captures_dir = self.config.config_dir / 'captures'
+        captures_dir.mkdir(exist_ok=True)
+        image_path = str(captures_dir / f"{result['serial_number']}-{int(time.time())}.png")
+        import cv2
+        cv2.imwrite(image_path, frame)
+        self.capture_signals.bill_recognized.emit(result, image_path)
+        
+    def fill_from_camera(self, result, image_path):
+        self.serial_number.setText(result['serial_number'])
+        self.is_star_note.setChecked(bool(result['is_star_note']))
+        self.image_path.setText(image_path)
+        self.captured_image = image_path
+        
     def add_bill(self):
         # Get form data
-        face_value = float(self.face_value.currentText())
-        serial_number = self.serial_number.text().strip()
-        printing_location = self.printing_location.currentText()
         series_year = self.series_year.text().strip()
-        is_star_note = self.is_star_note.isChecked()
-        image_path = self.image_path.text()
+        bill = {
+            'face_value': float(self.face_value.currentText()),
+            'serial_number': self.serial_number.text().strip(),
+            'printing_location': self.printing_location.currentText(),
+            'series_year': series_year if series_year else None,
+            'is_star_note': self.is_star_note.isChecked(),
+            'image_path': self.image_path.text()
+        }
         
-        if not serial_number:
+        if not bill['serial_number']:
             QMessageBox.warning(self, "Error", "Serial number is required")
             return
             
-        # Process image if provided
-        image_data = None
-        if image_path:
-            image_data = self.image_processor.process_bill_image(image_path)
-            if image_data['success']:
-                # Update serial number and star note status from image
-                serial_number = image_data['serial_number']
-                is_star_note = image_data['is_star_note']
-                
+        try:
+            parse_series(series_year)
+        except ValueError:
+            QMessageBox.warning(self, "Error", "Series must be a year with an optional letter, like 2017A")
+            return
+            
+        # Process image if provided; the bill is sent once it is recognized
+        if bill['image_path'] and bill['image_path'] != self.captured_image:
+            self.pending_bill = bill
+            self.set_recognizing(True)
+            self.recognize_image(bill['image_path'])
+            return
+        self.send_bill(bill)
+        
+    def add_recognized_bill(self, number, image_data):
+        if number != self.recognition_number or self.pending_bill is None:
+            # Timed out already, or the answer to an earlier recognition
+            return
+        bill, self.pending_bill = self.pending_bill, None
+        self.set_recognizing(False)
+        
+        if 'timings' in image_data:
+            stages = ', '.join(f"{name} {ms:.0f} ms" for name, ms in image_data['timings'].items())
+            print(f"OCR timings for {bill['image_path']}: {stages}")
+        if image_data.get('error'):
+            print(f"Image recognition failed for {bill['image_path']}: {image_data['error']}")
+        if image_data['success']:
+            # Update serial number and star note status from image
+            bill['serial_number'] = image_data['serial_number']
+            bill['is_star_note'] = image_data['is_star_note']
+        self.send_bill(bill)
+        
+    def send_bill(self, bill):
         # Add to database through client
-        response = self.client.add_bill(
-            face_value=face_value,
-            serial_number=serial_number,
-            printing_location=printing_location,
-            series_year=series_year if series_year else None,
-            is_star_note=is_star_note,
-            image_path=image_path
-        )
+        response = self.client.add_bill(**bill)
         
         if response['success']:
-            QMessageBox.information(self, "Success", "Bill added successfully")
+            duplicates = response.get('possible_duplicates')
+            if duplicates:
+                QMessageBox.warning(self, "Possible Duplicate",
+                                    f"Bill added, but {bill['serial_number']} may be the same note as "
+                                    f"{', '.join(duplicates[:5])}. Check the serial for misread characters.")
+            else:
+                QMessageBox.information(self, "Success", "Bill added successfully")
             self.clear_form()
             self.search_bills()  # Refresh results
         else:
             QMessageBox.warning(self, "Error", response.get('error', 'Failed to add bill'))
             
-    def search_bills(self):
-        search_term = self.search_field.text().strip()
-        if search_term:
-            response = self.client.search_bills({'serial_number': search_term})
-        else:
-            response = self.client.search_bills({})
+    def search_criteria(self):
+        """search_bills criteria from the filter boxes and the sorted column"""
+        criteria = {'sort': self.sort_field, 'descending': self.sort_descending}
+        for field, widget in self.filters.items():
+            if field == 'is_star_note':
+                if widget.currentIndex():
+                    criteria['is_star_note'] = widget.currentIndex() == 1
+                continue
+            text = widget.text().strip()
+            if not text:
+                continue
+            if field in ('face_value', 'estimated_value'):
+                try:
+                    text = float(text.lstrip('$'))
+                except ValueError:
+                    # Half-typed numbers are ignored until they parse
+                    continue
+            criteria['min_estimated_value' if field == 'estimated_value' else field] = text
+        return criteria
+        
+    def search_bills(self, offset=0):
+        """Fetch a page of results in the background.
+        
+        offset 0 starts a new search that replaces the table; any search
+        still running is cancelled. A later offset appends the next page.
+        """
+        self.filter_timer.stop()
+        if offset == 0:
+            self.search_generation += 1
+            self.loading_more = False
+        generation = self.search_generation
+        criteria = dict(self.search_criteria(), limit=RESULTS_PAGE_SIZE, offset=offset)
+        
+        def run():
+            response = self.client.search_bills(criteria, cancelled=lambda: generation != self.search_generation)
+            self.search_signals.results_ready.emit(generation, offset, response)
             
-        if response['success']:
-            self.display_results(response['results'])
-        else:
-            QMessageBox.warning(self, "Error", response.get('error', 'Search failed'))
+        threading.Thread(target=run, daemon=True).start()
+        
+    def show_search_results(self, generation, offset, response):
+        self.loading_more = False
+        if generation != self.search_generation:
+            # A newer search replaced this one while it ran
+            return
+        if not response['success']:
+            if not response.get('cancelled'):
+                QMessageBox.warning(self, "Error", response.get('error', 'Search failed'))
+            return
             
+        results = response['results']
+        if offset == 0:
+            self.display_results(results)
+        else:
+            self.append_results(results)
+        self.results_complete = len(results) < RESULTS_PAGE_SIZE
+        
+    def load_more_results(self, value):
+        if value < self.results_table.verticalScrollBar().maximum():
+            return
+        if self.results_complete or self.loading_more:
+            return
+        self.loading_more = True
+        self.search_bills(offset=self.results_table.rowCount())
+        
+    def sort_by_column(self, column):
+        field = RESULT_COLUMNS[column][1]
+        if field is None:
+            # Not sortable; put the indicator back where it was
+            self.show_sort_indicator()
+            return
+        if field == self.sort_field:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_field = field
+            self.sort_descending = False
+        self.show_sort_indicator()
+        self.search_bills()
+        
+    def show_sort_indicator(self):
+        column = next(i for i, (_, field) in enumerate(RESULT_COLUMNS) if field == self.sort_field)
+        order = Qt.SortOrder.DescendingOrder if self.sort_descending else Qt.SortOrder.AscendingOrder
+        self.results_table.horizontalHeader().setSortIndicator(column, order)
+        
     def display_results(self, results):
         self.results_table.setRowCount(len(results))
+        self.row_by_serial = {}
         for row, bill in enumerate(results):
-            self.results_table.setItem(row, 0, QTableWidgetItem(str(bill[1])))  # Face value
-            self.results_table.setItem(row, 1, QTableWidgetItem(bill[2]))  # Serial number
-            self.results_table.setItem(row, 2, QTableWidgetItem(bill[3]))  # Date recorded
-            self.results_table.setItem(row, 3, QTableWidgetItem(bill[4]))  # Printing location
-            self.results_table.setItem(row, 4, QTableWidgetItem(str(bill[5])))  # Series year
-            self.results_table.setItem(row, 5, QTableWidgetItem("Yes" if bill[6] else "No"))  # Star note
-            self.results_table.setItem(row, 6, QTableWidgetItem(str(bill[8])))  # Estimated value
-            self.results_table.setItem(row, 7, QTableWidgetItem(bill[9]))  # Added by
+            self.set_result_row(row, bill)
+            
+    def append_results(self, results):
+        # Bills added since the first page shift later pages, so skip repeats
+        for bill in results:
+            if bill.serial_number in self.row_by_serial:
+                continue
+            row = self.results_table.rowCount()
+            self.results_table.insertRow(row)
+            self.set_result_row(row, bill)
+            
+    def set_result_row(self, row, bill):
+        bill = Bill.from_row(bill)
+        self.row_by_serial[bill.serial_number] = row
+        self.results_table.setItem(row, 0, QTableWidgetItem(str(bill.face_value)))
+        self.results_table.setItem(row, 1, QTableWidgetItem(bill.serial_number))
+        self.results_table.setItem(row, 2, QTableWidgetItem(bill.date_recorded))
+        self.results_table.setItem(row, 3, QTableWidgetItem(bill.printing_location or ''))
+        self.results_table.setItem(row, 4, QTableWidgetItem(bill.series))
+        self.results_table.setItem(row, 5, QTableWidgetItem("Yes" if bill.is_star_note else "No"))
+        self.results_table.setItem(row, 6, QTableWidgetItem(str(bill.estimated_value or '')))
+        self.results_table.setItem(row, 7, QTableWidgetItem(bill.username or ''))
+        
+        # Display image if available
+        if bill.image_path:
+            pixmap = QPixmap(bill.image_path)
+            if not pixmap.isNull():
+                label = QLabel()
+                label.setPixmap(pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio))
+                self.results_table.setCellWidget(row, 8, label)
+        else:
+            self.results_table.removeCellWidget(row, 8)
             
-            # Display image if available
-            if bill[7]:  # Image path
-                pixmap = QPixmap(bill[7])
-                if not pixmap.isNull():
-                    label = QLabel()
-                    label.setPixmap(pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio))
-                    self.results_table.setCellWidget(row, 8, label)
-                    
+    def apply_bill_changes(self, changes):
+        """Update rows on screen from pushed changes; new bills trigger a (debounced) search"""
+        for change in changes:
+            if change['type'] == 'resync':
+                # The server dropped events for us; fall back to a fresh search
+                self.search_bills()
+                return
+                
+            bill = Bill.from_row(change['bill'])
+            row = self.row_by_serial.get(change['serial_number'])
+            if row is None:
+                # Whether and where it belongs depends on the filters and
+                # sort order, which the database applies
+                self.filter_timer.start()
+            else:
+                self.set_result_row(row, bill)
+                
     def clear_form(self):
         self.serial_number.clear()
         self.series_year.clear()
         self.image_path.clear()
+        self.captured_image = None
         self.is_star_note.setChecked(False)
         
     def closeEvent(self, event):
+        if self.camera:
+            self.camera.stop(wait=False)
         if self.client:
             self.client.disconnect()
         event.accept()
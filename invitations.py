@@ -0,0 +1,153 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# Defaults for newly generated codes: one person, one week
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_USES = 1
+
+def format_code(host, port, token):
+    """The code a user shares: where the server is plus the invitation token"""
+    return f"{host}:{port}:{token}"
+
+def parse_code(code):
+    """Split a shared code into (host, port, token), or None if it is a bare token"""
+    parts = code.strip().rsplit(':', 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return parts[0], int(parts[1]), parts[2]
+
+class InvitationStore:
+    """Invitation codes in an indexed SQLite table.
+    
+    Tokens are the primary key, so lookups and redemptions touch a single
+    row however many codes exist. Each invitation can expire and can be
+    limited to a number of uses; redeem() checks and counts a use in one
+    UPDATE, so two people racing for the last use cannot both succeed.
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.lock = threading.RLock()
+        self.create_tables()
+        
+    def create_tables(self):
+        with self.lock:
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS invitations (
+                    token TEXT PRIMARY KEY,
+                    host TEXT NOT NULL,
+                    port INTEGER NOT NULL,
+                    server_token TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    max_uses INTEGER,
+                    use_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_invitations_expires ON invitations(expires_at)')
+            self.conn.commit()
+            
+    def create(self, host, port, server_token=None, ttl=DEFAULT_TTL, max_uses=DEFAULT_MAX_USES, token=None):
+        """Store a new invitation and return its token; ttl/max_uses of None mean unlimited"""
+        token = token or secrets.token_urlsafe(16)
+        now = time.time()
+        with self.lock:
+            self.cursor.execute('''
+                INSERT INTO invitations (token, host, port, server_token, created_at, expires_at, max_uses)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (token, host, port, server_token, now, now + ttl if ttl else None, max_uses))
+            self.conn.commit()
+        return token
+        
+    def get(self, token):
+        """The invitation for token if it exists, has not expired and has uses left"""
+        with self.lock:
+            self.cursor.execute('''
+                SELECT token, host, port, server_token, created_at, expires_at, max_uses, use_count
+                FROM invitations
+                WHERE token = ? AND (expires_at IS NULL OR expires_at > ?)
+                  AND (max_uses IS NULL OR use_count < max_uses)
+            ''', (token, time.time()))
+            row = self.cursor.fetchone()
+        return self._to_dict(row) if row else None
+        
+    def redeem(self, token):
+        """Use up one redemption of token; returns the invitation or None if it is not valid"""
+        with self.lock:
+            self.cursor.execute('''
+                UPDATE invitations SET use_count = use_count + 1
+                WHERE token = ? AND (expires_at IS NULL OR expires_at > ?)
+                  AND (max_uses IS NULL OR use_count < max_uses)
+            ''', (token, time.time()))
+            self.conn.commit()
+            if not self.cursor.rowcount:
+                return None
+            self.cursor.execute('''
+                SELECT token, host, port, server_token, created_at, expires_at, max_uses, use_count
+                FROM invitations WHERE token = ?
+            ''', (token,))
+            return self._to_dict(self.cursor.fetchone())
+            
+    def remove(self, token):
+        with self.lock:
+            self.cursor.execute('DELETE FROM invitations WHERE token = ?', (token,))
+            self.conn.commit()
+            return self.cursor.rowcount > 0
+            
+    def list_all(self):
+        with self.lock:
+            self.cursor.execute('''
+                SELECT token, host, port, server_token, created_at, expires_at, max_uses, use_count
+                FROM invitations ORDER BY created_at
+            ''')
+            return [self._to_dict(row) for row in self.cursor.fetchall()]
+            
+    def purge_expired(self):
+        """Delete expired and used-up invitations; returns how many were removed"""
+        with self.lock:
+            self.cursor.execute('''
+                DELETE FROM invitations
+                WHERE expires_at <= ? OR (max_uses IS NOT NULL AND use_count >= max_uses)
+            ''', (time.time(),))
+            self.conn.commit()
+            return self.cursor.rowcount
+            
+    def import_json(self, json_path):
+        """Move invitations from the old invitations.json list into the table.
+        
+        The old file was keyed by server_token, which was also the code users
+        were given, so it becomes the token of the imported row. Imported
+        invitations keep their old behaviour: no expiry and unlimited uses.
+        The file is renamed afterwards so the import runs once.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                invitations = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {json_path}: {e}")
+            return 0
+            
+        now = time.time()
+        with self.lock:
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO invitations (token, host, port, server_token, created_at, expires_at, max_uses)
+                VALUES (?, ?, ?, ?, ?, NULL, NULL)
+            ''', [(inv['server_token'], inv.get('host', 'localhost'), inv.get('port', 5000), inv['server_token'], now)
+                  for inv in invitations if inv.get('server_token')])
+            self.conn.commit()
+        os.replace(json_path, f"{json_path}.migrated")
+        return len(invitations)
+        
+    def close(self):
+        with self.lock:
+            self.conn.close()
+            
+    def _to_dict(self, row):
+        keys = ('token', 'host', 'port', 'server_token', 'created_at', 'expires_at', 'max_uses', 'use_count')
+        return dict(zip(keys, row))
\ No newline at end of file
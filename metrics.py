@@ -0,0 +1,193 @@
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from sub-millisecond lookups to slow OCR/hashing
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+class Metrics:
+    """Thread-safe counters, gauges and latency histograms.
+    
+    Series are identified by a name plus keyword labels, the same model
+    Prometheus uses, so render_prometheus() can expose them unchanged.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            
+    def add_gauge(self, name, delta, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+            
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+            
+    def time(self, name, **labels):
+        """Context manager observing the duration of a block"""
+        return _Timer(self, name, labels)
+        
+    def snapshot(self):
+        """JSON-friendly view of every series, for the 'stats' action"""
+        with self.lock:
+            return {
+                'counters': {_series(key): value for key, value in self.counters.items()},
+                'gauges': {_series(key): value for key, value in self.gauges.items()},
+                'histograms': {
+                    _series(key): {
+                        'count': h.count,
+                        'sum': h.sum,
+                        'p50': h.quantile(0.5),
+                        'p95': h.quantile(0.95),
+                        'p99': h.quantile(0.99)
+                    }
+                    for key, h in self.histograms.items()
+                }
+            }
+            
+    def render_prometheus(self):
+        """Text exposition format, one sample per line"""
+        lines = []
+        with self.lock:
+            for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({key[0] for key in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in series.items():
+                        if key[0] == name:
+                            lines.append(f"{_series(key)} {value}")
+                            
+            for name in sorted({key[0] for key in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), h in self.histograms.items():
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + ('+Inf',), h.counts):
+                        cumulative += count
+                        lines.append(f"{_series((name + '_bucket', labels + (('le', bound),)))} {cumulative}")
+                    lines.append(f"{_series((name + '_sum', labels))} {h.sum}")
+                    lines.append(f"{_series((name + '_count', labels))} {h.count}")
+        return '\n'.join(lines) + '\n'
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+        
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+class InstrumentedLock:
+    """Re-entrant lock that records how long callers wait to acquire it"""
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self._lock = threading.RLock()
+        
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self.metrics.observe(self.name, time.perf_counter() - start)
+        return acquired
+        
+    def release(self):
+        self._lock.release()
+        
+    def __enter__(self):
+        self.acquire()
+        return self
+        
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+
+def instrument_methods(obj, method_names, metrics, name):
+    """Time calls to obj's methods under one histogram labelled by method"""
+    for method_name in method_names:
+        method = getattr(obj, method_name)
+        
+        @functools.wraps(method)
+        def timed(*args, _method=method, _label=method_name, **kwargs):
+            with metrics.time(name, method=_label):
+                return _method(*args, **kwargs)
+                
+        setattr(obj, method_name, timed)
+
+def serve_metrics(metrics, host='127.0.0.1', port=9105):
+    """Serve render_prometheus() at http://host:port/metrics from a daemon thread"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, format, *args):
+            pass
+            
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+def _series(key):
+    name, labels = key
+    if not labels:
+        return name
+    label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{{{label_text}}}"
+
+def _escape(value):
+    # Label values are quoted in the text format, so these must be escaped
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
\ No newline at end of file
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+class EventQueue:
+    """Per-subscriber outbox that coalesces changes by serial number.
+    
+    A slow client never blocks the publisher: repeated changes to the same
+    bill collapse into one pending event, and once too many distinct bills
+    are pending the queue is dropped in favour of a single 'resync' event
+    telling the client to search again.
+    """
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self.closed = False
+        self.condition = threading.Condition()
+        
+    def put(self, change):
+        with self.condition:
+            if self.closed or self.overflowed:
+                return
+                
+            serial_number = change['serial_number']
+            previous = self.pending.get(serial_number)
+            if previous is not None:
+                # An insert followed by updates is still an insert to a
+                # client that has not seen the bill yet
+                if previous['type'] == 'insert':
+                    change = dict(change, type='insert')
+                self.pending[serial_number] = change
+            elif len(self.pending) >= self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+            else:
+                self.pending[serial_number] = change
+            self.condition.notify()
+            
+    def get_batch(self, max_batch=200):
+        """Block until changes are pending; return None once closed"""
+        with self.condition:
+            while not (self.pending or self.overflowed or self.closed):
+                self.condition.wait()
+                
+            if self.closed:
+                return None
+            if self.overflowed:
+                self.overflowed = False
+                return [{'type': 'resync'}]
+                
+            batch = []
+            while self.pending and len(batch) < max_batch:
+                batch.append(self.pending.popitem(last=False)[1])
+            return batch
+            
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.pending.clear()
+            self.condition.notify()
+
+class NotificationHub:
+    """Fans bill changes out to subscribed client connections.
+    
+    relay, if set, is called with every change published here so other
+    server processes can deliver() it to their own subscribers.
+    """
+    def __init__(self, max_pending=1000, max_batch=200, relay=None):
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.relay = relay
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        
+    def subscribe(self, key, connection):
+        queue = EventQueue(self.max_pending)
+        with self.lock:
+            old_queue = self.subscribers.pop(key, None)
+            self.subscribers[key] = queue
+        if old_queue:
+            old_queue.close()
+            
+        sender = threading.Thread(
+            target=self._send_events,
+            args=(key, queue, connection),
+            daemon=True
+        )
+        sender.start()
+        
+    def unsubscribe(self, key):
+        with self.lock:
+            queue = self.subscribers.pop(key, None)
+        if queue:
+            queue.close()
+            
+    def publish(self, change_type, bill):
+        """Queue an insert/update of a bill row for every subscriber"""
+        if bill is None:
+            return
+        change = {'type': change_type, 'serial_number': bill[2], 'bill': list(bill)}
+        self.deliver(change)
+        if self.relay:
+            self.relay(change)
+            
+    def deliver(self, change):
+        """Queue a change for this process's subscribers only"""
+        with self.lock:
+            queues = list(self.subscribers.values())
+        for queue in queues:
+            queue.put(change)
+            
+    def _send_events(self, key, queue, connection):
+        try:
+            while True:
+                batch = queue.get_batch(self.max_batch)
+                if batch is None:
+                    break
+                connection.send({'event': 'bills_changed', 'changes': batch})
+        except OSError as e:
+            print(f"Dropping subscriber {key}: {e}")
+            self.unsubscribe(key)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+# OWASP 2023 guidance; use --calibrate on slow counter machines
+DEFAULT_ITERATIONS = 600000
+DEFAULT_SCRYPT_N = 2 ** 14
+
+class PasswordHasher:
+    """Salted, tunable password hashing.
+
+    Hashes are stored as self-describing strings such as
+    'pbkdf2_sha256$600000$<salt>$<digest>' or
+    'scrypt$16384$8$1$<salt>$<digest>', so the cost can be raised later
+    without breaking existing accounts. Bare hex digests are the original
+    single-round salted SHA-256 (salt kept in users.salt); they still
+    verify, and needs_rehash() reports them so they can be upgraded on the
+    next successful login.
+    """
+    def __init__(self, scheme='pbkdf2_sha256', iterations=DEFAULT_ITERATIONS,
+                 scrypt_n=DEFAULT_SCRYPT_N, scrypt_r=8, scrypt_p=1):
+        if scheme not in ('pbkdf2_sha256', 'scrypt'):
+            raise ValueError(f"Unknown password hash scheme: {scheme}")
+        self.scheme = scheme
+        self.iterations = iterations
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+        # Verified against unknown usernames so they take as long as real ones
+        self.dummy_hash = None
+
+    @classmethod
+    def from_environment(cls):
+        """Build a hasher from DOLLAR_TRACKER_HASH_* environment variables"""
+        return cls(
+            scheme=os.environ.get('DOLLAR_TRACKER_HASH_SCHEME', 'pbkdf2_sha256'),
+            iterations=int(os.environ.get('DOLLAR_TRACKER_HASH_ITERATIONS', DEFAULT_ITERATIONS)),
+            scrypt_n=int(os.environ.get('DOLLAR_TRACKER_SCRYPT_N', DEFAULT_SCRYPT_N))
+        )
+
+    def hash(self, password):
+        salt = secrets.token_hex(16)
+        if self.scheme == 'scrypt':
+            params = (self.scrypt_n, self.scrypt_r, self.scrypt_p)
+            digest = self._scrypt(password, salt, *params)
+            return f"scrypt${params[0]}${params[1]}${params[2]}${salt}${digest}"
+        digest = self._pbkdf2(password, salt, self.iterations)
+        return f"pbkdf2_sha256${self.iterations}${salt}${digest}"
+
+    def verify(self, password, stored_hash, legacy_salt=''):
+        parts = stored_hash.split('$')
+        if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+            computed = self._pbkdf2(password, parts[2], int(parts[1]))
+        elif parts[0] == 'scrypt' and len(parts) == 6:
+            computed = self._scrypt(password, parts[4], int(parts[1]), int(parts[2]), int(parts[3]))
+        else:
+            computed = hashlib.sha256((password + legacy_salt).encode()).hexdigest()
+            return hmac.compare_digest(computed, stored_hash)
+        return hmac.compare_digest(computed, parts[-1])
+
+    def verify_dummy(self, password):
+        if self.dummy_hash is None:
+            self.dummy_hash = self.hash(secrets.token_hex(16))
+        self.verify(password, self.dummy_hash)
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with a different scheme or cost"""
+        parts = stored_hash.split('$')
+        if self.scheme == 'scrypt':
+            return parts[0] != 'scrypt' or parts[1:4] != [str(self.scrypt_n), str(self.scrypt_r), str(self.scrypt_p)]
+        return parts[0] != 'pbkdf2_sha256' or parts[1] != str(self.iterations)
+
+    def _pbkdf2(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+
+    def _scrypt(self, password, salt, n, r, p):
+        # scrypt needs 128 * n * r * p bytes; leave headroom over OpenSSL's 32 MiB default
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + 2 ** 20, dklen=32).hex()
+
+def time_hash(hasher, rounds=3):
+    """Best wall-clock seconds to hash one password with hasher"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hasher.hash('benchmark password')
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def calibrate(scheme='pbkdf2_sha256', target_seconds=0.25):
+    """Return a PasswordHasher whose cost takes about target_seconds on this machine"""
+    if scheme == 'scrypt':
+        n = 2 ** 12
+        while time_hash(PasswordHasher('scrypt', scrypt_n=n * 2)) <= target_seconds and n < 2 ** 20:
+            n *= 2
+        return PasswordHasher('scrypt', scrypt_n=n)
+
+    probe = PasswordHasher(iterations=50000)
+    per_iteration = time_hash(probe) / probe.iterations
+    iterations = max(100000, int(target_seconds / per_iteration) // 10000 * 10000)
+    return PasswordHasher(iterations=iterations)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and tune password hashing cost")
+    parser.add_argument('--scheme', choices=['pbkdf2_sha256', 'scrypt'], default='pbkdf2_sha256')
+    parser.add_argument('--target-ms', type=float, default=250,
+                        help="pick the cost that takes about this long per login")
+    args = parser.parse_args()
+
+    current = PasswordHasher.from_environment()
+    print(f"Current settings ({current.scheme}): {time_hash(current) * 1000:.0f} ms per hash")
+
+    tuned = calibrate(args.scheme, args.target_ms / 1000)
+    print(f"Tuned for {args.target_ms:.0f} ms: {time_hash(tuned) * 1000:.0f} ms per hash")
+    print(f"export DOLLAR_TRACKER_HASH_SCHEME={tuned.scheme}")
+    if tuned.scheme == 'scrypt':
+        print(f"export DOLLAR_TRACKER_SCRYPT_N={tuned.scrypt_n}")
+    else:
+        print(f"export DOLLAR_TRACKER_HASH_ITERATIONS={tuned.iterations}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
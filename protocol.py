@@ -0,0 +1,226 @@
+import json
+import socket
+import struct
+import threading
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every message on the wire is a header followed by an encoded payload, so
+# large results and server pushes can share a stream. The header carries the
+# payload length, the request id the message answers (responses may arrive
+# in any order and unsolicited pushes use request id 0) and flags describing
+# how the payload is encoded, so every frame can be decoded on its own.
+HEADER = struct.Struct('!IIB')
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Flag bits: the low nibble is the codec, the rest are transforms
+CODEC_MASK = 0x0F
+ZLIB = 0x10
+ZSTD = 0x20
+COLUMNAR = 0x40
+
+CODECS = {'json': 0}
+if msgpack:
+    CODECS['msgpack'] = 1
+COMPRESSIONS = {'zlib': ZLIB}
+if zstandard:
+    COMPRESSIONS['zstd'] = ZSTD
+
+class WireFormat:
+    """How one side of a connection encodes the messages it sends.
+    
+    The default is plain JSON, which every peer understands. Connections
+    negotiate something more compact with the 'hello' action: msgpack
+    instead of JSON, result rows sent column by column, and compression of
+    payloads larger than compress_threshold bytes.
+    """
+    def __init__(self, encoding='json', compression=None, columnar=False, compress_threshold=4096):
+        self.encoding = encoding
+        self.compression = compression
+        self.columnar = columnar
+        self.compress_threshold = compress_threshold
+        
+    def describe(self):
+        return {'encoding': self.encoding, 'compression': self.compression, 'columnar': self.columnar}
+        
+    def encode(self, message):
+        """Return (flags, payload bytes) for a message"""
+        flags = CODECS[self.encoding]
+        if self.columnar:
+            columnar_message = _to_columns(message)
+            if columnar_message is not message:
+                message = columnar_message
+                flags |= COLUMNAR
+                
+        if self.encoding == 'msgpack':
+            payload = msgpack.packb(message, use_bin_type=True)
+        else:
+            payload = json.dumps(message).encode()
+            
+        if self.compression and len(payload) >= self.compress_threshold:
+            if self.compression == 'zstd':
+                compressed = zstandard.ZstdCompressor(level=3).compress(payload)
+            else:
+                compressed = zlib.compress(payload, 1)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= COMPRESSIONS[self.compression]
+        return flags, payload
+
+JSON_FORMAT = WireFormat()
+
+def client_offer():
+    """What this side can speak, most compact first; sent in 'hello'"""
+    return {
+        'encodings': sorted(CODECS, key=lambda name: name == 'json'),
+        'compression': sorted(COMPRESSIONS, key=lambda name: name == 'zlib'),
+        'columnar': True
+    }
+
+def negotiate(offer):
+    """Pick the wire format for a connection from a client's 'hello' offer"""
+    encoding = next((e for e in offer.get('encodings', []) if e in CODECS), 'json')
+    compression = next((c for c in offer.get('compression', []) if c in COMPRESSIONS), None)
+    return WireFormat(encoding, compression, bool(offer.get('columnar')))
+
+def decode(flags, payload, from_columns=None):
+    """Decode one payload.
+    
+    from_columns, if given, is called with a columnar payload's column lists
+    to build 'results', instead of transposing them back into rows.
+    """
+    if flags & ZSTD:
+        if not zstandard:
+            raise ValueError("Received zstd payload but zstandard is not installed")
+        payload = zstandard.ZstdDecompressor().decompress(payload, max_output_size=MAX_MESSAGE_SIZE)
+    elif flags & ZLIB:
+        decompressor = zlib.decompressobj()
+        payload = decompressor.decompress(payload, MAX_MESSAGE_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Decompressed message exceeds limit")
+            
+    if flags & CODEC_MASK == CODECS.get('msgpack'):
+        message = msgpack.unpackb(payload, raw=False)
+    elif flags & CODEC_MASK == CODECS['json']:
+        message = json.loads(payload.decode())
+    else:
+        raise ValueError(f"Unsupported codec {flags & CODEC_MASK}")
+        
+    if flags & COLUMNAR:
+        if from_columns:
+            message = dict(message, results=from_columns(message['results']['columns']))
+        else:
+            message = _from_columns(message)
+    return message
+
+def send_message(sock, message, request_id=0, wire_format=JSON_FORMAT):
+    """Frame and send one message; returns the number of bytes written"""
+    flags, payload = wire_format.encode(message)
+    return send_payload(sock, flags, payload, request_id)
+    
+def send_payload(sock, flags, payload, request_id=0):
+    """Frame and send a payload encoded earlier; returns the number of bytes written"""
+    frame = HEADER.pack(len(payload), request_id, flags) + payload
+    sock.sendall(frame)
+    return len(frame)
+
+def recv_message(sock, from_columns=None):
+    """Receive one framed message as (request_id, message), or None if the peer closed the connection"""
+    frame = recv_frame(sock, from_columns)
+    return frame[:2] if frame else None
+
+def recv_frame(sock, from_columns=None):
+    """Like recv_message, but returns (request_id, message, bytes read)"""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+        
+    length, request_id, flags = HEADER.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {length} bytes exceeds limit")
+        
+    payload = _recv_exact(sock, length)
+    if payload is None:
+        raise ConnectionError("Connection closed mid-message")
+    return request_id, decode(flags, payload, from_columns), HEADER.size + length
+
+class Connection:
+    """Server side of a client socket and the wire format negotiated for it.
+    
+    send() is safe to call from several threads, which responses from the
+    worker pool and pushed events both do.
+    """
+    def __init__(self, sock, address, metrics=None):
+        self.sock = sock
+        self.address = address
+        self.metrics = metrics
+        self.wire_format = JSON_FORMAT
+        self.send_lock = threading.Lock()
+        
+    def send(self, message, request_id=0):
+        with self.send_lock:
+            size = send_message(self.sock, message, request_id, self.wire_format)
+        if self.metrics:
+            self.metrics.inc('bytes_sent_total', size)
+            
+    def send_encoded(self, flags, payload, request_id=0):
+        """Send a payload already encoded in this connection's wire format"""
+        with self.send_lock:
+            size = send_payload(self.sock, flags, payload, request_id)
+        if self.metrics:
+            self.metrics.inc('bytes_sent_total', size)
+            
+    def recv(self):
+        frame = recv_frame(self.sock)
+        if frame is None:
+            return None
+        if self.metrics:
+            self.metrics.inc('bytes_received_total', frame[2])
+        return frame[:2]
+        
+    def shutdown_read(self):
+        """Stop receiving; a blocked recv() returns as if the peer hung up"""
+        try:
+            self.sock.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+            
+    def close(self):
+        self.sock.close()
+
+def _to_columns(message):
+    # Rows from SQLite repeat the same types column after column, which packs
+    # and compresses much better when sent as one list per column
+    results = message.get('results') if isinstance(message, dict) else None
+    if not results or not isinstance(results, list):
+        return message
+    width = len(results[0]) if isinstance(results[0], (list, tuple)) else None
+    if width is None or any(not isinstance(row, (list, tuple)) or len(row) != width for row in results):
+        return message
+    return dict(message, results={'columns': [list(column) for column in zip(*results)]})
+
+def _from_columns(message):
+    columns = message['results']['columns']
+    return dict(message, results=[list(row) for row in zip(*columns)])
+
+def _recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 65536))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("Connection closed mid-message")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
\ No newline at end of file
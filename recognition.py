@@ -0,0 +1,131 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+# Largest image a client may upload, and how many it may stream at once
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_UPLOADS = 4
+
+class ImageUploads:
+    """Images a connection is streaming to the server, assembled chunk by chunk.
+    
+    Chunks arrive as bytes over msgpack or as base64 text over JSON. An
+    upload that would exceed max_bytes is dropped with an error rather than
+    buffered.
+    """
+    def __init__(self, max_bytes=MAX_IMAGE_BYTES, max_uploads=MAX_UPLOADS):
+        self.max_bytes = max_bytes
+        self.max_uploads = max_uploads
+        self.buffers = {}
+        # Uploads refused part way; their remaining chunks are refused too
+        self.rejected = set()
+        # Recognitions queued for this connection, so it can wait for them before closing
+        self.jobs = set()
+        
+    def is_new(self, upload_id):
+        return upload_id not in self.buffers and upload_id not in self.rejected
+        
+    def add(self, upload_id, chunk, last=False):
+        if not upload_id:
+            raise ValueError("Missing upload_id")
+        if upload_id in self.rejected:
+            if last:
+                self.rejected.discard(upload_id)
+            raise ValueError("Upload was rejected")
+        try:
+            self._append(upload_id, chunk)
+        except ValueError:
+            self.buffers.pop(upload_id, None)
+            if not last:
+                self.rejected.add(upload_id)
+            raise
+            
+    def _append(self, upload_id, chunk):
+        if isinstance(chunk, str):
+            chunk = base64.b64decode(chunk)
+        elif not isinstance(chunk, (bytes, bytearray)):
+            raise ValueError("Image chunk must be bytes")
+            
+        buffer = self.buffers.get(upload_id)
+        if buffer is None:
+            if len(self.buffers) >= self.max_uploads:
+                raise ValueError("Too many uploads in progress")
+            buffer = self.buffers[upload_id] = bytearray()
+        if len(buffer) + len(chunk) > self.max_bytes:
+            raise ValueError(f"Image exceeds {self.max_bytes // (1024 * 1024)} MB")
+        buffer += chunk
+        
+    def pop(self, upload_id):
+        return bytes(self.buffers.pop(upload_id, b''))
+        
+    def track(self, job):
+        self.jobs = {queued for queued in self.jobs if not queued.done()}
+        self.jobs.add(job)
+
+class RecognitionPool:
+    """Runs ImageProcessor on uploaded images for clients without OpenCV.
+    
+    OCR takes hundreds of milliseconds of CPU per image, so it gets its own
+    pool, sized for the machine, with a bounded backlog: once workers +
+    queue images are waiting, submit() turns new ones away instead of
+    letting the backlog (and the memory holding the images) grow. OpenCV
+    and Tesseract release the GIL, so the workers run in parallel.
+    """
+    def __init__(self, workers=2, queue=8, metrics=None, profile=None, preset='auto'):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.metrics = metrics
+        self.profile = profile
+        self.preset = preset
+        self._processor = None
+        self._import_error = None
+        self.lock = threading.Lock()
+        
+    @property
+    def processor(self):
+        with self.lock:
+            if self._processor is None and self._import_error is None:
+                try:
+                    from image_processor import ImageProcessor
+                    self._processor = ImageProcessor(profile=self.profile, preset=self.preset)
+                except ImportError as e:
+                    self._import_error = f"Image recognition is not available on this server: {e}"
+            return self._processor
+            
+    def unavailable(self):
+        """Why images cannot be recognized here, or None if they can"""
+        if self.processor is None:
+            return self._import_error
+        return None
+        
+    def submit(self, image, callback):
+        """Queue image bytes; callback(result) runs on a pool thread.
+        
+        Returns a Future, or None if the backlog is full.
+        """
+        if not self.slots.acquire(blocking=False):
+            return None
+        if self.metrics:
+            self.metrics.add_gauge('ocr_jobs_queued', 1)
+        return self.executor.submit(self._recognize, image, callback)
+        
+    def _recognize(self, image, callback):
+        if self.metrics:
+            self.metrics.add_gauge('ocr_jobs_queued', -1)
+        outcome = 'error'
+        try:
+            with self.metrics.time('ocr_seconds') if self.metrics else nullcontext():
+                result = self.processor.process_bill_bytes(image)
+            outcome = 'success' if result['success'] else 'no_serial'
+        except Exception as e:
+            result = {'serial_number': None, 'is_star_note': None, 'preset': None,
+                      'success': False, 'error': str(e)}
+        finally:
+            self.slots.release()
+        if self.metrics:
+            self.metrics.inc('ocr_total', outcome=outcome)
+        callback(result)
+        
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
\ No newline at end of file
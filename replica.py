@@ -0,0 +1,380 @@
+import json
+import sqlite3
+import threading
+from database import Database, BILL_FIELDS, location_code
+from migrations import drop_history_triggers
+from serials import serial_key, serial_text
+from bill_record import Bill, BillResultSet
+
+class LocalReplica(Database):
+    """Client-side copy of the collection.
+    
+    Uses the server's schema so search_bills/get_user_bills work unchanged,
+    plus an outbox of writes that have not reached the server yet.
+    """
+    def create_tables(self):
+        super().create_tables()
+        with self.lock:
+            # The server keeps the change history; a copy here would only
+            # slow down syncing
+            drop_history_triggers(self.conn)
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pending_writes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL,
+                    serial_number TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.conn.commit()
+            
+    def remember_user(self, user_id, username, password):
+        """Cache a server login so the same credentials work while offline"""
+        # Hashing is deliberately slow, so it happens outside the database
+        # lock, and not at all when the cached hash is already current
+        with self.lock:
+            self.cursor.execute('SELECT username, password_hash, salt FROM users WHERE id = ?', (user_id,))
+            cached = self.cursor.fetchone()
+        if (cached and cached[0] == username and not self.password_hasher.needs_rehash(cached[1])
+                and self.password_hasher.verify(password, cached[1], cached[2])):
+            return
+            
+        password_hash = self.password_hasher.hash(password)
+        with self.lock:
+            self.cursor.execute('DELETE FROM users WHERE username = ? AND id != ?', (username, user_id))
+            self.cursor.execute('''
+                INSERT INTO users (id, username, password_hash, salt)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET username = excluded.username,
+                    password_hash = excluded.password_hash, salt = excluded.salt
+            ''', (user_id, username, password_hash, ''))
+            self.conn.commit()
+            
+    def record_write(self, op, serial_number, fields, user_id):
+        """Apply a local add/update and queue it for the server in one transaction.
+        
+        Returns a response like the server's; if any step fails, nothing
+        is kept and the error says why.
+        """
+        serial_number = serial_text(serial_number)
+        with self.lock:
+            try:
+                if op == 'add':
+                    self._insert_bill(dict(fields, serial_number=serial_number), user_id)
+                else:
+                    self.cursor.execute('SELECT added_by FROM bills WHERE serial_number = ?', (serial_number,))
+                    result = self.cursor.fetchone()
+                    if not result or result[0] != user_id:
+                        return {'success': False}
+                    self._update_bill_fields(serial_number, fields)
+                    
+                self.cursor.execute('''
+                    INSERT INTO pending_writes (op, serial_number, fields)
+                    VALUES (?, ?, ?)
+                ''', (op, serial_number, json.dumps(fields)))
+                self._commit_bills()
+                return {'success': True}
+            except sqlite3.IntegrityError:
+                self.conn.rollback()
+                return {'success': False, 'error': 'Serial number already recorded'}
+            except Exception as e:
+                self.conn.rollback()
+                return {'success': False, 'error': str(e)}
+                
+    def get_pending_writes(self, limit):
+        with self.lock:
+            self.cursor.execute('''
+                SELECT id, op, serial_number, fields FROM pending_writes
+                ORDER BY id LIMIT ?
+            ''', (limit,))
+            return [
+                {'id': row[0], 'op': row[1], 'serial_number': row[2], 'fields': json.loads(row[3])}
+                for row in self.cursor.fetchall()
+            ]
+            
+    def count_pending_writes(self):
+        with self.lock:
+            self.cursor.execute('SELECT COUNT(*) FROM pending_writes')
+            return self.cursor.fetchone()[0]
+            
+    def acknowledge_writes(self, write_ids):
+        with self.lock:
+            self.cursor.executemany('DELETE FROM pending_writes WHERE id = ?',
+                                    [(write_id,) for write_id in write_ids])
+            self.conn.commit()
+            
+    def apply_server_bills(self, bills):
+        """Upsert full bill rows from the server, keyed by serial number.
+        
+        Bills with local writes still queued are skipped; the server's
+        answer to those writes will bring them up to date.
+        """
+        with self.lock:
+            self.cursor.execute('SELECT DISTINCT serial_number FROM pending_writes')
+            pending = {row[0] for row in self.cursor.fetchall()}
+            
+            applied = []
+            for bill in bills:
+                if bill is None or bill[2] in pending:
+                    continue
+                if bill[10] is not None:
+                    self.cursor.execute('''
+                        INSERT OR IGNORE INTO users (id, username, password_hash, salt)
+                        VALUES (?, ?, '', '')
+                    ''', (bill[10], bill[11]))
+                code = location_code(bill[4])
+                self._add_locations([code])
+                self.cursor.execute('''
+                    INSERT INTO bills (face_value, serial_number, date_recorded,
+                                     printing_location_id, series_year, is_star_note,
+                                     is_star_filled, image_path, estimated_value, added_by, serial_key,
+                                     series_suffix)
+                    VALUES (?, ?, ?, (SELECT id FROM printing_locations WHERE code = ?), ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(serial_number) DO UPDATE SET
+                        face_value = excluded.face_value,
+                        date_recorded = excluded.date_recorded,
+                        printing_location_id = excluded.printing_location_id,
+                        series_year = excluded.series_year,
+                        is_star_note = excluded.is_star_note,
+                        is_star_filled = excluded.is_star_filled,
+                        image_path = excluded.image_path,
+                        estimated_value = excluded.estimated_value,
+                        added_by = excluded.added_by,
+                        series_suffix = excluded.series_suffix
+                ''', (bill[1], serial_text(bill[2]), bill[3], code) + tuple(bill[5:11]) + (serial_key(bill[2]),
+                                                                        bill[12] if len(bill) > 12 else None))
+                applied.append(bill)
+            self._commit_bills()
+            return applied
+            
+    def get_state(self, key, default=None):
+        with self.lock:
+            self.cursor.execute('SELECT value FROM sync_state WHERE key = ?', (key,))
+            result = self.cursor.fetchone()
+            return json.loads(result[0]) if result else default
+            
+    def set_state(self, key, value):
+        with self.lock:
+            self.cursor.execute('''
+                INSERT INTO sync_state (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            ''', (key, json.dumps(value)))
+            self.conn.commit()
+
+class ReplicatedClient:
+    """Offline-first front end for DollarTrackerClient.
+    
+    Exposes the same methods the GUI uses, but reads and writes go to a
+    LocalReplica so the UI never waits on the network. A background thread
+    pushes queued writes and pulls server changes in batches whenever the
+    server is reachable, with the serial number as the conflict key.
+    """
+    def __init__(self, client, replica_path, sync_interval=5.0, batch_size=200):
+        self.client = client
+        self.replica = LocalReplica(str(replica_path))
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.user_id = None
+        # Kept in memory only, to open a new session when the server forgets ours
+        self.credentials = None
+        self.online = False
+        self.callback = None
+        self.needs_full_pull = True
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.sync_thread = None
+        
+    def login(self, username, password):
+        response = self.client.login(username, password)
+        
+        if response['success']:
+            self.replica.remember_user(response['user_id'], username, password)
+            self.online = True
+        elif not self.client.is_connected():
+            # Server unreachable: fall back to the credentials cached at the last online login
+            user_id = self.replica.verify_user(username, password)
+            if not user_id:
+                return response
+            self.client.user_id = user_id
+            response = {'success': True, 'user_id': user_id, 'offline': True}
+        else:
+            return response
+            
+        self.user_id = response['user_id']
+        self.credentials = (username, password)
+        self.client.subscribe(self._on_server_changes)
+        self.start_sync()
+        return response
+        
+    def create_user(self, username, password):
+        return self.client.create_user(username, password)
+        
+    def add_bill(self, **bill_data):
+        if not self.user_id:
+            return {'success': False, 'error': 'Not logged in'}
+            
+        fields = {k: bill_data[k] for k in BILL_FIELDS if k in bill_data and k != 'serial_number'}
+        response = self.replica.record_write('add', bill_data['serial_number'], fields, self.user_id)
+        if not response['success']:
+            return response
+        self.wake.set()
+        return {'success': True,
+                'possible_duplicates': self.replica.find_similar_serials(bill_data['serial_number'])}
+                
+    def search_bills(self, criteria=None, cancelled=None):
+        """Search the replica; cancelled (see Database.search_bills) stops a superseded search"""
+        if not self.user_id:
+            return {'success': False, 'error': 'Not logged in'}
+            
+        try:
+            results = self.replica.search_bills(criteria or {}, cancelled)
+        except sqlite3.OperationalError as e:
+            if cancelled and cancelled():
+                return {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
+            return {'success': False, 'error': str(e)}
+        except (TypeError, ValueError) as e:
+            return {'success': False, 'error': str(e)}
+        return {'success': True, 'results': BillResultSet.from_rows(results)}
+        
+    def update_bill(self, serial_number, **updates):
+        if not self.user_id:
+            return {'success': False, 'error': 'Not logged in'}
+            
+        response = self.replica.record_write('update', serial_number, updates, self.user_id)
+        if response['success']:
+            self.wake.set()
+        return response
+        
+    def get_user_bills(self):
+        if not self.user_id:
+            return {'success': False, 'error': 'Not logged in'}
+            
+        return {'success': True, 'results': BillResultSet.from_rows(self.replica.get_user_bills(self.user_id))}
+        
+    def recognize_image(self, image):
+        """OCR on the server; needs a connection, unlike the bill methods"""
+        return self.client.recognize_image(image)
+        
+    def get_sync_status(self):
+        return {'online': self.online, 'pending_writes': self.replica.count_pending_writes()}
+        
+    def subscribe(self, callback):
+        """Receive bill changes pulled from the server, in the client's change format"""
+        self.callback = callback
+        return {'success': True}
+        
+    def unsubscribe(self):
+        self.callback = None
+        
+    def start_sync(self):
+        if self.sync_thread and self.sync_thread.is_alive():
+            return
+        self.stopped.clear()
+        self.sync_thread = threading.Thread(target=self._run_sync, daemon=True)
+        self.sync_thread.start()
+        
+    def disconnect(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.sync_thread:
+            self.sync_thread.join(timeout=self.sync_interval)
+            self.sync_thread = None
+        self.client.disconnect()
+        self.replica.close()
+        
+    def _run_sync(self):
+        while not self.stopped.is_set():
+            try:
+                online = self.sync_now()
+            except Exception as e:
+                print(f"Sync error: {e}")
+                online = False
+                
+            if not online:
+                # Anything could have changed while we were away
+                self.needs_full_pull = True
+            self.online = online
+            
+            self.wake.wait(self.sync_interval)
+            self.wake.clear()
+            
+    def sync_now(self):
+        """Push queued writes, then pull server changes. Returns False when offline."""
+        return self._ensure_session() and self._push_writes() and self._pull_bills()
+        
+    def _ensure_session(self):
+        # Logged in offline, or the server restarted and dropped our session
+        if self.client.session_token:
+            return True
+        username, password = self.credentials
+        response = self.client.login(username, password)
+        if not response['success'] and self.client.is_connected():
+            print(f"Could not re-authenticate with the server: {response.get('error')}")
+        return response['success']
+        
+    def _check_failure(self, response):
+        if response.get('auth_required'):
+            self.client.session_token = None
+            
+    def _push_writes(self):
+        while True:
+            writes = self.replica.get_pending_writes(self.batch_size)
+            if not writes:
+                return True
+                
+            response = self.client.send_request('sync_bills', {
+                'changes': [
+                    {'op': w['op'], 'serial_number': w['serial_number'], 'fields': w['fields']}
+                    for w in writes
+                ]
+            })
+            if not response['success']:
+                self._check_failure(response)
+                if self.client.is_connected():
+                    print(f"Server rejected sync batch: {response.get('error')}")
+                return False
+                
+            self.replica.acknowledge_writes([w['id'] for w in writes])
+            for result in response['results']:
+                if result['status'] == 'conflict':
+                    print(f"Bill {result['serial_number']} conflicts with the server copy; keeping the server's")
+            self._notify(self.replica.apply_server_bills([r['bill'] for r in response['results']]))
+            
+    def _pull_bills(self):
+        after_id = 0 if self.needs_full_pull else self.replica.get_state('last_server_id', 0)
+        while True:
+            response = self.client.send_request('pull_bills', {'after_id': after_id, 'limit': self.batch_size})
+            if not response['success']:
+                self._check_failure(response)
+                return False
+                
+            bills = response['results']
+            self._notify(self.replica.apply_server_bills(bills))
+            if bills:
+                after_id = max(after_id, bills[-1][0])
+                self.replica.set_state('last_server_id', after_id)
+            if len(bills) < self.batch_size:
+                self.needs_full_pull = False
+                return True
+                
+    def _on_server_changes(self, changes):
+        bills = [change['bill'] for change in changes if change['type'] != 'resync']
+        self._notify(self.replica.apply_server_bills(bills))
+        if len(bills) < len(changes):
+            self.needs_full_pull = True
+            self.wake.set()
+            
+    def _notify(self, bills):
+        callback = self.callback
+        if callback and bills:
+            callback([
+                {'type': 'update', 'serial_number': bill[2], 'bill': Bill.from_row(bill)}
+                for bill in bills
+            ])
\ No newline at end of file
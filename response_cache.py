@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """LRU cache of encoded responses, bounded by total payload size.
+    
+    Entries belong to the table version they were read at, a number that
+    only grows. The first lookup at a newer version drops every entry at
+    once and lookups at an older one (a request that read the version
+    just before a write) miss, so a write is never answered with stale
+    results and old entries do not linger in memory.
+    """
+    def __init__(self, max_bytes=32 * 1024 * 1024, metrics=None):
+        self.max_bytes = max_bytes
+        # Results bigger than this are not worth evicting the rest for
+        self.max_entry_bytes = max_bytes // 4
+        self.metrics = metrics
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = -1
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        
+    def get(self, key, version):
+        """(flags, payload) cached for key at version, or None"""
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if self.metrics:
+            self.metrics.inc('response_cache_total', result='miss' if entry is None else 'hit')
+        return entry
+        
+    def put(self, key, version, flags, payload):
+        if len(payload) > self.max_entry_bytes:
+            return
+        with self.lock:
+            if version != self.version:
+                return
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= len(old[1])
+            self.entries[key] = (flags, payload)
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+            
+    def _check_version(self, version):
+        if version > self.version:
+            self.entries.clear()
+            self.size = 0
+            self.version = version
\ No newline at end of file
@@ -0,0 +1,56 @@
+import re
+
+# serial_key() folds characters OCR mixes up onto one spelling, so two
+# entries of the same note read differently get the same key. A serial is
+# its leading letters (series and district), eight digits and a suffix
+# letter or star, so the only safe folds are the ones that cannot turn one
+# valid serial into another: in the eight digit positions, letters that
+# look like a digit become it (O/Q/D and 0, I/L and 1, B and 8, S and 5,
+# Z and 2, G and 6); in letter positions, digits that look like exactly one
+# letter become it. 0 and 1 stay as read there, because they could be
+# O, Q, D or I, L, and D, I and L are all district letters. Serials too
+# short to have letter positions are folded as digits throughout.
+DIGIT_CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'B': '8',
+                                  'S': '5', 'Z': '2', 'G': '6'})
+LETTER_CONFUSIONS = str.maketrans({'8': 'B', '5': 'S', '2': 'Z', '6': 'G'})
+# Digits between the leading letters and the suffix of every serial
+SERIAL_DIGITS = 8
+
+def serial_text(serial_number):
+    """A serial as it is stored and looked up: trimmed and in upper case"""
+    return str(serial_number).strip().upper()
+    
+def serial_key(serial_number):
+    serial = serial_text(serial_number)
+    if len(serial) < SERIAL_DIGITS + 2:
+        return serial.translate(DIGIT_CONFUSIONS)
+    return (serial[:-SERIAL_DIGITS - 1].translate(LETTER_CONFUSIONS)
+            + serial[-SERIAL_DIGITS - 1:-1].translate(DIGIT_CONFUSIONS)
+            + serial[-1].translate(LETTER_CONFUSIONS))
+
+# A note's series is its year plus, for later printings of the same design,
+# a letter: 2017A is a different series from 2017, not a typo of it
+SERIES_PATTERN = re.compile(r'(\d{4})\s*([A-Za-z]?)')
+
+def parse_series(value):
+    """(year, letter or None) from a series like 2017, '2017' or '2017A'.
+    
+    None and blank text give (None, None); anything else that is not a
+    four-digit year, optionally followed by one letter, raises ValueError.
+    """
+    if value is None or isinstance(value, str) and not value.strip():
+        return None, None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        if 1000 <= value <= 9999:
+            return value, None
+    elif isinstance(value, str):
+        match = SERIES_PATTERN.fullmatch(value.strip())
+        if match:
+            return int(match.group(1)), match.group(2).upper() or None
+    raise ValueError(f"invalid series {value!r}")
+    
+def series_text(year, letter=None):
+    """The series as written on the note ('2017A'), or '' if unknown"""
+    return f"{year}{letter or ''}" if year is not None else ''
\ No newline at end of file
@@ -1,29 +1,110 @@
 import socket
 import threading
-import json
 import sqlite3
-from database import Database
+from database import Database, search_key
+from notifications import NotificationHub
+from sessions import SessionStore
+from invitations import InvitationStore
+from response_cache import ResponseCache
+from recognition import ImageUploads, RecognitionPool
+from passwords import PasswordHasher
+from protocol import Connection, negotiate
+from metrics import Metrics, instrument_methods, serve_metrics
+import argparse
 import os
-import sys
 import signal
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Actions that act on behalf of a user and so need a session token
+AUTHENTICATED_ACTIONS = {'add_bill', 'search_bills', 'update_bill', 'sync_bills',
+                         'pull_bills', 'get_user_bills', 'subscribe', 'process_image', 'stats'}
+# Actions that hash a password and so run in the bounded auth pool
+PASSWORD_ACTIONS = {'login', 'create_user'}
+# Every action process_request knows; anything else is counted as 'invalid',
+# so clients cannot create metric series of their own
+KNOWN_ACTIONS = AUTHENTICATED_ACTIONS | PASSWORD_ACTIONS | {'logout', 'redeem_invitation'}
+# Reads answered from the response cache while the bills table is unchanged
+CACHED_ACTIONS = {'search_bills', 'get_user_bills'}
+CACHE_BYTES = 32 * 1024 * 1024
+# How often the accept loop checks whether the server is stopping
+ACCEPT_POLL_SECONDS = 0.5
+# Seconds a closing connection waits for its queued image recognitions
+OCR_DRAIN_SECONDS = 60.0
+# Database methods timed under db_call_seconds
+DB_METHODS = ('create_user', 'verify_user', 'add_bill', 'get_bill', 'search_bills',
+              'update_bill', 'get_user_bills', 'sync_bills', 'get_bills_page')
 
 class DollarTrackerServer:
-    def __init__(self, host='0.0.0.0', port=5000):
+    def __init__(self, host='0.0.0.0', port=5000, worker_threads=8, max_in_flight=32,
+                 session_ttl=12 * 3600, auth_workers=2, auth_queue=16, metrics_port=None,
+                 db_name='dollar_tracker.db', invitations_db=None, cache_bytes=CACHE_BYTES,
+                 listen_socket=None, worker_index=None, ocr_workers=2, ocr_queue=8, metrics_host='127.0.0.1'):
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.db = Database()
+        # A worker under supervisor.py is handed the supervisor's listening socket
+        self.listening = listen_socket is not None
+        self.server_socket = listen_socket or socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if not self.listening:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.worker_index = worker_index
+        self.running = False
+        self.metrics = Metrics()
+        # The metrics endpoint has no authentication: off unless a port is
+        # given, and only reachable from this machine unless a host is too
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.db = Database(db_name, password_hasher=PasswordHasher.from_environment(), metrics=self.metrics)
+        instrument_methods(self.db, DB_METHODS, self.metrics, 'db_call_seconds')
+        # Connected addresses and the session each one logged in with
         self.clients = {}
+        # Open connections and their reader threads, so stop() can drain them
+        self.connections = {}
+        self.connections_lock = threading.Lock()
+        self.sessions = SessionStore(session_ttl, self.db)
+        # Codes generated from the GUI live in the per-user config store by default
+        if invitations_db is None:
+            from config import Config
+            self.invitations = Config.shared().invitations
+        else:
+            self.invitations = InvitationStore(invitations_db)
+        self.notifications = NotificationHub()
+        # Encoded search results, so repeated queries skip SQLite and serialization
+        self.response_cache = ResponseCache(cache_bytes, self.metrics) if cache_bytes else None
+        # Requests that carry an id are answered from this pool, possibly out of order
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads)
+        self.max_in_flight = max_in_flight
+        # Password hashing is CPU-heavy by design. It gets its own small pool
+        # with a bounded backlog so a burst of logins is turned away instead
+        # of tying up the workers that serve bill traffic.
+        self.auth_pool = ThreadPoolExecutor(max_workers=auth_workers)
+        self.auth_slots = threading.BoundedSemaphore(auth_workers + auth_queue)
+        # OCR for clients that send images instead of running ImageProcessor themselves
+        self.recognition = RecognitionPool(ocr_workers, ocr_queue, self.metrics)
         
     def start(self):
+        """Accept clients until stop() is called, then drain and return"""
+        self.running = True
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            print(f"Server listening on {self.host}:{self.port}")
-            
-            while True:
-                client_socket, address = self.server_socket.accept()
+            if not self.listening:
+                self.server_socket.bind((self.host, self.port))
+                self.server_socket.listen(128)
+            name = "Server" if self.worker_index is None else f"Worker {self.worker_index} (pid {os.getpid()})"
+            print(f"{name} listening on {self.host}:{self.port}")
+            if self.metrics_port:
+                try:
+                    serve_metrics(self.metrics, self.metrics_host, self.metrics_port)
+                    print(f"Metrics at http://{self.metrics_host}:{self.metrics_port}/metrics")
+                except OSError as e:
+                    print(f"Metrics endpoint disabled: {e}")
+                    
+            # Accept with a timeout so a stop() from a signal handler is noticed
+            self.server_socket.settimeout(ACCEPT_POLL_SECONDS)
+            while self.running:
+                try:
+                    client_socket, address = self.server_socket.accept()
+                except socket.timeout:
+                    continue
+                client_socket.settimeout(None)
                 print(f"New connection from {address}")
                 client_thread = threading.Thread(
                     target=self.handle_client,
@@ -35,36 +116,239 @@ class DollarTrackerServer:
             print(f"Server error: {e}")
         finally:
             self.server_socket.close()
+            self.drain()
             
+    def stop(self):
+        """Ask start() to stop accepting; safe to call from a signal handler"""
+        self.running = False
+        
+    def drain(self, timeout=30.0):
+        """Finish requests already received, then close every connection.
+        
+        Reading stops first, so each client's reader thread ends after the
+        request it is handling, and waits for its queued responses to be
+        sent before it closes the connection.
+        """
+        with self.connections_lock:
+            connections = list(self.connections.values())
+        for connection, _ in connections:
+            connection.shutdown_read()
+        for _, thread in connections:
+            thread.join(timeout)
+        self.executor.shutdown(wait=True)
+        self.auth_pool.shutdown(wait=True)
+        self.recognition.shutdown()
+        self.db.close()
+        
     def handle_client(self, client_socket, address):
+        # Pushed events and responses share the connection; Connection.send serializes them
+        connection = Connection(client_socket, address, self.metrics)
+        with self.connections_lock:
+            self.connections[address] = (connection, threading.current_thread())
+        self.metrics.add_gauge('active_connections', 1)
+        # Stop reading once a client has this many requests queued, so one
+        # pipelining client cannot monopolize the worker pool
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        uploads = ImageUploads()
+        # Searches received on this connection and not yet answered, by
+        # request id, so a 'cancel' can stop one (see Database.search_bills)
+        searches = {}
         try:
             while True:
-                data = client_socket.recv(4096)
-                if not data:
+                frame = connection.recv()
+                if frame is None:
                     break
-                    
-                request = json.loads(data.decode())
-                response = self.process_request(request)
-                client_socket.send(json.dumps(response).encode())
+                request_id, request = frame
                 
+                if request.get('action') == 'hello':
+                    # Answer in the current format, then switch to the negotiated one
+                    wire_format = negotiate(request.get('data', {}))
+                    connection.send({'success': True, 'wire_format': wire_format.describe()}, request_id)
+                    connection.wire_format = wire_format
+                    continue
+                if request.get('action') == 'subscribe':
+                    if not self.sessions.get(request.get('session')):
+                        connection.send(self.not_authenticated(), request_id)
+                        continue
+                    # Subscribed before answering, so no change made after
+                    # the client hears back can be missed
+                    self.notifications.subscribe(address, connection)
+                    connection.send({'success': True}, request_id)
+                    continue
+                if request.get('action') == 'unsubscribe':
+                    self.notifications.unsubscribe(address)
+                    connection.send({'success': True}, request_id)
+                    continue
+                if request.get('action') == 'cancel':
+                    search = searches.get((request.get('data') or {}).get('request_id'))
+                    if search:
+                        search.set()
+                    connection.send({'success': True, 'cancelled': search is not None}, request_id)
+                    continue
+                if request.get('action') == 'process_image':
+                    # Chunks are handled here, in arrival order, not in the worker pool
+                    connection.send(self.receive_image(connection, uploads, request), request_id)
+                    continue
+                    
+                if request.get('action') in PASSWORD_ACTIONS:
+                    if not self.auth_slots.acquire(blocking=False):
+                        connection.send({'success': False, 'error': 'Server busy, try again shortly'}, request_id)
+                        continue
+                    self.metrics.add_gauge('requests_queued', 1)
+                    self.auth_pool.submit(self.respond, connection, request_id, request, self.auth_slots)
+                    continue
+                    
+                self.metrics.add_gauge('requests_queued', 1)
+                if request_id:
+                    in_flight.acquire()
+                    if request.get('action') == 'search_bills':
+                        searches[request_id] = threading.Event()
+                    self.executor.submit(self.respond, connection, request_id, request, in_flight, searches)
+                else:
+                    self.respond(connection, request_id, request)
+                    
         except Exception as e:
             print(f"Error handling client {address}: {e}")
         finally:
-            client_socket.close()
+            # Let responses still being prepared in the pool go out first
+            for _ in range(self.max_in_flight):
+                in_flight.acquire()
+            wait(uploads.jobs, OCR_DRAIN_SECONDS)
+            self.metrics.add_gauge('active_connections', -1)
+            self.notifications.unsubscribe(address)
+            connection.close()
+            with self.connections_lock:
+                self.connections.pop(address, None)
             if address in self.clients:
                 del self.clients[address]
                 
-    def process_request(self, request):
+    def respond(self, connection, request_id, request, slot=None, searches=None):
+        self.metrics.add_gauge('requests_queued', -1)
+        search = searches.get(request_id) if searches else None
         action = request.get('action')
-        data = request.get('data', {})
+        if not isinstance(action, str) or action not in KNOWN_ACTIONS:
+            action = 'invalid'
+        try:
+            with self.metrics.time('request_seconds', action=action):
+                cache_key = self.cache_key(request, connection)
+                if cache_key:
+                    # Read before the query, so a concurrent write can only make the entry miss
+                    version = self.db.bills_version()
+                    cached = self.response_cache.get(cache_key, version)
+                    if cached:
+                        connection.send_encoded(*cached, request_id)
+                        self.metrics.inc('requests_total', action=action, outcome='success')
+                        return
+                response = self.process_request(request, connection, search.is_set if search else None)
+            outcome = 'success' if response.get('success') else 'error'
+            self.metrics.inc('requests_total', action=action, outcome=outcome)
+            if cache_key and response.get('success'):
+                flags, payload = connection.wire_format.encode(response)
+                self.response_cache.put(cache_key, version, flags, payload)
+                connection.send_encoded(flags, payload, request_id)
+            else:
+                connection.send(response, request_id)
+        except OSError:
+            # The client went away; handle_client cleans up the connection
+            pass
+        finally:
+            if search:
+                searches.pop(request_id, None)
+            if slot:
+                slot.release()
+                
+    def receive_image(self, connection, uploads, request):
+        """Take one chunk of a streamed image; the last one queues it for recognition.
+        
+        data is {'upload_id', 'chunk', 'last'}. Each chunk is acknowledged
+        straight away; the result follows later as an 'ocr_result' event
+        pushed on the connection, so a client can keep working meanwhile.
+        """
+        if not self.sessions.get(request.get('session')):
+            return self.not_authenticated()
+        data = request.get('data') or {}
+        upload_id = str(data.get('upload_id') or '')
+        if uploads.is_new(upload_id):
+            # Turn an image away before it is uploaded, not after
+            error = self.recognition.unavailable()
+            if error:
+                return {'success': False, 'error': error}
+        try:
+            uploads.add(upload_id, data.get('chunk', b''), bool(data.get('last')))
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        if not data.get('last'):
+            return {'success': True}
+            
+        def deliver(result):
+            try:
+                connection.send({'event': 'ocr_result', 'upload_id': upload_id, 'result': result})
+            except OSError:
+                pass
+                
+        job = self.recognition.submit(uploads.pop(upload_id), deliver)
+        if job is None:
+            return {'success': False, 'error': 'Server busy, try again shortly'}
+        uploads.track(job)
+        return {'success': True, 'queued': True}
+        
+    def cache_key(self, request, connection):
+        """Response cache key for a cacheable read, or None"""
+        action = request.get('action')
+        if self.response_cache is None or not isinstance(action, str) or action not in CACHED_ACTIONS:
+            return None
+        session = self.sessions.get(request.get('session'))
+        if session is None:
+            return None
+        # The same results encode differently for each negotiated wire format
+        wire_format = tuple(sorted(connection.wire_format.describe().items()))
+        if action == 'get_user_bills':
+            return wire_format, action, session.user_id
+        try:
+            return wire_format, action, search_key(request.get('data') or {})
+        except (TypeError, ValueError):
+            # Let process_request report the bad criteria
+            return None
+            
+    def not_authenticated(self):
+        return {'success': False, 'error': 'Not logged in', 'auth_required': True}
         
+    def process_request(self, request, connection=None, cancelled=None):
+        """Answer one request; cancelled, if given, stops a search_bills early"""
+        action = request.get('action')
+        data = request.get('data', {})
+        if not isinstance(action, str):
+            return {'success': False, 'error': 'Invalid action'}
+            
+        # The user always comes from the session, never from the request body
+        session = None
+        if action in AUTHENTICATED_ACTIONS:
+            session = self.sessions.get(request.get('session'))
+            if session is None:
+                return self.not_authenticated()
+                
         try:
             if action == 'login':
                 user_id = self.db.verify_user(data['username'], data['password'])
                 if user_id:
-                    return {'success': True, 'user_id': user_id}
+                    session = self.sessions.create(user_id, data['username'])
+                    if connection:
+                        self.clients[connection.address] = session
+                    return {'success': True, 'user_id': user_id, 'session_token': session.token}
                 return {'success': False, 'error': 'Invalid credentials'}
                 
+            elif action == 'logout':
+                self.sessions.remove(request.get('session'))
+                if connection:
+                    self.clients.pop(connection.address, None)
+                return {'success': True}
+                
+            elif action == 'redeem_invitation':
+                invitation = self.invitations.redeem(data.get('token', ''))
+                if invitation is None:
+                    return {'success': False, 'error': 'Invalid or expired invitation'}
+                return {'success': True, 'host': invitation['host'], 'port': invitation['port']}
+                
             elif action == 'create_user':
                 success = self.db.create_user(data['username'], data['password'])
                 return {'success': success}
@@ -73,7 +357,7 @@ class DollarTrackerServer:
                 success = self.db.add_bill(
                     face_value=data['face_value'],
                     serial_number=data['serial_number'],
-                    user_id=data['user_id'],
+                    user_id=session.user_id,
                     printing_location=data.get('printing_location'),
                     series_year=data.get('series_year'),
                     is_star_note=data.get('is_star_note', False),
@@ -81,22 +365,54 @@ class DollarTrackerServer:
                     image_path=data.get('image_path'),
                     estimated_value=data.get('estimated_value')
                 )
-                return {'success': success}
-                
+                if not success:
+                    return {'success': False}
+                self.notifications.publish('insert', self.db.get_bill(data['serial_number']))
+                return {'success': True,
+                        'possible_duplicates': self.db.find_similar_serials(data['serial_number'])}
+                        
             elif action == 'search_bills':
-                results = self.db.search_bills(data)
+                try:
+                    results = self.db.search_bills(data, cancelled)
+                except sqlite3.OperationalError:
+                    if cancelled and cancelled():
+                        return {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
+                    raise
                 return {'success': True, 'results': results}
                 
             elif action == 'update_bill':
                 success = self.db.update_bill(
                     data['serial_number'],
-                    data['user_id'],
+                    session.user_id,
                     **data.get('updates', {})
                 )
+                if success:
+                    self.notifications.publish('update', self.db.get_bill(data['serial_number']))
                 return {'success': success}
                 
+            elif action == 'sync_bills':
+                results = self.db.sync_bills(data['changes'], session.user_id)
+                for result in results:
+                    if result['status'] != 'conflict':
+                        change_type = 'insert' if result['status'] == 'inserted' else 'update'
+                        self.notifications.publish(change_type, result['bill'])
+                return {'success': True, 'results': results}
+                
+            elif action == 'pull_bills':
+                results = self.db.get_bills_page(data.get('after_id', 0), data.get('limit', 500))
+                return {'success': True, 'results': results}
+                
+            elif action == 'stats':
+                stats = self.metrics.snapshot()
+                stats['sessions'] = len(self.sessions.sessions)
+                stats['worker'] = self.worker_index
+                stats['pid'] = os.getpid()
+                if self.response_cache:
+                    stats['response_cache'] = self.response_cache.stats()
+                return {'success': True, 'stats': stats}
+                
             elif action == 'get_user_bills':
-                results = self.db.get_user_bills(data['user_id'])
+                results = self.db.get_user_bills(session.user_id)
                 return {'success': True, 'results': results}
                 
             else:
@@ -105,11 +421,51 @@ class DollarTrackerServer:
         except Exception as e:
             return {'success': False, 'error': str(e)}
             
-def signal_handler(sig, frame):
-    print("\nShutting down server...")
-    sys.exit(0)
+def stop_on_signals(server):
+    """Drain and exit on Ctrl+C or SIGTERM instead of dying mid-request"""
+    def handle(signum, frame):
+        print(f"\nShutting down server ({signal.Signals(signum).name})...")
+        server.stop()
+        
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dollar Tracker server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--db', default='dollar_tracker.db')
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes; more than 1 runs under a supervisor (0 = one per CPU)")
+    parser.add_argument('--ocr-workers', type=int, default=2,
+                        help="threads per process recognizing images sent with process_image")
+    # Set by supervisor.py when it starts a worker
+    parser.add_argument('--listen-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--relay-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-index', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # Workers started by the supervisor inherit these through the environment
+    metrics_port = int(os.environ.get('DOLLAR_TRACKER_METRICS_PORT', 0))
+    metrics_host = os.environ.get('DOLLAR_TRACKER_METRICS_HOST', '127.0.0.1')
+    
+    if args.listen_fd is not None:
+        # A worker started by Supervisor, sharing its listening socket
+        from supervisor import WorkerRelay
+        server = DollarTrackerServer(args.host, args.port, metrics_port=metrics_port, metrics_host=metrics_host,
+                                     db_name=args.db, listen_socket=socket.socket(fileno=args.listen_fd),
+                                     worker_index=args.worker_index, ocr_workers=args.ocr_workers)
+        stop_on_signals(server)
+        WorkerRelay(socket.socket(fileno=args.relay_fd), server).send({'type': 'ready'})
+        server.start()
+    elif args.workers != 1:
+        from supervisor import Supervisor
+        Supervisor(args.host, args.port, args.workers or os.cpu_count(), args.db, metrics_port,
+                   args.ocr_workers).run()
+    else:
+        server = DollarTrackerServer(args.host, args.port, metrics_port=metrics_port, metrics_host=metrics_host,
+                                     db_name=args.db, ocr_workers=args.ocr_workers)
+        stop_on_signals(server)
+        server.start()
 
 if __name__ == '__main__':
-    signal.signal(signal.SIGINT, signal_handler)
-    server = DollarTrackerServer()
-    server.start() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,104 @@
+import hashlib
+import secrets
+import threading
+import time
+
+# How often a cached session is checked against the database, so a logout
+# or expiry seen by another server worker takes effect here too
+RECHECK_INTERVAL = 5.0
+# Sliding expiry is written back to the database at most this often per session
+TOUCH_INTERVAL = 60.0
+
+class Session:
+    def __init__(self, token, user_id, username, ttl, expires_at=None):
+        self.token = token
+        self.user_id = user_id
+        self.username = username
+        self.ttl = ttl
+        self.created_at = time.time()
+        self.expires_at = expires_at or self.created_at + ttl
+        self.checked_at = self.created_at
+
+class SessionStore:
+    """Table of logged-in sessions keyed by token.
+    
+    Passwords are checked once at login; every later request is
+    authenticated with a dictionary lookup. Expiry slides forward on each
+    use, so active clients stay logged in and idle tokens lapse after ttl
+    seconds.
+    
+    With a Database, sessions are also stored there (as token hashes, never
+    the tokens themselves), so they survive a server restart and work on
+    whichever worker process a client reconnects to. The in-memory copy is
+    rechecked against the table every RECHECK_INTERVAL seconds.
+    """
+    def __init__(self, ttl=12 * 3600, db=None):
+        self.ttl = ttl
+        self.db = db
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.next_purge = time.time() + ttl
+        
+    def create(self, user_id, username):
+        session = Session(secrets.token_urlsafe(32), user_id, username, self.ttl)
+        if self.db:
+            self.db.save_session(_hash(session.token), user_id, username, session.expires_at)
+        with self.lock:
+            self.sessions[session.token] = session
+            self._purge_expired()
+        return session
+        
+    def get(self, token):
+        """Return the live session for a token, or None"""
+        if not token:
+            return None
+        session = self.sessions.get(token)
+        now = time.time()
+        if self.db and (session is None or now - session.checked_at > RECHECK_INTERVAL):
+            session = self._recheck(token, session, now)
+        if session is None:
+            return None
+            
+        if session.expires_at < now:
+            self.remove(token)
+            return None
+        session.expires_at = now + session.ttl
+        return session
+        
+    def remove(self, token):
+        if self.db:
+            self.db.delete_session(_hash(token))
+        with self.lock:
+            return self.sessions.pop(token, None)
+            
+    def _recheck(self, token, session, now):
+        """Refresh a session from the database; returns None if it is gone there"""
+        row = self.db.load_session(_hash(token))
+        if row is None or max(row[2], session.expires_at if session else 0) < now:
+            with self.lock:
+                self.sessions.pop(token, None)
+            return None
+            
+        user_id, username, stored_expires_at = row
+        if session is None:
+            session = Session(token, user_id, username, self.ttl, stored_expires_at)
+            with self.lock:
+                self.sessions[token] = session
+        session.expires_at = max(session.expires_at, stored_expires_at)
+        if session.expires_at - stored_expires_at > TOUCH_INTERVAL:
+            self.db.touch_session(_hash(token), session.expires_at)
+        session.checked_at = now
+        return session
+        
+    def _purge_expired(self):
+        # Called with self.lock held; amortized so logins stay cheap
+        now = time.time()
+        if now < self.next_purge:
+            return
+        self.sessions = {token: s for token, s in self.sessions.items() if s.expires_at >= now}
+        self.next_purge = now + self.ttl
+        if self.db:
+            self.db.purge_sessions(now)
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
\ No newline at end of file
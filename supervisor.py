@@ -0,0 +1,247 @@
+import json
+import os
+import selectors
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+# Seconds a stopping worker gets to finish its requests before it is killed
+GRACE_SECONDS = 30.0
+# Seconds a new worker gets to open the database and report ready
+READY_TIMEOUT = 60.0
+# A worker that dies sooner than this after starting is restarted after a pause
+MIN_UPTIME = 5.0
+
+class Worker:
+    """A server.py worker process and the supervisor's end of its relay channel"""
+    def __init__(self, index, process, channel):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.buffer = b''
+        self.ready = False
+        self.stopping = False
+        self.closed = False
+        self.started_at = time.monotonic()
+        
+    def send(self, message):
+        try:
+            self.channel.sendall(json.dumps(message).encode() + b'\n')
+        except OSError:
+            pass
+            
+    def close(self):
+        self.closed = True
+        self.channel.close()
+        
+    def read_messages(self):
+        """Messages received since the last call; [] plus closed=True at EOF"""
+        try:
+            data = self.channel.recv(65536)
+        except OSError:
+            data = b''
+        if not data:
+            return [], True
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        return [json.loads(line) for line in lines if line], False
+
+class Supervisor:
+    """Run several server processes on one port, all using one database.
+    
+    The supervisor binds the port and starts each worker as a fresh
+    interpreter that inherits the listening socket, so the kernel spreads
+    new connections across them and each one has its own GIL. Workers open
+    their own SQLite connection (in WAL mode, so readers in one process do
+    not block a writer in another) and keep sessions in the database, so a
+    client can reconnect to any of them. Bill change events published by a
+    worker are relayed through the supervisor to the others.
+    
+    Signals: SIGTERM/SIGINT stop every worker gracefully and exit; SIGHUP
+    replaces the workers one at a time with new processes (picking up new
+    code) while the port stays open. A worker that dies is restarted.
+    """
+    def __init__(self, host='0.0.0.0', port=5000, workers=2, db_name='dollar_tracker.db', metrics_port=None,
+                 ocr_workers=2):
+        self.host = host
+        self.port = port
+        self.count = max(1, workers)
+        self.db_name = db_name
+        self.metrics_port = metrics_port
+        self.ocr_workers = ocr_workers
+        self.workers = []
+        self.selector = selectors.DefaultSelector()
+        self.stopping = False
+        self.restart_requested = False
+        
+    def run(self):
+        if os.name != 'posix':
+            raise RuntimeError("Multi-process mode needs a POSIX system; run with --workers 1")
+        self.prepare_database()
+        self.listen_socket = socket.create_server((self.host, self.port), backlog=128)
+        self.listen_socket.set_inheritable(True)
+        print(f"Supervisor (pid {os.getpid()}) listening on {self.host}:{self.port} with {self.count} workers")
+        
+        # Signals only set flags; the wakeup socket interrupts select()
+        wakeup_read, wakeup_write = socket.socketpair()
+        wakeup_read.setblocking(False)
+        wakeup_write.setblocking(False)
+        signal.set_wakeup_fd(wakeup_write.fileno())
+        self.selector.register(wakeup_read, selectors.EVENT_READ, None)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_restart)
+        
+        try:
+            # The first worker runs any schema migrations before the rest start
+            for index in range(self.count):
+                self.start_worker(index, wait=index == 0)
+            while not self.stopping:
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                self.poll(1.0)
+                self.replace_dead_workers()
+        finally:
+            self.stop_workers()
+            self.listen_socket.close()
+            signal.set_wakeup_fd(-1)
+            
+    def prepare_database(self):
+        # WAL lets readers in every worker proceed while one of them writes;
+        # the setting is stored in the database file
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+        finally:
+            conn.close()
+            
+    def start_worker(self, index, wait=False):
+        parent_end, child_end = socket.socketpair()
+        command = [sys.executable, SERVER_SCRIPT, '--host', self.host, '--port', str(self.port),
+                   '--db', self.db_name, '--listen-fd', str(self.listen_socket.fileno()),
+                   '--relay-fd', str(child_end.fileno()), '--worker-index', str(index),
+                   '--ocr-workers', str(self.ocr_workers)]
+        env = dict(os.environ, DOLLAR_TRACKER_METRICS_PORT=str(self.metrics_port + index if self.metrics_port else 0))
+        process = subprocess.Popen(command, pass_fds=(self.listen_socket.fileno(), child_end.fileno()), env=env)
+        child_end.close()
+        
+        worker = Worker(index, process, parent_end)
+        self.workers.append(worker)
+        self.selector.register(parent_end, selectors.EVENT_READ, worker)
+        if wait:
+            deadline = time.monotonic() + READY_TIMEOUT
+            while not worker.ready and worker.process.poll() is None and time.monotonic() < deadline:
+                self.poll(0.5)
+                if self.stopping:
+                    break
+        return worker
+        
+    def poll(self, timeout):
+        for key, _ in self.selector.select(timeout):
+            worker = key.data
+            if worker is None:
+                try:
+                    key.fileobj.recv(4096)
+                except OSError:
+                    pass
+                continue
+            messages, closed = worker.read_messages()
+            for message in messages:
+                self.handle_message(worker, message)
+            if closed:
+                self.selector.unregister(worker.channel)
+                worker.close()
+                
+    def handle_message(self, worker, message):
+        if message.get('type') == 'ready':
+            worker.ready = True
+        elif message.get('type') == 'event':
+            for other in self.workers:
+                if other is not worker and not other.stopping and not other.closed:
+                    other.send(message)
+                    
+    def replace_dead_workers(self):
+        for worker in list(self.workers):
+            if worker.process.poll() is None:
+                continue
+            self.workers.remove(worker)
+            if not worker.closed:
+                self.selector.unregister(worker.channel)
+                worker.close()
+            if worker.stopping or self.stopping:
+                continue
+            print(f"Worker {worker.index} (pid {worker.process.pid}) exited with {worker.process.returncode}; restarting")
+            if time.monotonic() - worker.started_at < MIN_UPTIME:
+                # Don't spin if it crashes on startup
+                time.sleep(1.0)
+            self.start_worker(worker.index)
+            
+    def rolling_restart(self):
+        """Replace each worker with a new process, one at a time"""
+        print("Restarting workers")
+        for old in [worker for worker in self.workers if not worker.stopping]:
+            new = self.start_worker(old.index, wait=True)
+            if not new.ready:
+                print(f"Replacement for worker {old.index} did not start; keeping the old one")
+                continue
+            old.stopping = True
+            old.process.terminate()
+            
+    def stop_workers(self):
+        for worker in self.workers:
+            if worker.process.poll() is None:
+                worker.stopping = True
+                worker.process.terminate()
+        deadline = time.monotonic() + GRACE_SECONDS
+        for worker in self.workers:
+            try:
+                worker.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                print(f"Worker {worker.index} did not stop in time; killing it")
+                worker.process.kill()
+                worker.process.wait()
+        print("All workers stopped")
+        
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+        
+    def _request_restart(self, signum, frame):
+        self.restart_requested = True
+
+class WorkerRelay:
+    """Worker end of the supervisor channel.
+    
+    Relays bill changes this worker publishes to the other workers and
+    delivers theirs to this worker's subscribers. If the supervisor goes
+    away the worker stops rather than running on unsupervised.
+    """
+    def __init__(self, channel, server):
+        self.channel = channel
+        self.server = server
+        self.send_lock = threading.Lock()
+        server.notifications.relay = self.relay
+        threading.Thread(target=self._read, daemon=True).start()
+        
+    def send(self, message):
+        with self.send_lock:
+            self.channel.sendall(json.dumps(message).encode() + b'\n')
+            
+    def relay(self, change):
+        try:
+            self.send({'type': 'event', 'change': change})
+        except OSError as e:
+            print(f"Could not relay change to other workers: {e}")
+            
+    def _read(self):
+        with self.channel.makefile('rb') as stream:
+            for line in stream:
+                message = json.loads(line)
+                if message.get('type') == 'event':
+                    self.server.notifications.deliver(message['change'])
+        self.server.stop()
\ No newline at end of file
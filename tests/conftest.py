@@ -0,0 +1,46 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Let the tests import the application modules when run from anywhere
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from database import Database  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+from server import DollarTrackerServer  # noqa: E402
+
+@pytest.fixture
+def hasher():
+    # Real hashes take a large fraction of a second each
+    return PasswordHasher(iterations=1000)
+
+@pytest.fixture
+def db(tmp_path, hasher):
+    database = Database(str(tmp_path / 'dollar_tracker.db'), password_hasher=hasher)
+    yield database
+    database.close()
+
+@pytest.fixture
+def user_id(db):
+    db.create_user('alice', 'correct horse')
+    return db.verify_user('alice', 'correct horse')
+
+@pytest.fixture
+def running_server(tmp_path, monkeypatch):
+    """A server on a free local port, accepting connections on its own thread"""
+    monkeypatch.setenv('DOLLAR_TRACKER_HASH_ITERATIONS', '1000')
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    server = DollarTrackerServer(host='127.0.0.1', port=listener.getsockname()[1], listen_socket=listener,
+                                 db_name=str(tmp_path / 'server.db'), invitations_db=str(tmp_path / 'inv.db'))
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join(10)
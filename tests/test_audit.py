@@ -0,0 +1,132 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from audit import backup, bill_history, revert_to, restore
+from bill_record import Bill
+from database import Database
+
+
+def moment():
+    """A point in time strictly between the changes made before and after it"""
+    time.sleep(0.01)
+    now = datetime.now(timezone.utc)
+    time.sleep(0.01)
+    return now
+
+
+def serials(db):
+    return sorted((bill.serial_number, bill.estimated_value) for bill in map(Bill.from_row, db.search_bills({})))
+
+
+@pytest.fixture
+def bob(db):
+    db.create_user('bob', 'battery staple')
+    return db.verify_user('bob', 'battery staple')
+
+
+def test_history_names_the_acting_user(tmp_path, db, user_id, bob):
+    db.add_bill(1.0, 'A11111111A', user_id)
+    db.update_bill('A11111111A', user_id, estimated_value=2.0)
+    before = moment()
+    db.update_bill('A11111111A', user_id, estimated_value=3.0)
+    revert_to(db, before, bob)
+    revert_to(db, before)
+
+    # Another program writing the file is logged without a user
+    other = sqlite3.connect(db.db_name)
+    other.execute("UPDATE bills SET estimated_value = 9 WHERE serial_number = 'A11111111A'")
+    other.commit()
+    other.close()
+
+    entries = bill_history(db, 'A11111111A')
+    assert [(entry['op'], entry['user_id']) for entry in entries] == [
+        ('insert', user_id), ('update', user_id), ('update', user_id), ('update', bob), ('update', None)]
+    assert entries[3]['new_values']['estimated_value'] == 2.0
+
+
+def test_revert_undoes_adds_edits_and_itself(db, user_id):
+    db.add_bill(1.0, 'A11111111A', user_id, estimated_value=1.0)
+    start = moment()
+    db.update_bill('A11111111A', user_id, estimated_value=5.0)
+    db.add_bill(1.0, 'B22222222B', user_id)
+    edited = moment()
+    assert revert_to(db, start) == 2
+    assert serials(db) == [('A11111111A', 1.0)]
+    # The revert is logged like any other change, so it can be undone too
+    assert revert_to(db, edited) == 2
+    assert serials(db) == [('A11111111A', 5.0), ('B22222222B', None)]
+
+
+def test_backup_does_not_block_writers(tmp_path, db, user_id):
+    for number in range(200):
+        db.add_bill(1.0, f"A{number:08d}A", user_id, image_path='x' * 500)
+    db.conn.execute('PRAGMA busy_timeout = 100')
+    written = []
+
+    def write_between_steps(remaining, total):
+        if not written:
+            # Would fail with "database is locked" if the copy held a read transaction
+            written.append(db.add_bill(2.0, 'Z99999999Z', user_id))
+
+    result = backup(db, str(tmp_path / 'copy.db'), pages=2, progress=write_between_steps)
+    assert written == [True]
+    copy = sqlite3.connect(str(tmp_path / 'copy.db'))
+    last_id = copy.execute('SELECT MAX(id) FROM bill_history').fetchone()[0]
+    copied = copy.execute("SELECT COUNT(*) FROM bills WHERE serial_number = 'Z99999999Z'").fetchone()[0]
+    copy.close()
+    assert result['last_entry'] == last_id
+    # The write came before the copy finished, so the copy and its log position include it
+    assert copied == 1
+
+
+def test_restore_rolls_a_backup_forward_to_a_time(tmp_path, db, user_id, hasher):
+    db.add_bill(1.0, 'A11111111A', user_id, estimated_value=1.0)
+    backup(db, str(tmp_path / 'nightly.db'))
+    db.update_bill('A11111111A', user_id, estimated_value=2.0)
+    db.add_bill(1.0, 'B22222222B', user_id)
+    until = moment()
+    db.update_bill('A11111111A', user_id, estimated_value=3.0)
+    db.add_bill(1.0, 'C33333333C', user_id)
+
+    result = restore(str(tmp_path / 'nightly.db'), str(tmp_path / 'restored.db'), log_path=db.db_name, until=until)
+    assert result['replayed'] == 2
+    restored = Database(str(tmp_path / 'restored.db'), password_hasher=hasher)
+    try:
+        assert serials(restored) == [('A11111111A', 2.0), ('B22222222B', None)]
+        # Its log ends at until too, and logs new changes again
+        assert [entry['op'] for entry in bill_history(restored, 'A11111111A')] == ['insert', 'update']
+        restored.update_bill('A11111111A', user_id, estimated_value=4.0)
+        assert len(bill_history(restored, 'A11111111A')) == 3
+    finally:
+        restored.close()
+    with pytest.raises(FileExistsError):
+        restore(str(tmp_path / 'nightly.db'), str(tmp_path / 'restored.db'))
+
+
+def test_restore_replays_batch_inserts_as_they_were_added(tmp_path, db, user_id, hasher):
+    backup(db, str(tmp_path / 'nightly.db'))
+    start = moment()
+    db.add_bills_batch([{'face_value': 1.0, 'serial_number': 'A11111111A', 'estimated_value': 1.0},
+                        {'face_value': 1.0, 'serial_number': 'B22222222B'}], user_id)
+    until = moment()
+    db.update_bill('A11111111A', user_id, estimated_value=3.0)
+
+    # Insert entries are markers; their values come from the row or the next change
+    db.cursor.execute("SELECT COUNT(*) FROM bill_history WHERE op = 'insert' AND new_values IS NULL")
+    assert db.cursor.fetchone()[0] == 2
+    entries = bill_history(db, 'A11111111A')
+    assert [(entry['op'], entry['user_id']) for entry in entries] == [('insert', user_id), ('update', user_id)]
+    assert entries[0]['new_values']['estimated_value'] == 1.0
+    assert bill_history(db, 'B22222222B')[0]['new_values']['serial_number'] == 'B22222222B'
+
+    restore(str(tmp_path / 'nightly.db'), str(tmp_path / 'restored.db'), log_path=db.db_name, until=until)
+    restored = Database(str(tmp_path / 'restored.db'), password_hasher=hasher)
+    try:
+        assert serials(restored) == [('A11111111A', 1.0), ('B22222222B', None)]
+    finally:
+        restored.close()
+    assert revert_to(db, start) == 2
+    assert serials(db) == []
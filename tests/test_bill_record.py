@@ -0,0 +1,78 @@
+import json
+import math
+import socket
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from bill_record import BILL_COLUMNS, Bill, BillResultSet
+from client import DollarTrackerClient
+from protocol import CODECS, COLUMNAR, WireFormat, decode, send_payload
+
+ROWS = [
+    (1, 1.0, 'A12345678B', '2024-06-01 12:00:00', 'A', 2017, True, False, None, 3.5, 1, 'alice', 'A'),
+    (2, 20.0, 'B12345678C', '2024-06-02 12:00:00', None, None, False, True, '/tmp/b.png', None, 2, 'bob', None),
+    (3, 5.0, 'C12345678D', '2024-06-03 12:00:00', 'L', 2013, False, False, None, 0.0, None, None, None),
+]
+
+
+def test_rows_round_trip():
+    results = BillResultSet.from_rows(ROWS)
+    assert len(results) == 3
+    assert results.rows() == ROWS
+    assert results[-1] == Bill(*ROWS[2])
+    assert [bill.serial_number for bill in results[1:]] == ['B12345678C', 'C12345678D']
+    assert results.column('series_suffix') == ['A', None, None]
+    assert results[0].series == '2017A'
+    assert BillResultSet.from_rows([]).rows() == []
+
+
+@pytest.mark.parametrize('encoding', sorted(CODECS))
+def test_columnar_wire_round_trip(encoding):
+    flags, payload = WireFormat(encoding, 'zlib', columnar=True, compress_threshold=0).encode(
+        {'success': True, 'results': [list(row) for row in ROWS]})
+    assert flags & COLUMNAR
+    message = decode(flags, payload, BillResultSet.from_columns)
+    assert message['results'].rows() == ROWS
+
+
+def test_rows_from_older_servers_have_no_series_letter():
+    results = BillResultSet.from_rows([row[:-1] for row in ROWS])
+    assert results.column('series_suffix') == [None, None, None]
+    assert results.rows() == [row[:-1] + (None,) for row in ROWS]
+
+
+def test_values_that_are_not_numbers_read_as_missing():
+    row = list(ROWS[0])
+    row[BILL_COLUMNS.index('estimated_value')] = 'about $5'
+    row[BILL_COLUMNS.index('series_year')] = 'unknown'
+    row[BILL_COLUMNS.index('added_by')] = '7'
+    bill = BillResultSet.from_rows([row])[0]
+    assert (bill.estimated_value, bill.series_year, bill.added_by) == (None, None, 7)
+    assert math.isnan(BillResultSet.from_rows([row]).estimated_values[0])
+
+
+def test_database_rows_round_trip(db, user_id):
+    db.add_bill(1.0, 'A12345678B', user_id, printing_location='A', series_year='2017A', estimated_value=2.5)
+    db.add_bill(2.0, 'B12345678C', user_id)
+    rows = db.search_bills({})
+    assert BillResultSet.from_rows(rows).rows() == [tuple(row) for row in rows]
+
+
+def test_reader_failure_fails_pending_requests():
+    client = DollarTrackerClient()
+    ours, theirs = socket.socketpair()
+    future = Future()
+    pending = {1: future}
+    client.socket = ours
+    reader = threading.Thread(target=client._read_responses, args=(ours, pending), daemon=True)
+    reader.start()
+    # A columnar frame whose columns are not lists
+    send_payload(theirs, CODECS['json'] | COLUMNAR,
+                 json.dumps({'success': True, 'results': {'columns': 5}}).encode(), request_id=1)
+    response = future.result(timeout=5)
+    assert response['success'] is False and response['error']
+    reader.join(timeout=5)
+    assert client.socket is None
+    theirs.close()
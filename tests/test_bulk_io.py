@@ -0,0 +1,71 @@
+import csv
+from datetime import datetime, timezone
+
+from bill_record import Bill
+from bulk_io import export_csv, import_bills, validate_row
+from database import Database
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_validate_row_keeps_series_letter():
+    bill, error = validate_row({'serial_number': 'a12345678b', 'face_value': '1', 'series_year': '2017a'})
+    assert error is None
+    assert bill['serial_number'] == 'A12345678B'
+    assert bill['series_year'] == '2017A'
+
+
+def test_validate_row_reports_wrong_types():
+    # Excel cells come back typed; a date where a number belongs is a row error, not a crash
+    when = datetime(2024, 6, 1)
+    for field in ('face_value', 'estimated_value', 'series_year'):
+        row = {'serial_number': 'A12345678B', 'face_value': '1', field: when}
+        bill, error = validate_row(row)
+        assert bill is None and error.startswith(f"invalid {field}")
+
+
+def test_validate_row_dates():
+    row = {'serial_number': 'A12345678B', 'face_value': '1'}
+    assert validate_row(dict(row, date_recorded=datetime(2024, 6, 1, 12)))[0]['date_recorded'] == '2024-06-01 12:00:00'
+    assert validate_row(dict(row, date_recorded='2024-06-01T14:30:00+02:00'))[0]['date_recorded'] == '2024-06-01 12:30:00'
+    assert validate_row(dict(row, date_recorded=''))[0]['date_recorded'] is None
+    assert validate_row(dict(row, date_recorded='last week'))[1] == "invalid date_recorded 'last week'"
+
+
+def test_import_keeps_dates_and_series(tmp_path, db, user_id):
+    path = str(tmp_path / 'bills.csv')
+    write_csv(path, [
+        {'serial_number': 'A12345678B', 'face_value': '1', 'series_year': '2017A', 'date_recorded': '2019-03-04 05:06:07'},
+        {'serial_number': 'B12345678C', 'face_value': '5', 'series_year': '', 'date_recorded': ''},
+        {'serial_number': 'C12345678D', 'face_value': '5', 'series_year': 'soon', 'date_recorded': ''},
+    ])
+    report = import_bills(db, path, user_id)
+    assert report['inserted'] == 2
+    assert report['errors'] == [{'row': 4, 'error': "invalid series_year 'soon'"}]
+
+    first = Bill.from_row(db.get_bill('A12345678B'))
+    assert (first.series, first.date_recorded) == ('2017A', '2019-03-04 05:06:07')
+    assert Bill.from_row(db.get_bill('B12345678C')).date_recorded.startswith(str(datetime.now(timezone.utc).year))
+
+
+def test_export_import_round_trip(tmp_path, db, user_id, hasher):
+    db.add_bill(1.0, 'A12345678B', user_id, printing_location='A', series_year='2017A', is_star_note=True,
+                estimated_value=3.5)
+    db.add_bill(20.0, 'B12345678C', user_id, series_year=2013)
+    path = str(tmp_path / 'bills.csv')
+    assert export_csv(db, path) == 2
+
+    copy = Database(str(tmp_path / 'copy.db'), password_hasher=hasher)
+    try:
+        assert import_bills(copy, path, user_id)['inserted'] == 2
+        for serial in ('A12345678B', 'B12345678C'):
+            original, imported = Bill.from_row(db.get_bill(serial)), Bill.from_row(copy.get_bill(serial))
+            assert imported.as_tuple()[1:10] == original.as_tuple()[1:10]
+            assert imported.series == original.series
+    finally:
+        copy.close()
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+from camera_capture import CameraCapture, StableFrameDetector  # noqa: E402
+
+FPS = 120
+SIZE = (320, 240)
+
+def background():
+    frame = np.full((SIZE[1], SIZE[0], 3), 90, dtype=np.uint8)
+    cv2.putText(frame, 'desk', (20, 220), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (60, 60, 60), 1)
+    return frame
+
+def with_note(frame, x=60, y=60):
+    frame = frame.copy()
+    cv2.rectangle(frame, (x, y), (x + 200, y + 90), (200, 222, 214), -1)
+    cv2.putText(frame, 'L12345678A', (x + 10, y + 55), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (40, 70, 30), 2)
+    return frame
+
+def scenes():
+    """(frame, has_note, label) for a clip: empty desk, a note slid in and held, taken away"""
+    empty = background()
+    clip = [(empty, False, 'empty')] * 20
+    # The note moves across the frame while it is being put down
+    clip += [(with_note(empty, x=-200 + 16 * step), True, 'moving') for step in range(16)]
+    clip += [(with_note(empty), True, 'held')] * 30
+    clip += [(with_note(empty, x=60 + 20 * step), True, 'moving') for step in range(12)]
+    clip += [(empty, False, 'empty')] * 30
+    return clip
+
+@pytest.fixture
+def clip_path(tmp_path):
+    path = str(tmp_path / 'bill.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FPS, SIZE)
+    assert writer.isOpened()
+    for frame, _, _ in scenes():
+        writer.write(frame)
+    writer.release()
+    return path
+
+class StubProcessor:
+    def __init__(self):
+        self.frames = []
+
+    def process_bill_frame(self, frame):
+        self.frames.append(frame)
+        return {'serial_number': 'L12345678A', 'is_star_note': False, 'preset': 'fast', 'success': True}
+
+def note_visible(frame):
+    # The note is much lighter than the desk around it
+    return frame[80:140, 80:240].mean() > 150
+
+def test_detector_triggers_once_per_held_note():
+    detector = StableFrameDetector()
+    triggers = [label for frame, _, label in scenes() if detector.update(frame)]
+    assert triggers == ['held']
+
+def test_recorded_clip_recognizes_only_the_stable_note(clip_path):
+    processor = StubProcessor()
+    results = []
+    capture = CameraCapture(processor, lambda result, frame: results.append(result), clip_path, frame_skip=1)
+    assert capture.start()
+    capture.thread.join(timeout=30)
+    capture.stop()
+
+    assert capture.frames_read == len(scenes())
+    assert len(processor.frames) == 1
+    assert note_visible(processor.frames[0])
+    assert results[0]['serial_number'] == 'L12345678A'
+
+def test_frames_turning_stable_while_busy_are_dropped():
+    release = threading.Event()
+
+    class SlowProcessor(StubProcessor):
+        def process_bill_frame(self, frame):
+            release.wait(5)
+            return super().process_bill_frame(frame)
+
+    processor = SlowProcessor()
+    capture = CameraCapture(processor, lambda result, frame: None)
+    frame = with_note(background())
+    capture._submit(frame)
+    capture._submit(frame)
+    release.set()
+    capture.stop()
+    assert len(processor.frames) == 1
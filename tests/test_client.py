@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from client import DollarTrackerClient
+
+
+@pytest.fixture
+def client(running_server):
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    client.create_user('alice', 'pw')
+    assert client.login('alice', 'pw')['success']
+    yield client
+    client.disconnect()
+
+
+def add_bills(server, count):
+    server.db.add_bills_batch([{'face_value': 1.0, 'serial_number': f"A{number:08d}A"} for number in range(count)],
+                              server.db.verify_user('alice', 'pw'))
+
+
+def test_cancel_stops_a_search_on_the_server(running_server, client):
+    add_bills(running_server, 200)
+    # Holding the database keeps the search waiting until the cancel is in
+    with running_server.db.lock:
+        request_id, future = client._send('search_bills', {})
+        assert client.send_request('cancel', {'request_id': request_id}, 5) == {'success': True, 'cancelled': True}
+    assert future.result(10) == {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
+    # An answered search is forgotten, so cancelling it again does nothing
+    assert client.send_request('cancel', {'request_id': request_id}, 5)['cancelled'] is False
+    assert len(client.search_bills({})['results']) == 200
+
+
+def test_superseded_search_returns_without_waiting_for_the_server(running_server, client):
+    add_bills(running_server, 200)
+    superseded = threading.Event()
+    with running_server.db.lock:
+        threading.Timer(0.2, superseded.set).start()
+        response = client.search_bills({}, cancelled=superseded.is_set)
+    assert response == {'success': False, 'cancelled': True, 'error': 'Search cancelled'}
+    assert len(client.search_bills({}, cancelled=lambda: False)['results']) == 200
+
+
+def test_pipelined_responses_reach_their_own_requests(running_server, client):
+    add_bills(running_server, 50)
+    futures = [client.send_request_async('search_bills', {'serial_number': f"A{number:08d}A"})
+               for number in range(50)]
+    for number, future in enumerate(futures):
+        assert [bill.serial_number for bill in future.result(10)['results']] == [f"A{number:08d}A"]
+
+
+def test_a_slow_request_does_not_hold_up_later_ones(running_server, client):
+    add_bills(running_server, 10)
+    with running_server.db.lock:
+        search = client.send_request_async('search_bills', {})
+        # Answered by another worker while the search waits for the database
+        assert client.send_request('no_such_action', timeout=5) == {'success': False, 'error': 'Invalid action'}
+        assert not search.done()
+    assert len(search.result(10)['results']) == 10
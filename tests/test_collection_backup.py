@@ -0,0 +1,148 @@
+import shutil
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import collection_backup
+from collection_backup import CollectionBackup
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+
+def git(directory, *args):
+    return subprocess.run(['git', *args], cwd=directory, check=True, capture_output=True, text=True).stdout
+
+@pytest.fixture
+def remote(tmp_path):
+    path = tmp_path / 'remote.git'
+    subprocess.run(['git', 'init', '--bare', '--quiet', str(path)], check=True)
+    return path
+
+@pytest.fixture
+def backup(db, tmp_path, remote):
+    return CollectionBackup(db, tmp_path / 'work', str(remote))
+
+@pytest.fixture
+def bills(db, user_id):
+    db.add_bill(1.0, 'A11111111A', user_id, printing_location='A', series_year=2017)
+    db.add_bill(1.0, 'B22222222B', user_id, printing_location='B', series_year=2017)
+    db.add_bill(20.0, 'C33333333C', user_id, printing_location='C', series_year=2013)
+    db.add_bill(5.0, 'D44444444D', user_id, printing_location='D', series_year=2021)
+
+def remote_files(remote):
+    return sorted(git(remote, 'ls-tree', '-r', '--name-only', 'backup').split())
+
+def remote_head(remote):
+    return git(remote, 'rev-parse', 'backup').strip()
+
+def test_first_backup_pushes_every_shard(backup, remote, bills):
+    result = backup.backup()
+    assert result['success'], result
+    assert result['pushed']
+    assert result['changed'] == ['bills/1/2017.tsv', 'bills/20/2013.tsv', 'bills/5/2021.tsv', 'manifest.json']
+    assert remote_files(remote) == result['changed']
+    assert remote_head(remote) == result['commit']
+    shard = git(remote, 'show', 'backup:bills/1/2017.tsv').splitlines()
+    assert shard[0].startswith('serial_number\t')
+    assert [line.split('\t')[0] for line in shard[1:]] == ['A11111111A', 'B22222222B']
+
+def test_unchanged_collection_makes_no_commit(backup, remote, bills):
+    first = backup.backup()
+    second = backup.backup()
+    assert second == {'success': True, 'changed': [], 'removed': [], 'commit': None, 'pushed': False}
+    assert remote_head(remote) == first['commit']
+
+def test_one_changed_bill_rewrites_one_shard(db, user_id, backup, remote, bills):
+    backup.backup()
+    before = git(remote, 'show', 'backup:bills/20/2013.tsv')
+    db.update_bill('B22222222B', user_id, estimated_value=4.5)
+    result = backup.backup()
+    assert result['changed'] == ['bills/1/2017.tsv', 'manifest.json']
+    assert result['removed'] == []
+    assert git(remote, 'show', 'backup:bills/20/2013.tsv') == before
+    changed = git(remote, 'diff', '--name-only', 'backup~1', 'backup').split()
+    assert changed == ['bills/1/2017.tsv', 'manifest.json']
+
+def test_emptied_shard_is_removed(db, backup, remote, bills):
+    backup.backup()
+    db.cursor.execute("DELETE FROM bills WHERE serial_number = 'D44444444D'")
+    db._commit_bills()
+    result = backup.backup()
+    assert result['removed'] == ['bills/5/2021.tsv']
+    assert result['changed'] == ['manifest.json']
+    assert 'bills/5/2021.tsv' not in remote_files(remote)
+
+def test_failed_push_is_retried_by_the_next_backup(db, user_id, backup, remote, bills, tmp_path):
+    backup.backup()
+    db.add_bill(1.0, 'E55555555E', user_id, series_year=2017)
+    # The remote goes away for one backup
+    away = tmp_path / 'away.git'
+    remote.rename(away)
+    failed = backup.backup()
+    assert not failed['success']
+    away.rename(remote)
+
+    result = backup.backup()
+    assert result['success'], result
+    assert result['commit'] is None
+    assert result['pushed']
+    assert 'E55555555E' in git(remote, 'show', 'backup:bills/1/2017.tsv')
+    assert backup.backup()['pushed'] is False
+
+def test_failed_commit_is_retried_by_the_next_backup(db, user_id, backup, remote, bills):
+    backup.backup()
+    db.add_bill(1.0, 'E55555555E', user_id, series_year=2017)
+    hook = backup.repo_dir / '.git' / 'hooks' / 'pre-commit'
+    hook.write_text('#!/bin/sh\nexit 1\n')
+    hook.chmod(0o755)
+    assert not backup.backup()['success']
+    hook.unlink()
+
+    result = backup.backup()
+    assert result['success'], result
+    assert result['changed'] == ['bills/1/2017.tsv', 'manifest.json']
+    assert result['pushed']
+    assert 'E55555555E' in git(remote, 'show', 'backup:bills/1/2017.tsv')
+
+def test_export_does_not_hold_the_database_lock_between_pages(db, backup, bills, monkeypatch):
+    held = []
+    original = db.iter_bills_by_shard
+
+    def try_lock():
+        if db.lock.acquire(timeout=1):
+            db.lock.release()
+        else:
+            held.append(True)
+
+    def iter_bills_by_shard(page_size=5000):
+        for row in original(page_size=1):
+            # Another thread (a server request) must be able to take the lock here
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            held.append(False)
+            yield row
+
+    monkeypatch.setattr(db, 'iter_bills_by_shard', iter_bills_by_shard)
+    backup.repo_dir.mkdir()
+    backup.export()
+    assert held == [False] * 4
+
+def test_bills_are_read_in_shard_order(db, user_id, bills):
+    db.add_bill(1.0, 'A00000000A', user_id, series_year=2017)
+    db.add_bill(1.0, 'Z99999999Z', user_id)
+    rows = list(db.iter_bills_by_shard(page_size=1))
+    assert [(row[1], row[5], row[2]) for row in rows] == [
+        (1.0, None, 'Z99999999Z'), (1.0, 2017, 'A00000000A'), (1.0, 2017, 'A11111111A'),
+        (1.0, 2017, 'B22222222B'), (5.0, 2021, 'D44444444D'), (20.0, 2013, 'C33333333C')]
+    plan = db.conn.execute('EXPLAIN QUERY PLAN SELECT * FROM bills WHERE face_value = 1.0 AND series_year IS 2017 '
+                           'AND serial_number > ? ORDER BY serial_number', ('',)).fetchall()
+    assert 'idx_bills_shard' in str(plan) and 'TEMP B-TREE' not in str(plan)
+
+def test_command_line_backup(db, remote, bills, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['collection_backup.py', '--db', db.db_name, '--remote', str(remote),
+                                      str(tmp_path / 'work')])
+    collection_backup.main()
+    assert capsys.readouterr().out.startswith('3 shards changed, 0 removed, committed ')
+    assert remote_files(remote) == ['bills/1/2017.tsv', 'bills/20/2013.tsv', 'bills/5/2021.tsv', 'manifest.json']
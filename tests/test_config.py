@@ -0,0 +1,52 @@
+import builtins
+import json
+
+import pytest
+
+import config as config_module
+from config import Config
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    return Config()
+
+
+def test_unchanged_files_are_read_once(config, monkeypatch):
+    opened = []
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return builtins.open(path, *args, **kwargs)
+
+    monkeypatch.setattr(config_module, 'open', counting_open, raising=False)
+    for _ in range(3):
+        assert config.get_github_token() == ''
+    assert opened == []
+    # Another process rewriting the file is noticed
+    config.config_file.write_text(json.dumps({'github_token': 'from elsewhere'}))
+    assert config.get_github_token() == 'from elsewhere'
+    assert config.get_github_token() == 'from elsewhere'
+    assert opened == [config.config_file]
+
+
+def test_loaded_settings_are_copies(config):
+    config.load_config()['theme'] = 'changed but not saved'
+    assert config.load_config()['theme'] == 'default'
+
+
+def test_failed_write_keeps_the_old_file(config):
+    config.set_github_token('abc')
+    with pytest.raises(TypeError):
+        config.save_config({'github_token': object()})
+    assert json.loads(config.config_file.read_text())['github_token'] == 'abc'
+    assert config.get_github_token() == 'abc'
+    assert not list(config.config_dir.glob('*.tmp'))
+
+
+def test_settings_survive_a_new_instance(config):
+    config.set_server_mode(True, '0.0.0.0', 5001)
+    server = Config().get_server_info()
+    assert (server['is_server'], server['server_host'], server['server_port']) == (True, '0.0.0.0', 5001)
+    assert server['server_token'] == config.get_server_info()['server_token']
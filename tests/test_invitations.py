@@ -0,0 +1,67 @@
+import json
+import threading
+
+import pytest
+
+from client import DollarTrackerClient
+from invitations import InvitationStore, format_code, parse_code
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = InvitationStore(tmp_path / 'invitations.db')
+    yield store
+    store.close()
+
+
+def test_single_use_invitation_cannot_be_reused(store):
+    token = store.create('example.org', 5000)
+    invitation = store.redeem(token)
+    assert (invitation['host'], invitation['port'], invitation['use_count']) == ('example.org', 5000, 1)
+    assert store.redeem(token) is None
+    assert store.get(token) is None
+    assert store.redeem('never issued') is None
+
+
+def test_expired_invitation_cannot_be_redeemed(store):
+    token = store.create('example.org', 5000, ttl=60)
+    store.conn.execute('UPDATE invitations SET expires_at = 1 WHERE token = ?', (token,))
+    assert store.redeem(token) is None
+    assert store.purge_expired() == 1
+    assert store.list_all() == []
+
+
+def test_racing_redemptions_use_each_slot_once(store):
+    token = store.create('example.org', 5000, max_uses=5)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.redeem(token))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len([result for result in results if result]) == 5
+
+
+def test_old_json_list_is_imported_once(store, tmp_path):
+    path = tmp_path / 'invitations.json'
+    path.write_text(json.dumps([{'server_token': 'abc', 'host': 'example.org', 'port': 5001}]))
+    assert store.import_json(path) == 1
+    assert store.import_json(path) == 0
+    # Imported codes keep their old unlimited behaviour
+    assert store.redeem('abc')['port'] == 5001
+    assert store.redeem('abc')['use_count'] == 2
+
+
+def test_codes_carry_the_server_address():
+    assert parse_code(format_code('example.org', 5000, 'tok')) == ('example.org', 5000, 'tok')
+    assert parse_code('just-a-token') is None
+
+
+def test_redeem_through_a_real_server(running_server):
+    token = running_server.invitations.create('example.org', 5000)
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    try:
+        assert client.redeem_invitation(token) == {'success': True, 'host': 'example.org', 'port': 5000}
+        assert client.redeem_invitation(token) == {'success': False, 'error': 'Invalid or expired invitation'}
+    finally:
+        client.disconnect()
@@ -0,0 +1,140 @@
+import sqlite3
+
+import pytest
+
+from bill_record import Bill
+from database import Database
+from migrations import create_base_tables
+from serials import parse_series
+
+
+def old_database(path, series_years, serials=None):
+    """A database in the original, unversioned layout with one bill per series value"""
+    serials = serials or [f"B{number:08d}A" for number in range(len(series_years))]
+    conn = sqlite3.connect(path)
+    create_base_tables(conn, 0)
+    conn.executemany('''
+        INSERT INTO bills (face_value, serial_number, printing_location, series_year, is_star_note)
+        VALUES (1.0, ?, 'b', ?, 'false')
+    ''', list(zip(serials, series_years)))
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, (None, None)),
+    ('', (None, None)),
+    (2017, (2017, None)),
+    (2017.0, (2017, None)),
+    ('2017', (2017, None)),
+    (' 2017a ', (2017, 'A')),
+    ('2017 A', (2017, 'A')),
+])
+def test_parse_series(value, expected):
+    assert parse_series(value) == expected
+
+
+@pytest.mark.parametrize('value', ['abc', '17', '2017AB', 'A2017', 2017.5, 17, True])
+def test_parse_series_rejects(value):
+    with pytest.raises(ValueError):
+        parse_series(value)
+
+
+def test_upgrade_keeps_series_letters(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, ['2017A', 2013, '', None])
+    db = Database(path, password_hasher=hasher)
+    try:
+        bills = [Bill.from_row(db.get_bill(f"B{number:08d}A")) for number in range(4)]
+        assert [(bill.series_year, bill.series_suffix) for bill in bills] == [
+            (2017, 'A'), (2013, None), (None, None), (None, None)]
+        assert bills[0].series == '2017A'
+        assert bills[0].printing_location == 'B'
+    finally:
+        db.close()
+
+
+def test_upgrade_refuses_unparseable_series(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, ['2017A', 'about 1950'])
+    with pytest.raises(ValueError, match='about 1950'):
+        Database(path, password_hasher=hasher)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT series_year FROM bills ORDER BY id').fetchall() == [('2017A',), ('about 1950',)]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'bills_v2'").fetchone() is None
+    conn.close()
+
+
+def test_series_letter_through_writes_and_search(db, user_id):
+    assert db.add_bill(1.0, 'A11111111A', user_id, series_year='2017A')
+    assert db.add_bill(1.0, 'A22222222A', user_id, series_year=2017)
+
+    def serials(series):
+        return sorted(Bill.from_row(row).serial_number for row in db.search_bills({'series_year': series}))
+
+    assert serials('2017a') == ['A11111111A']
+    assert serials('2017') == ['A11111111A', 'A22222222A']
+
+    assert db.update_bill('A11111111A', user_id, series_year='2013')
+    assert Bill.from_row(db.get_bill('A11111111A')).series == '2013'
+    with pytest.raises(ValueError):
+        db.add_bill(1.0, 'A33333333A', user_id, series_year='soon')
+
+
+def test_upgrade_logs_series_letters(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, ['2017A'])
+    db = Database(path, password_hasher=hasher)
+    try:
+        db.create_user('alice', 'correct horse')
+        user_id = db.verify_user('alice', 'correct horse')
+        db.conn.execute('UPDATE bills SET added_by = ?', (user_id,))
+        assert db.update_bill('B00000000A', user_id, series_year='2013B')
+        db.cursor.execute('SELECT old_values, new_values FROM bill_history ORDER BY id DESC LIMIT 1')
+        old_values, new_values = db.cursor.fetchone()
+        assert '"series_suffix":"A"' in old_values
+        assert '"series_suffix":"B"' in new_values
+    finally:
+        db.close()
+
+
+def test_lower_case_serials_are_found(db, user_id):
+    assert db.add_bill(1.0, 'mb12345678a', user_id)
+    for prefix in ('mb1', 'MB1'):
+        assert [row[2] for row in db.search_bills({'serial_number': prefix})] == ['MB12345678A']
+    assert db.get_bill('mb12345678a')[2] == 'MB12345678A'
+    assert db.update_bill(' mb12345678a ', user_id, estimated_value=2.0)
+    assert not db.add_bill(1.0, 'MB12345678A', user_id)
+
+
+def test_upgrade_upper_cases_serials(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, [None, None], serials=[' mb12345678a', 'B12345678C'])
+    db = Database(path, password_hasher=hasher)
+    try:
+        assert [row[2] for row in db.search_bills({'sort': 'serial_number'})] == ['B12345678C', 'MB12345678A']
+    finally:
+        db.close()
+
+
+def test_upgrade_refuses_serials_differing_only_in_case(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, [None, None], serials=['mb12345678a', 'Mb12345678A'])
+    with pytest.raises(ValueError, match='mb12345678a / Mb12345678A|Mb12345678A / mb12345678a'):
+        Database(path, password_hasher=hasher)
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT serial_number FROM bills ORDER BY id').fetchall() == [
+        ('mb12345678a',), ('Mb12345678A',)]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'bills_v2'").fetchone() is None
+    conn.close()
+
+
+def test_upgrade_keys_letter_positions_as_letters(tmp_path, hasher):
+    path = str(tmp_path / 'old.db')
+    old_database(path, [None, None], serials=['MI12345678A', 'ML12345678A'])
+    db = Database(path, password_hasher=hasher)
+    try:
+        assert db.find_similar_serials('MI12345678A') == []
+    finally:
+        db.close()
@@ -0,0 +1,63 @@
+import queue
+
+from client import DollarTrackerClient
+from notifications import EventQueue
+
+
+def change(change_type, serial_number, value=None):
+    return {'type': change_type, 'serial_number': serial_number, 'bill': [value]}
+
+
+def test_changes_to_one_bill_are_coalesced():
+    events = EventQueue()
+    events.put(change('insert', 'A11111111A', 1))
+    events.put(change('update', 'B22222222B', 2))
+    events.put(change('update', 'A11111111A', 3))
+    # Still an insert to a client that has not seen the bill, with its latest values
+    assert events.get_batch() == [change('insert', 'A11111111A', 3), change('update', 'B22222222B', 2)]
+
+
+def test_batches_are_limited_in_size():
+    events = EventQueue()
+    for number in range(5):
+        events.put(change('update', f"A{number:08d}A"))
+    assert [len(events.get_batch(2)) for _ in range(3)] == [2, 2, 1]
+
+
+def test_overflow_becomes_a_single_resync():
+    events = EventQueue(max_pending=3)
+    for number in range(10):
+        events.put(change('insert', f"A{number:08d}A"))
+    assert events.get_batch() == [{'type': 'resync'}]
+    # Afterwards changes queue up as usual again
+    events.put(change('update', 'B22222222B'))
+    assert events.get_batch() == [change('update', 'B22222222B')]
+
+
+def test_closed_queue_ends_the_sender():
+    events = EventQueue()
+    events.put(change('update', 'A11111111A'))
+    events.close()
+    events.put(change('update', 'B22222222B'))
+    assert events.get_batch() is None
+
+
+def test_subscriber_is_pushed_other_users_changes(running_server):
+    received = queue.Queue()
+    watcher = DollarTrackerClient('127.0.0.1', running_server.port)
+    writer = DollarTrackerClient('127.0.0.1', running_server.port)
+    try:
+        for client, username in ((watcher, 'alice'), (writer, 'bob')):
+            client.create_user(username, 'pw')
+            assert client.login(username, 'pw')['success']
+        assert watcher.subscribe(received.put)['success']
+
+        assert writer.add_bill(face_value=1.0, serial_number='MB12345678A')['success']
+        changes = received.get(timeout=10)
+        assert [(c['type'], c['serial_number'], c['bill'].username) for c in changes] == [
+            ('insert', 'MB12345678A', 'bob')]
+        assert writer.update_bill('MB12345678A', estimated_value=2.0)['success']
+        assert received.get(timeout=10)[0]['bill'].estimated_value == 2.0
+    finally:
+        writer.disconnect()
+        watcher.disconnect()
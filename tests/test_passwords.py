@@ -0,0 +1,57 @@
+import hashlib
+
+import pytest
+
+from client import DollarTrackerClient
+from passwords import PasswordHasher
+
+
+@pytest.mark.parametrize('hasher', [PasswordHasher(iterations=1000), PasswordHasher('scrypt', scrypt_n=2 ** 10)])
+def test_hash_verifies_only_its_password(hasher):
+    stored = hasher.hash('correct horse')
+    assert stored.startswith(hasher.scheme + '$')
+    assert hasher.verify('correct horse', stored)
+    assert not hasher.verify('battery staple', stored)
+    assert not hasher.needs_rehash(stored)
+
+
+def test_cost_change_needs_rehash(hasher):
+    assert hasher.needs_rehash(PasswordHasher(iterations=2000).hash('pw'))
+    assert hasher.needs_rehash(PasswordHasher('scrypt', scrypt_n=2 ** 10).hash('pw'))
+
+
+def test_login_upgrades_a_legacy_hash(db, hasher):
+    legacy = hashlib.sha256(b'correct horsesalt').hexdigest()
+    db.conn.execute("INSERT INTO users (username, password_hash, salt) VALUES ('alice', ?, 'salt')", (legacy,))
+    db.conn.commit()
+    assert db.verify_user('alice', 'wrong') is None
+    user_id = db.verify_user('alice', 'correct horse')
+    assert user_id
+    stored, salt = db.conn.execute('SELECT password_hash, salt FROM users').fetchone()
+    assert stored.startswith('pbkdf2_sha256$1000$') and salt == ''
+    assert db.verify_user('alice', 'correct horse') == user_id
+
+
+def test_login_rehashes_at_a_new_cost(db, user_id):
+    db.password_hasher = PasswordHasher(iterations=2000)
+    assert db.verify_user('alice', 'correct horse') == user_id
+    stored = db.conn.execute('SELECT password_hash FROM users').fetchone()[0]
+    assert stored.startswith('pbkdf2_sha256$2000$')
+
+
+def test_full_auth_queue_turns_logins_away(running_server):
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    try:
+        client.create_user('alice', 'pw')
+        slots = 0
+        # The slot create_user used is released just after its response is sent
+        while running_server.auth_slots.acquire(timeout=0.5):
+            slots += 1
+        try:
+            assert client.login('alice', 'pw') == {'success': False, 'error': 'Server busy, try again shortly'}
+        finally:
+            for _ in range(slots):
+                running_server.auth_slots.release()
+        assert client.login('alice', 'pw')['success']
+    finally:
+        client.disconnect()
@@ -0,0 +1,63 @@
+import itertools
+import socket
+
+import pytest
+
+from client import DollarTrackerClient
+from protocol import (CODECS, COLUMNAR, COMPRESSIONS, WireFormat, client_offer, decode, negotiate,
+                      recv_message, send_message)
+
+
+MESSAGE = {'success': True, 'results': [[number, f"A{number:08d}A", 1.0, None] for number in range(500)]}
+
+
+@pytest.mark.parametrize('encoding, compression, columnar', list(itertools.product(
+    CODECS, [None, *COMPRESSIONS], [False, True])))
+def test_every_wire_format_round_trips(encoding, compression, columnar):
+    wire_format = WireFormat(encoding, compression, columnar)
+    flags, payload = wire_format.encode(MESSAGE)
+    assert decode(flags, payload) == MESSAGE
+    assert bool(flags & COLUMNAR) == columnar
+    if compression:
+        assert flags & COMPRESSIONS[compression]
+
+
+def test_small_payloads_are_not_compressed():
+    flags, payload = WireFormat('json', 'zlib').encode({'success': True})
+    assert flags == CODECS['json']
+    assert decode(flags, payload) == {'success': True}
+
+
+def test_frames_carry_their_request_id():
+    left, right = socket.socketpair()
+    try:
+        send_message(left, MESSAGE, 7, WireFormat('json', 'zlib', True))
+        send_message(left, {'event': 'pushed'})
+        assert recv_message(right) == (7, MESSAGE)
+        assert recv_message(right) == (0, {'event': 'pushed'})
+        left.close()
+        assert recv_message(right) is None
+    finally:
+        right.close()
+
+
+def test_negotiate_falls_back_to_what_both_sides_speak():
+    assert negotiate({}).describe() == {'encoding': 'json', 'compression': None, 'columnar': False}
+    offer = {'encodings': ['bson', 'json'], 'compression': ['brotli', 'zlib'], 'columnar': True}
+    assert negotiate(offer).describe() == {'encoding': 'json', 'compression': 'zlib', 'columnar': True}
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_hello_agrees_on_a_format_with_the_server(running_server, compact):
+    client = DollarTrackerClient('127.0.0.1', running_server.port, compact=compact)
+    try:
+        client.create_user('alice', 'pw')
+        assert client.login('alice', 'pw')['success']
+        expected = negotiate(client_offer()) if compact else WireFormat()
+        assert client.wire_format.describe() == expected.describe()
+        for number in range(3):
+            assert client.add_bill(face_value=1.0, serial_number=f"A{number:08d}A")['success']
+        assert [bill.serial_number for bill in client.search_bills({'sort': 'serial_number'})['results']] == [
+            f"A{number:08d}A" for number in range(3)]
+    finally:
+        client.disconnect()
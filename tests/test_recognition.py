@@ -0,0 +1,136 @@
+import base64
+import sys
+import threading
+
+import pytest
+
+from client import IMAGE_CHUNK_BYTES, DollarTrackerClient
+from recognition import ImageUploads, RecognitionPool
+
+
+class StubProcessor:
+    """Stands in for ImageProcessor: reports the size of each image it is given"""
+    def __init__(self, release=None):
+        self.release = release
+        self.sizes = []
+
+    def process_bill_bytes(self, image):
+        if self.release:
+            self.release.wait(5)
+        if image == b'bad':
+            raise RuntimeError('cannot decode image')
+        self.sizes.append(len(image))
+        return {'serial_number': 'A12345678B', 'is_star_note': False, 'preset': 'stub', 'success': True}
+
+
+def stub_pool(processor, workers=2, queue=8):
+    pool = RecognitionPool(workers, queue)
+    pool._processor = processor
+    return pool
+
+
+def recognize(pool, image):
+    done = threading.Event()
+    results = []
+    job = pool.submit(image, lambda result: (results.append(result), done.set()))
+    assert job is not None and done.wait(5)
+    return results[0]
+
+
+def test_uploads_assemble_bytes_and_base64_chunks():
+    uploads = ImageUploads()
+    uploads.add('u1', b'abc')
+    uploads.add('u1', base64.b64encode(b'def').decode(), last=True)
+    assert uploads.pop('u1') == b'abcdef'
+    assert uploads.is_new('u1')
+
+
+def test_oversized_upload_is_refused_to_its_last_chunk():
+    uploads = ImageUploads(max_bytes=4)
+    uploads.add('u1', b'abc')
+    with pytest.raises(ValueError, match='exceeds'):
+        uploads.add('u1', b'def')
+    with pytest.raises(ValueError, match='rejected'):
+        uploads.add('u1', b'g')
+    with pytest.raises(ValueError, match='rejected'):
+        uploads.add('u1', b'h', last=True)
+    assert uploads.is_new('u1')
+
+
+def test_uploads_in_progress_are_limited():
+    uploads = ImageUploads(max_uploads=1)
+    uploads.add('u1', b'a')
+    with pytest.raises(ValueError, match='Too many'):
+        uploads.add('u2', b'b')
+
+
+def test_pool_recognizes_and_reports_errors():
+    pool = stub_pool(StubProcessor())
+    try:
+        assert recognize(pool, b'image')['serial_number'] == 'A12345678B'
+        result = recognize(pool, b'bad')
+        assert result['success'] is False and result['error'] == 'cannot decode image'
+    finally:
+        pool.shutdown()
+
+
+def test_pool_turns_work_away_when_backlog_is_full():
+    release = threading.Event()
+    pool = stub_pool(StubProcessor(release), workers=1, queue=1)
+    try:
+        jobs = [pool.submit(image, lambda result: None) for image in (b'one', b'two')]
+        assert None not in jobs
+        assert pool.submit(b'three', lambda result: None) is None
+        release.set()
+        for job in jobs:
+            job.result(5)
+        # Finished jobs give their slots back
+        assert recognize(pool, b'four')['success']
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_pool_without_opencv_says_so(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'image_processor', None)
+    pool = RecognitionPool()
+    try:
+        assert pool.unavailable().startswith('Image recognition is not available')
+    finally:
+        pool.shutdown()
+
+
+def logged_in_client(server, compact):
+    client = DollarTrackerClient('127.0.0.1', server.port, compact=compact)
+    client.create_user('alice', 'pw')
+    assert client.login('alice', 'pw')['success']
+    return client
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_client_streams_image_to_server(running_server, compact):
+    processor = StubProcessor()
+    running_server.recognition._processor = processor
+    client = logged_in_client(running_server, compact)
+    try:
+        image = bytes(range(256)) * (IMAGE_CHUNK_BYTES // 256 * 2 + 3)
+        result = client.recognize_image(image).result(10)
+        assert result['success'] and result['serial_number'] == 'A12345678B'
+        assert processor.sizes == [len(image)]
+    finally:
+        client.disconnect()
+
+
+def test_server_without_recognition_refuses_before_upload(running_server):
+    running_server.recognition._import_error = 'Image recognition is not available on this server: no cv2'
+    client = logged_in_client(running_server, False)
+    try:
+        result = client.recognize_image(b'x' * (IMAGE_CHUNK_BYTES * 3)).result(10)
+        assert result == {'success': False, 'error': 'Image recognition is not available on this server: no cv2'}
+    finally:
+        client.disconnect()
+
+
+def test_recognition_needs_login(running_server):
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    assert client.recognize_image(b'image').result(1) == {'success': False, 'error': 'Not logged in'}
@@ -0,0 +1,107 @@
+import socket
+import time
+
+from bill_record import Bill
+from client import DollarTrackerClient
+from replica import LocalReplica, ReplicatedClient
+
+def unused_port():
+    """A local port nothing listens on, standing in for an unreachable server"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def offline_client(tmp_path, server):
+    """alice logged in from her replica's cached credentials while the server is unreachable"""
+    online = ReplicatedClient(DollarTrackerClient('127.0.0.1', server.port), tmp_path / 'replica.db')
+    online.create_user('alice', 'pw')
+    assert online.login('alice', 'pw')['success']
+    online.disconnect()
+
+    replicated = ReplicatedClient(DollarTrackerClient('127.0.0.1', unused_port()), tmp_path / 'replica.db',
+                                  sync_interval=0.05)
+    assert replicated.login('alice', 'pw')['offline']
+    return replicated
+
+def test_remember_user_caches_credentials_for_offline_login(tmp_path, hasher):
+    replica = LocalReplica(str(tmp_path / 'replica.db'), password_hasher=hasher)
+    replica.remember_user(7, 'alice', 'correct horse')
+    assert replica.verify_user('alice', 'correct horse') == 7
+    assert replica.verify_user('alice', 'wrong') is None
+    replica.close()
+
+def test_remember_user_skips_hashing_when_cached_hash_is_current(tmp_path, hasher, monkeypatch):
+    replica = LocalReplica(str(tmp_path / 'replica.db'), password_hasher=hasher)
+    replica.remember_user(7, 'alice', 'correct horse')
+    hashes = []
+    monkeypatch.setattr(hasher, 'hash', lambda password: hashes.append(password))
+    replica.remember_user(7, 'alice', 'correct horse')
+    assert hashes == []
+    replica.close()
+
+def test_remember_user_rehashes_a_changed_password(tmp_path, hasher):
+    replica = LocalReplica(str(tmp_path / 'replica.db'), password_hasher=hasher)
+    replica.remember_user(7, 'alice', 'correct horse')
+    replica.remember_user(7, 'alice', 'battery staple')
+    assert replica.verify_user('alice', 'battery staple') == 7
+    assert replica.verify_user('alice', 'correct horse') is None
+    replica.close()
+
+def test_bad_series_is_refused_without_a_half_done_write(tmp_path):
+    replicated = ReplicatedClient(None, tmp_path / 'replica.db')
+    replicated.user_id = 7
+    response = replicated.add_bill(face_value=1.0, serial_number='MB12345678A', series_year='19xx')
+    assert not response['success'] and '19xx' in response['error']
+    assert replicated.replica.get_bill('MB12345678A') is None
+
+    assert replicated.add_bill(face_value=1.0, serial_number='MB12345678A', series_year='2017A')['success']
+    response = replicated.update_bill('MB12345678A', series_year='bad', estimated_value=5.0)
+    assert not response['success'] and 'bad' in response['error']
+    assert Bill.from_row(replicated.replica.get_bill('MB12345678A')).series == '2017A'
+    assert replicated.replica.get_bill('MB12345678A')[9] is None
+    assert [write['op'] for write in replicated.replica.get_pending_writes(10)] == ['add']
+    replicated.replica.close()
+
+def test_offline_writes_are_queued_and_replayed_on_reconnect(tmp_path, running_server):
+    replicated = offline_client(tmp_path, running_server)
+    try:
+        assert replicated.add_bill(face_value=1.0, serial_number='MB12345678A')['success']
+        assert replicated.update_bill('MB12345678A', estimated_value=2.0)['success']
+        assert replicated.search_bills({'serial_number': 'MB1'})['results'][0].estimated_value == 2.0
+        assert replicated.get_sync_status() == {'online': False, 'pending_writes': 2}
+        assert running_server.db.get_bill('MB12345678A') is None
+        
+        # The server comes back
+        replicated.client.port = running_server.port
+        wait_for(lambda: replicated.get_sync_status() == {'online': True, 'pending_writes': 0})
+        bill = Bill.from_row(running_server.db.get_bill('MB12345678A'))
+        assert (bill.username, bill.estimated_value) == ('alice', 2.0)
+    finally:
+        replicated.disconnect()
+
+def test_conflicting_offline_writes_give_way_to_the_server_copy(tmp_path, running_server):
+    replicated = offline_client(tmp_path, running_server)
+    bob = DollarTrackerClient('127.0.0.1', running_server.port)
+    try:
+        assert replicated.add_bill(face_value=1.0, serial_number='MB12345678A')['success']
+        assert replicated.update_bill('MB12345678A', estimated_value=2.0)['success']
+        # Meanwhile bob records the same note on the server
+        bob.create_user('bob', 'pw')
+        assert bob.login('bob', 'pw')['success']
+        assert bob.add_bill(face_value=1.0, serial_number='MB12345678A', estimated_value=9.0)['success']
+        
+        replicated.client.port = running_server.port
+        wait_for(lambda: replicated.get_sync_status() == {'online': True, 'pending_writes': 0})
+        for row in (running_server.db.get_bill('MB12345678A'), replicated.replica.get_bill('MB12345678A')):
+            bill = Bill.from_row(row)
+            assert (bill.username, bill.estimated_value) == ('bob', 9.0)
+        assert not replicated.update_bill('MB12345678A', estimated_value=3.0)['success']
+    finally:
+        bob.disconnect()
+        replicated.disconnect()
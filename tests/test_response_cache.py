@@ -0,0 +1,63 @@
+import pytest
+
+from client import DollarTrackerClient
+from database import Database
+from response_cache import ResponseCache
+
+
+def test_newer_version_drops_old_entries():
+    cache = ResponseCache()
+    cache.put('key', 1, 0, b'stale')
+    assert cache.get('key', 1) is None
+    cache.put('key', 1, 0, b'fresh')
+    assert cache.get('key', 1) == (0, b'fresh')
+    assert cache.get('key', 2) is None
+    # A response read before the write must not be cached under the new version
+    cache.put('key', 1, 0, b'stale')
+    assert cache.get('key', 2) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_size_bound_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=40)
+    cache.get(None, 1)
+    for key in 'abc':
+        cache.put(key, 1, 0, b'x' * 10)
+    cache.get('a', 1)
+    cache.put('d', 1, 0, b'x' * 10)
+    cache.put('e', 1, 0, b'x' * 10)
+    assert [key for key in 'abcde' if cache.get(key, 1)] == ['a', 'c', 'd', 'e']
+    cache.put('big', 1, 0, b'x' * 11)
+    assert cache.get('big', 1) is None
+
+
+@pytest.fixture
+def client(running_server):
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    client.create_user('alice', 'pw')
+    assert client.login('alice', 'pw')['success']
+    yield client
+    client.disconnect()
+
+
+def serials(client):
+    return [bill.serial_number for bill in client.search_bills({'sort': 'serial_number'})['results']]
+
+
+def test_own_writes_invalidate_cached_results(running_server, client):
+    assert client.add_bill(face_value=1.0, serial_number='A00000001A')['success']
+    assert serials(client) == serials(client) == ['A00000001A']
+    assert running_server.response_cache.stats()['hits'] == 1
+    assert client.add_bill(face_value=1.0, serial_number='A00000002A')['success']
+    assert serials(client) == ['A00000001A', 'A00000002A']
+
+
+def test_writes_by_another_connection_invalidate_cached_results(running_server, client, tmp_path, hasher):
+    assert serials(client) == serials(client) == []
+    # Another worker process writes to the same file through its own connection
+    other = Database(str(tmp_path / 'server.db'), password_hasher=hasher)
+    try:
+        assert other.add_bill(1.0, 'B00000001A', other.verify_user('alice', 'pw'))
+    finally:
+        other.close()
+    assert serials(client) == ['B00000001A']
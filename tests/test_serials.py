@@ -0,0 +1,33 @@
+import pytest
+
+from serials import serial_key
+
+
+@pytest.mark.parametrize('read, recorded', [
+    ('MB1234S678A', 'MB12345678A'),
+    ('MB12O45678A', 'MB12045678A'),
+    ('MB1234567BA', 'MB12345678A'),
+    ('M812345678A', 'MB12345678A'),
+    ('mb12345678a ', 'MB12345678A'),
+    ('MB1Z345678*', 'MB12345678*'),
+])
+def test_misreadings_share_a_key(read, recorded):
+    assert serial_key(read) == serial_key(recorded)
+
+
+@pytest.mark.parametrize('first, second', [
+    ('MI12345678A', 'ML12345678A'),
+    ('MD12345678A', 'MI12345678A'),
+    ('MB12345678I', 'MB12345678L'),
+    ('MB12345678D', 'MB12345678O'),
+    ('IB12345678A', 'LB12345678A'),
+])
+def test_letter_positions_keep_district_and_suffix_letters(first, second):
+    assert serial_key(first) != serial_key(second)
+
+
+def test_similar_serials_across_districts(db, user_id):
+    db.add_bill(1.0, 'MI12345678A', user_id)
+    db.add_bill(1.0, 'ML12345678A', user_id)
+    assert db.find_similar_serials('MI12345678A') == []
+    assert db.find_similar_serials('MI1234567BA') == ['MI12345678A']
@@ -0,0 +1,86 @@
+import sys
+
+import pytest
+
+from metrics import Metrics
+from protocol import JSON_FORMAT, decode
+import server as server_module
+from server import DollarTrackerServer
+
+class FakeConnection:
+    """Collects what respond() sends instead of writing to a socket"""
+    def __init__(self):
+        self.address = ('127.0.0.1', 50000)
+        self.wire_format = JSON_FORMAT
+        self.sent = []
+
+    def send(self, response, request_id=None):
+        self.sent.append(response)
+
+    def send_encoded(self, flags, payload, request_id=None):
+        self.sent.append(decode(flags, payload))
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv('DOLLAR_TRACKER_HASH_ITERATIONS', '1000')
+    server = DollarTrackerServer(db_name=str(tmp_path / 'server.db'),
+                                 invitations_db=str(tmp_path / 'invitations.db'))
+    yield server
+    server.executor.shutdown()
+    server.auth_pool.shutdown()
+    server.db.close()
+
+def login(server):
+    server.process_request({'action': 'create_user', 'data': {'username': 'alice', 'password': 'pw'}})
+    response = server.process_request({'action': 'login', 'data': {'username': 'alice', 'password': 'pw'}})
+    return response['session_token']
+
+def test_unknown_actions_share_one_metric_label(server):
+    connection = FakeConnection()
+    for action in ('nope', 'nope\nfake_metric 1', ['list'], None):
+        server.respond(connection, 1, {'action': action})
+    assert all(response['error'] == 'Invalid action' for response in connection.sent)
+    counters = server.metrics.snapshot()['counters']
+    assert counters['requests_total{action="invalid",outcome="error"}'] == 4
+    assert not any('nope' in series for series in counters)
+
+def test_stats_needs_a_session(server):
+    assert server.process_request({'action': 'stats'})['auth_required']
+    response = server.process_request({'action': 'stats', 'session': login(server)})
+    assert response['success'] and 'counters' in response['stats']
+
+def test_prometheus_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc('requests_total', action='a"b\\c\nd')
+    assert 'requests_total{action="a\\"b\\\\c\\nd"} 1' in metrics.render_prometheus().splitlines()
+
+def test_cached_search_is_counted_under_its_action(server):
+    connection = FakeConnection()
+    session = login(server)
+    for _ in range(2):
+        server.respond(connection, 1, {'action': 'search_bills', 'data': {}, 'session': session})
+    assert [response['success'] for response in connection.sent] == [True, True]
+    counters = server.metrics.snapshot()['counters']
+    assert counters['requests_total{action="search_bills",outcome="success"}'] == 2
+
+def test_metrics_endpoint_is_off_unless_configured(monkeypatch):
+    started = []
+
+    class Recorder:
+        def __init__(self, *args, **kwargs):
+            started.append((kwargs['metrics_port'], kwargs['metrics_host']))
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(server_module, 'DollarTrackerServer', Recorder)
+    monkeypatch.setattr(server_module, 'stop_on_signals', lambda server: None)
+    monkeypatch.setattr(sys, 'argv', ['server.py'])
+    monkeypatch.delenv('DOLLAR_TRACKER_METRICS_PORT', raising=False)
+    monkeypatch.delenv('DOLLAR_TRACKER_METRICS_HOST', raising=False)
+    server_module.main()
+    monkeypatch.setenv('DOLLAR_TRACKER_METRICS_PORT', '9200')
+    server_module.main()
+    monkeypatch.setenv('DOLLAR_TRACKER_METRICS_HOST', '0.0.0.0')
+    server_module.main()
+    assert started == [(0, '127.0.0.1'), (9200, '127.0.0.1'), (9200, '0.0.0.0')]
@@ -0,0 +1,54 @@
+import time
+
+import sessions
+from client import DollarTrackerClient
+from database import Database
+from sessions import SessionStore
+
+
+def test_issued_token_finds_its_user():
+    store = SessionStore()
+    session = store.create(7, 'alice')
+    assert store.get(session.token) is session
+    assert (session.user_id, session.username) == (7, 'alice')
+    assert store.get('made-up') is None
+    assert store.get(None) is None
+
+
+def test_use_slides_expiry_and_idle_tokens_lapse():
+    store = SessionStore(ttl=60)
+    session = store.create(7, 'alice')
+    session.expires_at = time.time() + 1
+    assert store.get(session.token).expires_at > time.time() + 50
+    session.expires_at = time.time() - 1
+    assert store.get(session.token) is None
+    assert session.token not in store.sessions
+
+
+def test_sessions_are_shared_through_the_database(tmp_path, hasher, monkeypatch):
+    monkeypatch.setattr(sessions, 'RECHECK_INTERVAL', 0)
+    db = Database(str(tmp_path / 'sessions.db'), password_hasher=hasher)
+    try:
+        first, second = SessionStore(db=db), SessionStore(db=db)
+        token = first.create(7, 'alice').token
+        # A restarted or different worker knows the token, the database only its hash
+        assert second.get(token).username == 'alice'
+        assert db.load_session(token) is None
+        second.remove(token)
+        assert first.get(token) is None
+    finally:
+        db.close()
+
+
+def test_logout_ends_the_session_on_the_server(running_server):
+    client = DollarTrackerClient('127.0.0.1', running_server.port)
+    try:
+        client.create_user('alice', 'pw')
+        assert client.login('alice', 'pw')['success']
+        token = client.session_token
+        assert client.send_request('stats', timeout=5)['success']
+        assert client.logout()['success']
+        client.session_token = token
+        assert client.send_request('stats', timeout=5)['auth_required']
+    finally:
+        client.disconnect()
@@ -0,0 +1,80 @@
+import os
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from client import DollarTrackerClient
+from conftest import REPO_DIR
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="the supervisor needs a POSIX system")
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def connected_client(port, timeout=60):
+    """A client logged in as alice once a worker accepts connections"""
+    deadline = time.monotonic() + timeout
+    client = DollarTrackerClient('127.0.0.1', port)
+    while not client.connect():
+        assert time.monotonic() < deadline, "no worker started"
+        time.sleep(0.1)
+    client.create_user('alice', 'pw')
+    assert client.login('alice', 'pw')['success']
+    return client
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    port = unused_port()
+    env = dict(os.environ, HOME=str(tmp_path), DOLLAR_TRACKER_HASH_ITERATIONS='1000',
+               DOLLAR_TRACKER_METRICS_PORT='0')
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'server.py'), '--host', '127.0.0.1',
+                                '--port', str(port), '--workers', '2', '--db', str(tmp_path / 'server.db')],
+                               env=env, stdout=subprocess.DEVNULL)
+    yield process, port
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_workers_share_the_port_and_relay_changes(supervisor):
+    process, port = supervisor
+    clients = [connected_client(port) for _ in range(8)]
+    try:
+        stats = [client.send_request('stats', timeout=10)['stats'] for client in clients]
+        assert {worker['worker'] for worker in stats} <= {0, 1}
+        workers = {worker['pid'] for worker in stats}
+        assert os.getpid() not in workers and process.pid not in workers
+
+        # Whichever workers the two connections landed on, the change reaches the watcher
+        received = queue.Queue()
+        watcher, writer = clients[0], clients[-1]
+        assert watcher.subscribe(received.put)['success']
+        assert writer.add_bill(face_value=1.0, serial_number='A00000001A')['success']
+        change, = received.get(timeout=10)
+        assert change['bill'].serial_number == 'A00000001A'
+        assert [bill.serial_number for bill in watcher.search_bills({})['results']] == ['A00000001A']
+    finally:
+        for client in clients:
+            client.disconnect()
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(30) == 0
+    assert not any(process_exists(pid) for pid in workers)
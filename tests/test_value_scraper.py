@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+from value_scraper import ValueScraper, parse_price, price_texts, robust_average
+
+PAGE = '''<ul class="srp-results">
+<li class="s-item"><span class="s-item__price">$12.50</span></li>
+<li class="s-item"><span class="s-item__price">$5.00<span class="DEFAULT"> to </span>$9.00</span></li>
+<li class="s-item"><span class="s-item__price">C $20.00</span></li>
+<li class="s-item"><span class='bold s-item__price'>US $1,200</span></li>
+<li class="s-item"><span class="s-item__price--old">$99.00</span> s-item__price in text</li>
+</ul>'''
+# A search results page as saved from a browser, trimmed to six listings
+# and a carousel of results for a broader search below them
+SAVED_PAGE = Path(__file__).parent / 'fixtures' / 'ebay_search.html'
+
+
+@pytest.mark.parametrize('text, price', [
+    ('$12.50', 12.5),
+    ('US $1,200', 1200.0),
+    ('$5.00 to $9.00', 7.0),
+    ('$5 - $6.5', 5.75),
+    ('C $12.00', None),
+    ('GBP 8.00', None),
+    ('$1 to $2 to $3', None),
+    ('see description', None),
+])
+def test_parse_price(text, price):
+    assert parse_price(text) == price
+
+
+def test_robust_average_drops_outliers():
+    assert robust_average([]) is None
+    assert robust_average([1.0, 100.0, 3.0]) == 3.0
+    assert robust_average([10.0, 11.0, 12.0, 13.0, 500.0]) == 11.5
+
+
+@pytest.mark.parametrize('parser', ['selectolax', 'scan'])
+def test_price_texts(parser):
+    texts = price_texts(PAGE, parser)
+    assert [parse_price(text) for text in texts] == [12.5, 7.0, None, 1200.0]
+
+
+def test_listing_prices_from_a_saved_page():
+    html = SAVED_PAGE.read_text(encoding='utf-8')
+    prices = ValueScraper().listing_prices(html)
+    assert prices == [12.5, 7.0, 14.0, 1200.0, 11.25]
+    assert robust_average(prices) == pytest.approx(12.5833, abs=1e-4)
+    # The scanning fallback also counts the carousel's $350 note
+    assert [parse_price(text) for text in price_texts(html, 'scan')][-1] == 350.0
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        price_texts(PAGE, 'regex')
@@ -1,9 +1,106 @@
 import requests
-from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
 import json
 from datetime import datetime, timedelta
 import time
 import random
+import re
+import statistics
+from html import unescape
+
+PRICE_CLASS = 's-item__price'
+# The price of each listing in the search results, leaving out any prices
+# elsewhere on the page
+PRICE_SELECTOR = f'ul.srp-results li.s-item .{PRICE_CLASS}'
+# 'selectolax' picks prices with PRICE_SELECTOR; 'scan' is the fallback if a
+# change to eBay's markup trips the selector up (see price_texts)
+PRICE_PARSER = 'selectolax'
+# Prices further than this many interquartile ranges outside the middle half
+# of the listings are left out of the average (lots, typos, placeholder bids)
+OUTLIER_IQR = 1.5
+# A price in US dollars: "$12.50", "US $1,200", with an optional cents part
+PRICE_PATTERN = re.compile(r'(?:US\s*)?\$\s*(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?')
+RANGE_SEPARATOR = re.compile(r'\s+to\s+|\s*[-\u2013]\s*')
+# An opening tag whose class list contains PRICE_CLASS (quoted or not)
+PRICE_ELEMENT = re.compile(r'<(\w+)\b[^>]*?\bclass\s*=\s*["\']?(?:[^"\'>]*?\s)?' + PRICE_CLASS + r'(?=[\s"\'>])[^>]*>')
+TAG = re.compile(r'<[^>]*>')
+
+def parse_price(text):
+    """A listing price in dollars, or None if it is not one.
+    
+    A range such as "$5.00 to $9.00" counts as its midpoint. Prices in
+    other currencies ("C $12.00", "GBP 8.00") are not converted and give
+    None, as does anything else that isn't a plain price.
+    """
+    parts = RANGE_SEPARATOR.split(text.strip())
+    if len(parts) > 2:
+        return None
+    values = []
+    for part in parts:
+        match = PRICE_PATTERN.fullmatch(part)
+        if match is None:
+            return None
+        values.append(float(f"{match.group(1).replace(',', '')}.{match.group(2) or 0}"))
+    return sum(values) / len(values)
+
+def robust_average(prices):
+    """Mean of prices after dropping outliers; None for no prices.
+    
+    Uses Tukey's fences: anything more than OUTLIER_IQR interquartile
+    ranges below the first quartile or above the third is dropped. With
+    fewer than four prices there are no meaningful quartiles, so the
+    median is used instead.
+    """
+    if not prices:
+        return None
+    if len(prices) < 4:
+        return statistics.median(prices)
+    first, _, third = statistics.quantiles(prices, n=4, method='inclusive')
+    spread = OUTLIER_IQR * (third - first)
+    kept = [price for price in prices if first - spread <= price <= third + spread]
+    return sum(kept) / len(kept)
+
+def price_texts(html, parser=None):
+    """Text of every listing price on an eBay search page.
+    
+    parser is 'selectolax' or 'scan' (default PRICE_PARSER). 'scan' needs
+    no parser: it jumps from one PRICE_CLASS element to the next in the
+    raw text, so it still works if the results list is renamed, but it
+    also picks up price elements outside the results.
+    """
+    parser = parser or PRICE_PARSER
+    if parser == 'selectolax':
+        return [node.text() for node in HTMLParser(html).css(PRICE_SELECTOR)]
+    if parser == 'scan':
+        return _scan_price_texts(html)
+    raise ValueError(f"Unknown parser: {parser}")
+
+def _scan_price_texts(html):
+    texts = []
+    position = 0
+    while True:
+        # Look for the class name itself and only then at the tag around it,
+        # which is far quicker than trying the tag pattern at every '<'
+        found = html.find(PRICE_CLASS, position)
+        if found < 0:
+            return texts
+        match = PRICE_ELEMENT.match(html, html.rfind('<', 0, found))
+        if match is None or match.end() <= found:
+            # In text, another attribute, or a longer class name
+            position = found + len(PRICE_CLASS)
+            continue
+        # Find the matching end tag, counting nested elements of the same name
+        tag = match.group(1)
+        nested = re.compile(rf'<(/?){tag}\b[^>]*>', re.IGNORECASE)
+        depth = 1
+        position = match.end()
+        while depth:
+            inner = nested.search(html, position)
+            if inner is None:
+                return texts
+            depth += -1 if inner.group(1) else 1
+            position = inner.end()
+        texts.append(unescape(TAG.sub('', html[match.end():inner.start()])))
 
 class ValueScraper:
     def __init__(self):
@@ -21,26 +118,21 @@ class ValueScraper:
         
         try:
             response = requests.get(url, headers=self.headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            prices = []
-            for item in soup.select('.s-item__price'):
-                price_text = item.text.strip()
-                if price_text.startswith('$'):
-                    try:
-                        price = float(price_text[1:].replace(',', ''))
-                        prices.append(price)
-                    except ValueError:
-                        continue
-                        
-            if prices:
-                return sum(prices) / len(prices)
-            return None
+            return robust_average(self.listing_prices(response.text))
             
         except Exception as e:
             print(f"Error scraping eBay: {e}")
             return None
             
+    def listing_prices(self, html):
+        """Dollar prices of the listings on a search results page"""
+        prices = []
+        for text in price_texts(html):
+            price = parse_price(text)
+            if price is not None:
+                prices.append(price)
+        return prices
+        
     def get_historical_average(self, serial_number, face_value, series_year=None):
         """Calculate 3-year average value from various sources"""
         # TODO: Implement historical data collection from multiple sources